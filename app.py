@@ -1,17 +1,40 @@
 from flask import Flask, session
 from flask_login import LoginManager
-from flask_migrate import Migrate
 from models import db, User
+from models.utilization import backfill_rollups
+from utils.user_cache import user_cache
+from utils.token_auth import init_token_auth
+from utils.password_hashing import DEFAULT_HASH_METHOD, default_hash_workers, password_hasher
+from utils.metrics import metrics
+from utils.query_budget import query_inspector, uncounted
+from utils.slow_query_log import slow_query_log
+from utils.traffic_recorder import traffic_recorder
+from utils.profiling import background_sampler, request_profiler
+from utils.memory_snapshots import memory_snapshots
+from utils.log_pipeline import log_pipeline, parse_levels
+from utils.device_registry import device_registry
+from utils.access_index import access_index
+from utils.device_import import DeviceImportError, import_devices, parse_devices
+from utils.device_health import device_health, parse_ports
+from utils.user_import import import_users, parse_users
 from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash
 from flask_cors import CORS
-from apscheduler.schedulers.background import BackgroundScheduler
+import click
 import os
 import shutil
 import atexit
+import threading
 from dotenv import load_dotenv
 
-def create_app():
+def create_app(bootstrap=None, start_services=True):
+    """Build the Flask app
+
+    bootstrap creates tables and the admin user: True runs it now, False
+    skips it, and None follows BOOTSTRAP_MODE ('lazy' runs it on the first
+    request, 'eager' runs it now, 'command' leaves it to `flask bootstrap`).
+    start_services starts the backup scheduler. Prefork servers turn both
+    off and run them once from the master instead (see wsgi.py).
+    """
     # Load environment variables first
     load_dotenv()
     
@@ -30,10 +53,98 @@ def create_app():
     app.config['SESSION_COOKIE_DOMAIN'] = None
     app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=24)
     
+    # Logging goes through a queue to a background writer; LOG_LEVELS sets per-logger
+    # levels, e.g. "routes.reservation_routes=DEBUG,werkzeug=WARNING"
+    app.config['LOG_PIPELINE_ENABLED'] = os.getenv('LOG_PIPELINE_ENABLED', 'true').lower() == 'true'
+    app.config['LOG_FORMAT'] = os.getenv('LOG_FORMAT', 'text' if os.getenv('FLASK_ENV') == 'development' else 'json')
+    app.config['LOG_LEVEL'] = os.getenv('LOG_LEVEL', 'INFO').upper()
+    app.config['LOG_LEVELS'] = parse_levels(os.getenv('LOG_LEVELS'))
+    app.config['LOG_FILE'] = os.getenv('LOG_FILE')
+    app.config['LOG_QUEUE_SIZE'] = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+    log_pipeline.init_app(app)
+    
     # Configure backup settings
     app.config['BACKUP_DIR'] = os.path.join(os.path.expanduser("~"), "db_backups")
     app.config['BACKUP_RETENTION'] = 5
     
+    # When to create tables and the admin user: lazy, eager or command
+    app.config['BOOTSTRAP_MODE'] = os.getenv('BOOTSTRAP_MODE', 'lazy').lower()
+    
+    # Per-process cache for the Flask-Login user loader
+    app.config['USER_CACHE_TTL'] = int(os.getenv('USER_CACHE_TTL', 60))
+    app.config['USER_CACHE_SIZE'] = int(os.getenv('USER_CACHE_SIZE', 1024))
+    
+    # Device listings are served from a cached registry, refreshed on edits or after this many seconds
+    app.config['DEVICE_CACHE_TTL'] = int(os.getenv('DEVICE_CACHE_TTL', 300))
+    
+    # Access checks are answered from reservations loaded this many seconds ahead
+    app.config['ACCESS_INDEX_HORIZON'] = int(os.getenv('ACCESS_INDEX_HORIZON', 300))
+    
+    # Scheduled TCP reachability probes of every device IP (off by default)
+    app.config['DEVICE_PROBE_ENABLED'] = os.getenv('DEVICE_PROBE_ENABLED', 'false').lower() == 'true'
+    app.config['DEVICE_PROBE_INTERVAL'] = int(os.getenv('DEVICE_PROBE_INTERVAL', 60))
+    app.config['DEVICE_PROBE_TIMEOUT'] = float(os.getenv('DEVICE_PROBE_TIMEOUT', 1.0))
+    app.config['DEVICE_PROBE_CONCURRENCY'] = int(os.getenv('DEVICE_PROBE_CONCURRENCY', 100))
+    app.config['DEVICE_PROBE_PORT'] = int(os.getenv('DEVICE_PROBE_PORT', 22))
+    app.config['DEVICE_PROBE_PORTS'] = parse_ports(os.getenv('DEVICE_PROBE_PORTS'))
+    app.config['DEVICE_HEALTH_FILE'] = os.getenv('DEVICE_HEALTH_FILE')
+    
+    # Optional stateless Bearer token authentication
+    app.config['AUTH_TOKEN_MODE'] = os.getenv('AUTH_TOKEN_MODE', 'false').lower() == 'true'
+    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', app.config['SECRET_KEY'])
+    app.config['JWT_TOKEN_LOCATION'] = ['headers']
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=int(os.getenv('JWT_ACCESS_MINUTES', 15)))
+    app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=int(os.getenv('JWT_REFRESH_DAYS', 7)))
+    
+    # Password hashing - stored hashes are upgraded on login when the method changes
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', DEFAULT_HASH_METHOD)
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', 0 if os.getenv('TESTING') else default_hash_workers()))
+    app.config['PASSWORD_HASH_QUEUE'] = int(os.getenv('PASSWORD_HASH_QUEUE', app.config['PASSWORD_HASH_WORKERS'] * 4))
+    app.config['PASSWORD_HASH_TIMEOUT'] = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+    app.config['PASSWORD_HASH_BULK_WORKERS'] = int(os.getenv('PASSWORD_HASH_BULK_WORKERS', 0)) or None
+    # Rows accepted by one /users/import call, so a single import can't hold the hash pool for long
+    app.config['USER_IMPORT_MAX_ROWS'] = int(os.getenv('USER_IMPORT_MAX_ROWS', 500))
+    
+    # Prometheus metrics at /metrics; set METRICS_TOKEN to require a Bearer token
+    app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+    
+    # Per-request SQL budgets and N+1 detection: off, warn or raise
+    default_budget_mode = 'raise' if os.getenv('TESTING') else 'warn' if os.getenv('FLASK_ENV') == 'development' else 'off'
+    app.config['SQL_BUDGET_MODE'] = os.getenv('SQL_BUDGET_MODE', default_budget_mode).lower()
+    app.config['SQL_QUERY_BUDGET'] = int(os.getenv('SQL_QUERY_BUDGET')) if os.getenv('SQL_QUERY_BUDGET') else None
+    app.config['SQL_N_PLUS_ONE_THRESHOLD'] = int(os.getenv('SQL_N_PLUS_ONE_THRESHOLD', 3))
+    
+    # Slow-query log with captured plans; SLOW_QUERY_MS=0 turns it off
+    app.config['SLOW_QUERY_MS'] = float(os.getenv('SLOW_QUERY_MS', 250))
+    app.config['SLOW_QUERY_EXPLAIN'] = os.getenv('SLOW_QUERY_EXPLAIN', 'true').lower() == 'true'
+    app.config['SLOW_QUERY_LOG'] = os.getenv('SLOW_QUERY_LOG')
+    app.config['SLOW_QUERY_LOG_BYTES'] = int(os.getenv('SLOW_QUERY_LOG_BYTES', 5 * 1024 * 1024))
+    app.config['SLOW_QUERY_LOG_BACKUPS'] = int(os.getenv('SLOW_QUERY_LOG_BACKUPS', 3))
+    # Bound parameter values can hold password hashes and tokens; off unless asked for
+    app.config['SLOW_QUERY_LOG_PARAMS'] = os.getenv('SLOW_QUERY_LOG_PARAMS', 'false').lower() == 'true'
+    
+    # Opt-in traffic recording for load-test replay; unset TRAFFIC_RECORD_DIR to turn it off
+    app.config['TRAFFIC_RECORD_DIR'] = os.getenv('TRAFFIC_RECORD_DIR')
+    app.config['TRAFFIC_RECORD_SAMPLE'] = float(os.getenv('TRAFFIC_RECORD_SAMPLE', 1.0))
+    app.config['TRAFFIC_RECORD_ANONYMIZE'] = [key for key in os.getenv('TRAFFIC_RECORD_ANONYMIZE', '').split(',') if key]
+    
+    # On-demand request profiling for admins (X-Profile header or _profile query flag)
+    app.config['PROFILING_ENABLED'] = os.getenv('PROFILING_ENABLED', 'true').lower() == 'true'
+    app.config['PROFILE_DIR'] = os.getenv('PROFILE_DIR')
+    app.config['PROFILE_KEEP'] = int(os.getenv('PROFILE_KEEP', 200))
+    
+    # Continuous background stack sampling (off by default) and tracemalloc snapshots
+    app.config['SAMPLER_ENABLED'] = os.getenv('SAMPLER_ENABLED', 'false').lower() == 'true'
+    app.config['SAMPLER_DIR'] = os.getenv('SAMPLER_DIR')
+    app.config['SAMPLER_INTERVAL'] = float(os.getenv('SAMPLER_INTERVAL', 0.02))
+    app.config['SAMPLER_WINDOW'] = int(os.getenv('SAMPLER_WINDOW', 60))
+    app.config['SAMPLER_KEEP'] = int(os.getenv('SAMPLER_KEEP', 60))
+    app.config['TRACEMALLOC_ON_START'] = os.getenv('TRACEMALLOC_ON_START', 'false').lower() == 'true'
+    app.config['TRACEMALLOC_FRAMES'] = int(os.getenv('TRACEMALLOC_FRAMES', 10))
+    app.config['MEMORY_SNAPSHOT_DIR'] = os.getenv('MEMORY_SNAPSHOT_DIR')
+    app.config['MEMORY_SNAPSHOT_KEEP'] = int(os.getenv('MEMORY_SNAPSHOT_KEEP', 20))
+    
     # Configure CORS
     CORS(app, 
      origins=["http://localhost:3000", "http://127.0.0.1:3000", "http://127.0.0.1:5000"],
@@ -43,13 +154,103 @@ def create_app():
     
     # Initialize extensions
     db.init_app(app)
+    user_cache.init_app(app)
+    device_registry.init_app(app)
+    access_index.init_app(app)
+    device_health.init_app(app)
+    password_hasher.init_app(app)
+    metrics.init_app(app)
+    slow_query_log.init_app(app)
+    traffic_recorder.init_app(app)
+    request_profiler.init_app(app)
+    background_sampler.init_app(app)
+    memory_snapshots.init_app(app)
     
     # Setup Flask-Login
     login_manager = LoginManager(app)
     login_manager.login_view = 'auth.login'
     login_manager.session_protection = "strong"
+    init_token_auth(app, login_manager)
     
-    migrate = Migrate(app, db)
+    # Alembic is only needed by `flask db ...`; skip it for served workers
+    if os.getenv('FLASK_RUN_FROM_CLI'):
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    
+    @app.cli.command('bootstrap')
+    def bootstrap_command():
+        """Create tables and the admin user, then take a backup"""
+        bootstrap_database(app)
+        backup_database(app)
+    
+    @app.cli.command('memory-top')
+    @click.argument('snapshot_id')
+    @click.option('--limit', default=20)
+    def memory_top_command(snapshot_id, limit):
+        """Show the largest allocation sites in a saved tracemalloc snapshot"""
+        for stat in memory_snapshots.top(snapshot_id, limit):
+            click.echo(f"{stat['size_kb']:>10} KiB {stat['count']:>8} blocks  {stat['location']}")
+    
+    @app.cli.command('memory-diff')
+    @click.argument('old_id')
+    @click.argument('new_id')
+    @click.option('--limit', default=20)
+    def memory_diff_command(old_id, new_id, limit):
+        """Show allocation growth between two saved tracemalloc snapshots"""
+        for stat in memory_snapshots.diff(old_id, new_id, limit):
+            click.echo(f"{stat['size_diff_kb']:>+10} KiB {stat['count_diff']:>+8} blocks  {stat['location']}")
+    
+    @app.cli.command('import-devices')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'json']), help='Defaults to the file extension')
+    @click.option('--dry-run', is_flag=True, help='Validate only')
+    def import_devices_command(path, fmt, dry_run):
+        """Add or update devices from a CSV or JSON file in one transaction"""
+        fmt = fmt or ('json' if path.lower().endswith('.json') else 'csv')
+        try:
+            with open(path, 'rb') as f:
+                rows = parse_devices(f.read(), fmt)
+            result = import_devices(rows, dry_run=dry_run)
+        except DeviceImportError as e:
+            for error in e.errors:
+                click.echo(f"row {error['row']}: {error['field']}: {error['message']}", err=True)
+            raise click.ClickException(str(e))
+        except ValueError as e:
+            raise click.ClickException(f'Could not parse {path}: {str(e)}')
+        if not dry_run:
+            device_registry.invalidate()
+        click.echo(f"{'Validated' if dry_run else 'Imported'} {len(rows)} devices "
+                   f"({result['inserted']} new, {result['updated']} updated)")
+    
+    @app.cli.command('import-users')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'json']), help='Defaults to the file extension')
+    @click.option('--dry-run', is_flag=True, help='Validate only')
+    def import_users_command(path, fmt, dry_run):
+        """Create users from a CSV or JSON file, hashing passwords in parallel"""
+        fmt = fmt or ('json' if path.lower().endswith('.json') else 'csv')
+        try:
+            with open(path, 'rb') as f:
+                rows = parse_users(f.read(), fmt)
+            result = import_users(rows, dry_run=dry_run)
+        except ValueError as e:
+            raise click.ClickException(f'Could not read {path}: {str(e)}')
+        for row in result['results']:
+            if row['status'] == 'error':
+                click.echo(f"row {row['row']} ({row['user_name'] or '-'}): {'; '.join(row['errors'])}", err=True)
+        click.echo(f"{'Validated' if dry_run else 'Created'} {result['valid']} of {len(rows)} users, "
+                   f"{result['failed']} failed")
+    
+    @app.cli.command('probe-devices')
+    def probe_devices_command():
+        """Probe every device endpoint once and update the shared health file"""
+        report = device_health.run_once(app)
+        for device_id, endpoints in sorted(report['devices'].items()):
+            for endpoint, result in endpoints.items():
+                state = f"up {result['latency_ms']} ms" if result['reachable'] else f"down ({result['error']})"
+                click.echo(f"{device_id:<20} {endpoint:<14} {state}")
+        click.echo(f"Probed {sum(len(endpoints) for endpoints in report['devices'].values())} endpoints "
+                   f"in {report['duration_ms']} ms")
     
     # Register blueprints
     from routes.auth_routes import auth_bp
@@ -57,16 +258,19 @@ def create_app():
     from routes.user_routes import user_bp
     from routes.reservation_routes import reservation_bp
     from routes.history_routes import history_bp
+    from routes.diagnostics_routes import diagnostics_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(device_bp)
     app.register_blueprint(user_bp)
     app.register_blueprint(reservation_bp)
     app.register_blueprint(history_bp)
+    app.register_blueprint(diagnostics_bp)
     
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        with uncounted():
+            return user_cache.get(int(user_id), lambda uid: db.session.get(User, uid))
     
     # After request handler
     @app.after_request
@@ -77,59 +281,95 @@ def create_app():
         response.headers.add('Access-Control-Allow-Credentials', 'true')
         return response
 
-    # Database backup function with timestamp and retention policy
-    def backup_database():
-        # Create backup directory if it doesn't exist
-        os.makedirs(app.config['BACKUP_DIR'], exist_ok=True)
-        
-        # Generate timestamped filename
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_filename = f"device_list_backup_{timestamp}.db"
-        backup_path = os.path.join(app.config['BACKUP_DIR'], backup_filename)
-        
-        # Get the path to the current database
-        db_path = app.instance_path
-        if not os.path.exists(db_path):
-            os.makedirs(db_path, exist_ok=True)
-        db_path = os.path.join(db_path, 'device_list.db')
-        
-        try:
-            # Only backup if database exists
-            if os.path.exists(db_path):
-                shutil.copy2(db_path, backup_path)
-                app.logger.info(f"Database backed up to {backup_path}")
-                
-                # Clean up old backups (keep only the most recent N backups)
-                backups = []
-                for file in os.listdir(app.config['BACKUP_DIR']):
-                    if file.startswith('device_list_backup_') and file.endswith('.db'):
-                        file_path = os.path.join(app.config['BACKUP_DIR'], file)
-                        backups.append((file_path, os.path.getctime(file_path)))
-                
-                # Sort by creation time (oldest first)
-                backups.sort(key=lambda x: x[1])
-                
-                # Remove oldest backups if we exceed retention limit
-                while len(backups) > app.config['BACKUP_RETENTION']:
-                    oldest_backup = backups.pop(0)
-                    os.remove(oldest_backup[0])
-                    app.logger.info(f"Removed old backup: {oldest_backup[0]}")
-            else:
-                app.logger.warning("Database file not found for backup")
-                
-        except Exception as e:
-            app.logger.error(f"Backup failed: {str(e)}")
+    atexit.register(password_hasher.shutdown)
+
+    if start_services:
+        start_scheduler(app)
+
+    if bootstrap is None:
+        bootstrap = {'eager': True, 'lazy': 'lazy'}.get(app.config['BOOTSTRAP_MODE'], False)
+    if bootstrap == 'lazy':
+        defer_bootstrap(app)
+    elif bootstrap:
+        bootstrap_database(app)
+
+    # Registered last so the one-off lazy bootstrap isn't counted against the first request
+    query_inspector.init_app(app)
+
+    return app
+
+
+# Database backup function with timestamp and retention policy
+def backup_database(app):
+    # Create backup directory if it doesn't exist
+    os.makedirs(app.config['BACKUP_DIR'], exist_ok=True)
+    
+    # Generate timestamped filename
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    backup_filename = f"device_list_backup_{timestamp}.db"
+    backup_path = os.path.join(app.config['BACKUP_DIR'], backup_filename)
     
+    # Get the path to the current database
+    db_path = app.instance_path
+    if not os.path.exists(db_path):
+        os.makedirs(db_path, exist_ok=True)
+    db_path = os.path.join(db_path, 'device_list.db')
+    
+    try:
+        # Only backup if database exists
+        if os.path.exists(db_path):
+            shutil.copy2(db_path, backup_path)
+            app.logger.info(f"Database backed up to {backup_path}")
+            
+            # Clean up old backups (keep only the most recent N backups)
+            backups = []
+            for file in os.listdir(app.config['BACKUP_DIR']):
+                if file.startswith('device_list_backup_') and file.endswith('.db'):
+                    file_path = os.path.join(app.config['BACKUP_DIR'], file)
+                    backups.append((file_path, os.path.getctime(file_path)))
+            
+            # Sort by creation time (oldest first)
+            backups.sort(key=lambda x: x[1])
+            
+            # Remove oldest backups if we exceed retention limit
+            while len(backups) > app.config['BACKUP_RETENTION']:
+                oldest_backup = backups.pop(0)
+                os.remove(oldest_backup[0])
+                app.logger.info(f"Removed old backup: {oldest_backup[0]}")
+        else:
+            app.logger.warning("Database file not found for backup")
+            
+    except Exception as e:
+        app.logger.error(f"Backup failed: {str(e)}")
+
+
+def start_scheduler(app):
+    """Start the backup and device probe scheduler; must run in exactly one process"""
     # Initialize scheduler only if not in testing mode
-    if not os.getenv('TESTING'):
-        scheduler = BackgroundScheduler()
-        scheduler.add_job(func=backup_database, trigger='interval', minutes=5)
-        scheduler.start()
-        
-        # Shut down the scheduler when exiting the app
-        atexit.register(lambda: scheduler.shutdown())
-
-    # Create tables and admin user
+    if os.getenv('TESTING'):
+        return None
+
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    scheduler = BackgroundScheduler()
+    # The first backup runs on the scheduler thread instead of delaying startup
+    scheduler.add_job(func=backup_database, args=[app], trigger='interval', minutes=5,
+                      next_run_time=datetime.now() + timedelta(seconds=30))
+    if app.config.get('DEVICE_PROBE_ENABLED'):
+        scheduler.add_job(func=device_health.run_once, args=[app], trigger='interval',
+                          seconds=app.config['DEVICE_PROBE_INTERVAL'], max_instances=1, coalesce=True,
+                          next_run_time=datetime.now() + timedelta(seconds=5))
+    scheduler.start()
+    # Under gunicorn the scheduler lives in the master, which never serves a request
+    background_sampler.start()
+    
+    # Shut down the scheduler when exiting the app
+    atexit.register(lambda: scheduler.shutdown())
+    return scheduler
+
+
+def bootstrap_database(app):
+    """Create tables and admin user"""
     with app.app_context():
         try:
             db.create_all()
@@ -142,7 +382,7 @@ def create_app():
                 admin = User(
                     user_name=admin_username,
                     user_ip='127.0.0.1',
-                    password_hash=generate_password_hash(admin_password),
+                    password_hash=password_hasher.hash(admin_password),
                     role='admin',
                     created_at=datetime.utcnow()
                 )
@@ -150,9 +390,15 @@ def create_app():
                 db.session.commit()
                 app.logger.info("Admin user created successfully")
             
-            # Create initial backup if not in testing mode
-            if not os.getenv('TESTING'):
-                backup_database()
+            # create_all only builds indexes with new tables; databases made before the user search need this one
+            db.session.execute(db.text(
+                'CREATE INDEX IF NOT EXISTS ix_users_user_name_lower ON users (lower(user_name), id)'
+            ))
+            db.session.commit()
+            
+            if backfill_rollups(db.session.connection()):
+                db.session.commit()
+                app.logger.info("Utilization rollups rebuilt from existing history")
                 
         except Exception as e:
             app.logger.error(f"Database initialization failed: {str(e)}")
@@ -160,7 +406,39 @@ def create_app():
             if os.getenv('FLASK_ENV') == 'development':
                 raise
 
-    return app
+
+def defer_bootstrap(app):
+    """Run bootstrap_database once, before the first request is handled"""
+    lock = threading.Lock()
+    state = {'done': False}
+
+    @app.before_request
+    def bootstrap_on_first_request():
+        if state['done']:
+            return
+        with lock:
+            if not state['done']:
+                bootstrap_database(app)
+                state['done'] = True
+
+
+def reset_after_fork(app):
+    """Drop per-process state inherited from a preloaded master"""
+    with app.app_context():
+        for engine in db.engines.values():
+            # Leave the parent's pooled connections alone, just stop using them
+            engine.dispose(close=False)
+    password_hasher.after_fork()
+    user_cache.after_fork()
+    device_registry.after_fork()
+    access_index.after_fork()
+    device_health.after_fork()
+    metrics.reset_after_fork()
+    slow_query_log.after_fork()
+    traffic_recorder.after_fork()
+    background_sampler.after_fork()
+    log_pipeline.after_fork()
+
 
 if __name__ == '__main__':
     app = create_app()
@@ -0,0 +1,112 @@
+"""Bulk device import benchmark
+
+Generates a CSV of N devices (10k by default), then times the bulk
+import on a scratch SQLite database twice: once when every row is new and
+once when every row updates an existing device. For comparison it also
+times a sample of single POST /api/devices/add calls and extrapolates
+that rate to N devices.
+
+    python benchmarks/device_import.py
+    python benchmarks/device_import.py --devices 50000 --per-device-sample 500
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def device_csv(count, prefix='lab', octet=10):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['device_id', 'PC_IP', 'Rutomatrix_ip', 'Pulse1_Ip', 'CT1_ip'])
+    for i in range(count):
+        base = f'{octet}.{(i >> 8) & 255}.{i & 255}'
+        writer.writerow([f'{prefix}_{i:05d}', f'{base}.10', f'{base}.11', f'{base}.12', f'{base}.13'])
+    return output.getvalue()
+
+
+def build_app(workdir):
+    os.environ['TESTING'] = '1'
+    os.environ['DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'device_import.db')}"
+    os.environ['PASSWORD_HASH_WORKERS'] = '0'
+    os.environ['SQL_BUDGET_MODE'] = 'off'
+
+    from app import bootstrap_database, create_app
+    app = create_app(bootstrap=False, start_services=False)
+    bootstrap_database(app)
+    return app
+
+
+def time_import(app, data):
+    from utils.device_import import import_devices, parse_devices
+
+    with app.app_context():
+        started = time.perf_counter()
+        rows = parse_devices(data, 'csv')
+        parsed = time.perf_counter()
+        result = import_devices(rows)
+        finished = time.perf_counter()
+    return {
+        **result,
+        'parse_ms': round((parsed - started) * 1000, 1),
+        'validate_and_upsert_ms': round((finished - parsed) * 1000, 1),
+        'total_ms': round((finished - started) * 1000, 1),
+        'devices_per_second': round(len(rows) / (finished - started))
+    }
+
+
+def time_single_adds(app, count):
+    client = app.test_client()
+    client.post('/login', json={'username': os.getenv('ADMIN_USERNAME', 'admin'),
+                                'password': os.getenv('ADMIN_PASSWORD', 'admin123')})
+    started = time.perf_counter()
+    for i in range(count):
+        base = f'172.16.{(i >> 8) & 255}.{i & 255}'
+        response = client.post('/api/devices/add', data={
+            'device_id': f'single_{i:05d}', 'PC_IP': f'{base}', 'Rutomatrix_ip': f'{base}',
+            'Pulse1_Ip': f'{base}', 'CT1_ip': f'{base}'
+        })
+        if response.status_code != 200:
+            raise RuntimeError(f'/api/devices/add returned {response.status_code}: {response.get_data(as_text=True)[:200]}')
+    elapsed = time.perf_counter() - started
+    return {
+        'count': count,
+        'total_ms': round(elapsed * 1000, 1),
+        'ms_per_device': round(elapsed / count * 1000, 3),
+        'devices_per_second': round(count / elapsed)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--devices', type=int, default=10000)
+    parser.add_argument('--per-device-sample', type=int, default=200,
+                        help='Single /api/devices/add calls to time for comparison (0 to skip)')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    data = device_csv(args.devices)
+    with tempfile.TemporaryDirectory() as workdir:
+        app = build_app(workdir)
+        report = {'devices': args.devices, 'csv_bytes': len(data)}
+        report['bulk_insert'] = time_import(app, data)
+        report['bulk_update'] = time_import(app, device_csv(args.devices, octet=11))
+        if args.per_device_sample:
+            single = time_single_adds(app, args.per_device_sample)
+            single['extrapolated_ms_for_all'] = round(single['ms_per_device'] * args.devices, 1)
+            report['single_add'] = single
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
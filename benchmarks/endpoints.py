@@ -0,0 +1,300 @@
+"""Endpoint benchmark suite
+
+Seeds (or reuses) a scratch SQLite database with benchmarks/seed_data.py,
+then drives every read endpoint, plus login, through the Flask test client
+(app cost only) and through a real local threaded server (adds HTTP and
+threading). It reports p50/p95/p99 latency and throughput per endpoint
+and writes JSON so that runs can be compared. Latency covers 2xx responses
+only; endpoints that answer with errors are listed on stderr and fail the
+run unless --allow-errors is given.
+
+    python benchmarks/endpoints.py --scale small --output results/base.json
+    python benchmarks/endpoints.py --db /tmp/bench.db --compare results/base.json --tolerance 20
+
+Endpoints that change data are skipped so every run sees the same dataset;
+GET routes the suite doesn't know how to fill in are reported under
+"skipped", so new endpoints show up there until they're added.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from login_storm import summarize  # noqa: E402
+from seed_data import BENCH_PASSWORD, SCALES, seed  # noqa: E402
+
+# Routes left out on purpose: they change data, end the session or serve files.
+# The dashboard and reservation pages delete expired reservations on GET.
+SKIP_ENDPOINTS = {'static', 'auth.logout', 'auth.refresh_token', 'reservation.dashboard', 'reservation.view_reservations'}
+# Routes that only answer when a feature the benchmark leaves off is running
+DISABLED_ENDPOINTS = {
+    'device.get_devices_health': 'device probing is off',
+    'diagnostics.sampler_stacks': 'background sampler is off',
+    'diagnostics.memory_snapshot_diff': 'needs saved memory snapshots'
+}
+
+
+def sample_values(path):
+    """Real ids from the seeded database to fill in URL parameters"""
+    conn = sqlite3.connect(path)
+    try:
+        device_id = conn.execute('SELECT device_id FROM devices ORDER BY device_id LIMIT 1').fetchone()[0]
+        user_id = conn.execute("SELECT id FROM users WHERE user_name LIKE 'bench_user_%' ORDER BY id LIMIT 1").fetchone()[0]
+        record_id = conn.execute('SELECT MAX(id) FROM device_usage_history').fetchone()[0]
+        latest = conn.execute('SELECT MAX(actual_start_time) FROM device_usage_history').fetchone()[0]
+    finally:
+        conn.close()
+    return {
+        'device_id': device_id,
+        'user_id': user_id,
+        'record_id': record_id,
+        'ip_type': 'PC_IP',
+        'export_from': (latest or datetime.utcnow().isoformat())[:10]
+    }
+
+
+def build_requests(app, samples):
+    """One request per benchmarkable route: (name, method, url, json body)"""
+    # A window starting shortly in the future (IST), so availability accepts it
+    start = datetime.utcnow() + timedelta(hours=5, minutes=35)
+    window = f"?start_time={start.strftime('%Y-%m-%dT%H:%M')}&end_time={(start + timedelta(hours=2)).strftime('%Y-%m-%dT%H:%M')}"
+    query_strings = {
+        'device.get_devices_with_status': window,
+        'reservation.get_devices_with_availability': window,
+        'history.get_history_page': '?per_page=50',
+        'history.get_utilization_stats': '?scope=device',
+        'device.get_devices_drivers': f"?device_ids={samples['device_id']}",
+        'reservation.access_check': f"?device_id={samples['device_id']}&user_id={samples['user_id']}",
+        # One day keeps an export comparable across scales
+        'history.export_usage_records': f"?format=ndjson&from={samples['export_from']}&to={samples['export_from']}"
+    }
+
+    requests, skipped = [], []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        if rule.endpoint in SKIP_ENDPOINTS:
+            continue
+        if rule.endpoint in DISABLED_ENDPOINTS:
+            skipped.append({'endpoint': rule.endpoint, 'rule': rule.rule, 'reason': DISABLED_ENDPOINTS[rule.endpoint]})
+            continue
+        if 'GET' not in rule.methods:
+            if rule.endpoint != 'auth.login':
+                skipped.append({'endpoint': rule.endpoint, 'rule': rule.rule, 'reason': 'changes data'})
+            continue
+        values = {}
+        for argument in rule.arguments:
+            if argument not in samples:
+                break
+            values[argument] = samples[argument]
+        else:
+            url = rule.build(values, append_unknown=False)[1] + query_strings.get(rule.endpoint, '')
+            requests.append((f'GET {rule.rule}', 'GET', url, None))
+            continue
+        skipped.append({'endpoint': rule.endpoint, 'rule': rule.rule, 'reason': 'no sample for URL parameter'})
+
+    requests.append(('POST /login', 'POST', '/login', {'username': 'bench_user_000000', 'password': BENCH_PASSWORD}))
+    return requests, skipped
+
+
+def report(samples, elapsed):
+    """Latency and throughput of the 2xx responses among (seconds, status) samples
+
+    Error responses are usually much faster or slower than real work, so
+    they are only counted.
+    """
+    latencies = [latency for latency, status in samples if 200 <= status < 300]
+    result = summarize(latencies)
+    result['throughput_rps'] = round(len(latencies) / elapsed, 2) if elapsed else None
+    result['errors'] = len(samples) - len(latencies)
+    statuses = Counter(status for _, status in samples)
+    result['status_counts'] = {str(code): count for code, count in sorted(statuses.items())}
+    return result
+
+
+def failing_endpoints(results):
+    return [{'mode': mode, 'endpoint': name, 'status_counts': stats['status_counts']}
+            for mode, endpoints in results.items() for name, stats in endpoints.items() if stats['errors']]
+
+
+def run_test_client(app, requests, iterations, admin_credentials):
+    client = app.test_client()
+    client.post('/login', json=admin_credentials)
+    results = {}
+    for name, method, url, body in requests:
+        samples = []
+        started = time.perf_counter()
+        for _ in range(iterations):
+            request_started = time.perf_counter()
+            response = client.open(url, method=method, json=body)
+            response.get_data()
+            samples.append((time.perf_counter() - request_started, response.status_code))
+        results[name] = report(samples, time.perf_counter() - started)
+        if method == 'POST' and url == '/login':
+            # Logging in as a bench user replaced the admin session
+            client.post('/login', json=admin_credentials)
+    return results
+
+
+def http_call(base_url, method, url, body, cookie):
+    headers = {'Cookie': cookie}
+    data = None
+    if body is not None:
+        data = json.dumps(body).encode()
+        headers['Content-Type'] = 'application/json'
+    request = urllib.request.Request(base_url + url, data=data, headers=headers, method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code
+
+
+def admin_cookie(base_url, admin_credentials):
+    request = urllib.request.Request(base_url + '/login', data=json.dumps(admin_credentials).encode(),
+                                     headers={'Content-Type': 'application/json'}, method='POST')
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return '; '.join(header.split(';', 1)[0] for header in response.headers.get_all('Set-Cookie', []))
+
+
+def run_server(app, requests, iterations, concurrency, port, admin_credentials):
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        cookie = admin_cookie(base_url, admin_credentials)
+        results = {}
+        for name, method, url, body in requests:
+
+            def call(_):
+                request_started = time.perf_counter()
+                status = http_call(base_url, method, url, body, cookie if body is None else '')
+                return time.perf_counter() - request_started, status
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                samples = list(pool.map(call, range(iterations)))
+            results[name] = report(samples, time.perf_counter() - started)
+        return results
+    finally:
+        server.shutdown()
+
+
+def compare(current, baseline, tolerance):
+    """Per-endpoint p95 change against a previous run; regressions exceed the tolerance"""
+    rows, regressions = [], []
+    for mode, endpoints in current['results'].items():
+        for name, stats in endpoints.items():
+            before = baseline.get('results', {}).get(mode, {}).get(name)
+            if not before or not before.get('p95_ms') or stats.get('p95_ms') is None:
+                continue
+            change = round((stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100, 1)
+            row = {'mode': mode, 'endpoint': name, 'baseline_p95_ms': before['p95_ms'],
+                   'p95_ms': stats['p95_ms'], 'change_pct': change}
+            rows.append(row)
+            if change > tolerance:
+                regressions.append(row)
+    return {'tolerance_pct': tolerance, 'endpoints': rows, 'regressions': regressions}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='Existing seeded database to reuse (see seed_data.py)')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='tiny', help='Scale to seed when --db is not given')
+    parser.add_argument('--mode', choices=('client', 'server', 'both'), default='both')
+    parser.add_argument('--iterations', type=int, default=50, help='Requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients against the server')
+    parser.add_argument('--port', type=int, default=5056)
+    parser.add_argument('--only', action='append', help='Only run endpoints whose name contains this text')
+    parser.add_argument('--output', help='Write the JSON results to this file')
+    parser.add_argument('--compare', help='Earlier JSON results to compare p95 latency against')
+    parser.add_argument('--tolerance', type=float, default=20.0, help='Allowed p95 slowdown in percent')
+    parser.add_argument('--allow-errors', action='store_true', help='Exit 0 even if endpoints return non-2xx responses')
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(BENCH_DIR, '.bench', f'{args.scale}.db')
+    seeding = None
+    if not args.db or not os.path.exists(db_path):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        timings, rows = seed(db_path, **SCALES[args.scale])
+        seeding = {'timings': timings, 'rows': rows}
+
+    os.environ['TESTING'] = '1'
+    os.environ['DATABASE_URI'] = f'sqlite:///{os.path.abspath(db_path)}'
+    os.environ['PASSWORD_HASH_WORKERS'] = '0'
+    # Budget checks would fail requests the benchmark exists to measure
+    os.environ['SQL_BUDGET_MODE'] = 'off'
+    os.environ['SLOW_QUERY_MS'] = '0'
+
+    from app import create_app
+
+    app = create_app(bootstrap=False, start_services=False)
+    admin_credentials = {'username': os.getenv('ADMIN_USERNAME', 'admin'),
+                         'password': os.getenv('ADMIN_PASSWORD', 'admin123')}
+    requests, skipped = build_requests(app, sample_values(db_path))
+    if args.only:
+        requests = [request for request in requests if any(text in request[0] for text in args.only)]
+
+    results = {}
+    if args.mode in ('client', 'both'):
+        results['test_client'] = run_test_client(app, requests, args.iterations, admin_credentials)
+    if args.mode in ('server', 'both'):
+        results['server'] = run_server(app, requests, args.iterations, args.concurrency, args.port, admin_credentials)
+
+    conn = sqlite3.connect(db_path)
+    rows = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            for table in ('devices', 'users', 'reservations', 'device_usage_history')}
+    conn.close()
+
+    output = {
+        'started_at': datetime.utcnow().isoformat() + 'Z',
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'config': vars(args),
+        'dataset': {'path': db_path, 'rows': rows, 'seeding': seeding},
+        'results': results,
+        'errors': failing_endpoints(results),
+        'skipped': skipped
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            output['comparison'] = compare(output, json.load(f), args.tolerance)
+
+    print(json.dumps(output, indent=2))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+    for failure in output['errors']:
+        print(f"ERROR: {failure['mode']} {failure['endpoint']} returned {failure['status_counts']}; "
+              "those responses are left out of its latency", file=sys.stderr)
+    if output.get('comparison', {}).get('regressions') or (output['errors'] and not args.allow_errors):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
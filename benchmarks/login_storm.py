@@ -0,0 +1,161 @@
+"""Login-storm benchmark
+
+Starts the app on a local threaded server backed by a scratch SQLite
+database, fires a burst of concurrent logins and, at the same time, polls
+/api/devices to show how much the storm delays ordinary API calls.
+
+    python benchmarks/login_storm.py --logins 200 --concurrency 32 --hash-workers 4
+    python benchmarks/login_storm.py --hash-workers 0   # inline hashing, for comparison
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(int(round(pct / 100 * (len(values) - 1))), len(values) - 1)
+    return round(values[index] * 1000, 2)
+
+
+def summarize(latencies):
+    return {
+        'count': len(latencies),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2) if latencies else None
+    }
+
+
+def build_app(args, workdir):
+    os.environ['TESTING'] = '1'
+    os.environ['DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'login_storm.db')}"
+    os.environ['PASSWORD_HASH_WORKERS'] = str(args.hash_workers)
+    os.environ['PASSWORD_HASH_QUEUE'] = str(args.hash_queue)
+    os.environ['PASSWORD_HASH_METHOD'] = args.hash_method
+
+    from app import bootstrap_database, create_app
+    from models import db, Device, User
+    from utils.password_hashing import password_hasher
+
+    app = create_app(bootstrap=False)
+    bootstrap_database(app)
+    with app.app_context():
+        # Every account shares one hash; only verification cost matters here
+        shared_hash = password_hasher.hash(args.password)
+        db.session.execute(User.__table__.insert(), [
+            {'user_name': f'storm_user_{i}', 'password_hash': shared_hash, 'role': 'user', 'is_active': True}
+            for i in range(args.users)
+        ])
+        db.session.execute(Device.__table__.insert(), [
+            {'device_id': f'rig_{i}'} for i in range(args.devices)
+        ])
+        db.session.commit()
+    return app
+
+
+def post_json(url, payload):
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode(), headers={'Content-Type': 'application/json'}, method='POST'
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--devices', type=int, default=50)
+    parser.add_argument('--hash-workers', type=int, default=4)
+    parser.add_argument('--hash-queue', type=int, default=16)
+    parser.add_argument('--hash-method', default='scrypt:32768:8:1')
+    parser.add_argument('--password', default='storm-password')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    from werkzeug.serving import make_server
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = build_app(args, workdir)
+        server = make_server('127.0.0.1', args.port, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{args.port}'
+
+        login_latencies, statuses = [], {}
+        api_latencies = []
+        storm_done = threading.Event()
+
+        def login(i):
+            started = time.perf_counter()
+            status = post_json(f'{base_url}/login', {
+                'username': f'storm_user_{i % args.users}', 'password': args.password
+            })
+            login_latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+        def poll_api():
+            while not storm_done.is_set():
+                started = time.perf_counter()
+                get(f'{base_url}/api/devices')
+                api_latencies.append(time.perf_counter() - started)
+                time.sleep(0.01)
+
+        poller = threading.Thread(target=poll_api, daemon=True)
+        poller.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(login, range(args.logins)))
+        elapsed = time.perf_counter() - started
+        storm_done.set()
+        poller.join()
+        server.shutdown()
+
+        from utils.password_hashing import password_hasher
+        report = {
+            'config': vars(args),
+            'elapsed_s': round(elapsed, 3),
+            'logins_per_s': round(args.logins / elapsed, 2),
+            'login_status_counts': {str(k): v for k, v in sorted(statuses.items())},
+            'login_latency': summarize(login_latencies),
+            'api_latency_during_storm': summarize(api_latencies),
+            'hasher': password_hasher.stats()
+        }
+        password_hasher.shutdown()
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Replay recorded traffic against a local instance
+
+Reads the files written by the traffic recorder (TRAFFIC_RECORD_DIR),
+re-issues the requests with their original spacing divided by --speed, and
+compares replay latency per endpoint with the latency recorded live.
+
+    TRAFFIC_RECORD_DIR=instance/traffic flask run            # record
+    python benchmarks/replay.py instance/traffic --target http://127.0.0.1:5000 --speed 1
+    python benchmarks/replay.py instance/traffic --speed 10 --workers 32 --read-only --output replay.json
+
+Recorded bodies are anonymized, so every request runs as the --login user;
+recorded logins are re-sent with those credentials, and hashed names in
+bodies will not match real rows. Use --speed 0 to send as fast as the
+workers allow.
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from endpoints import admin_cookie, http_call  # noqa: E402
+from login_storm import summarize  # noqa: E402
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def load_recording(paths):
+    """Recorded entries from files or directories, oldest first"""
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(os.path.join(path, '*.jsonl.gz'))) if os.path.isdir(path) else [path])
+
+    entries = []
+    for path in files:
+        opener = gzip.open if path.endswith('.gz') else open
+        try:
+            with opener(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except EOFError:
+            # A recorder that is still running leaves the last gzip member open
+            pass
+    entries.sort(key=lambda entry: entry['t'])
+    return entries
+
+
+def latency_summary(values_ms):
+    return summarize([value / 1000 for value in values_ms])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('recording', nargs='+', help='Recording files or directories')
+    parser.add_argument('--target', default='http://127.0.0.1:5000')
+    parser.add_argument('--speed', type=float, default=1.0, help='Time scale: 1 is real time, 10 is ten times faster')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--login', default=f"{os.getenv('ADMIN_USERNAME', 'admin')}:{os.getenv('ADMIN_PASSWORD', 'admin123')}",
+                        help='user:password every request runs as')
+    parser.add_argument('--read-only', action='store_true', help='Skip requests that change data')
+    parser.add_argument('--limit', type=int, help='Replay only the first N requests')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    entries = load_recording(args.recording)
+    entries = [entry for entry in entries if entry.get('e') not in ('auth.logout', 'metrics_endpoint')]
+    if args.read_only:
+        entries = [entry for entry in entries if entry['m'] in READ_METHODS or entry.get('e') == 'auth.login']
+    if args.limit:
+        entries = entries[:args.limit]
+    if not entries:
+        sys.exit('No recorded requests to replay')
+
+    username, _, password = args.login.partition(':')
+    credentials = {'username': username, 'password': password}
+    cookie = admin_cookie(args.target, credentials)
+
+    results = {}
+    lock = threading.Lock()
+    lag = []
+
+    def replay(entry, scheduled):
+        started = time.perf_counter()
+        url = entry['p'] + (f"?{entry['q']}" if entry.get('q') else '')
+        body = entry.get('b')
+        if entry.get('e') == 'auth.login':
+            # Recorded credentials are redacted; a separate login leaves the shared session alone
+            status = http_call(args.target, 'POST', url, credentials, '')
+        else:
+            status = http_call(args.target, entry['m'], url, body, cookie)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with lock:
+            lag.append(max(started - scheduled, 0))
+            result = results.setdefault(entry.get('e') or entry['p'], {'recorded': [], 'replayed': [], 'status_changes': 0})
+            result['recorded'].append(entry['d'])
+            result['replayed'].append(elapsed_ms)
+            if status != entry['s']:
+                result['status_changes'] += 1
+
+    first = entries[0]['t']
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for entry in entries:
+            scheduled = started + ((entry['t'] - first) / args.speed if args.speed > 0 else 0)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(replay, entry, scheduled)
+    elapsed = time.perf_counter() - started
+
+    recorded_span = entries[-1]['t'] - first
+    report = {
+        'config': vars(args),
+        'requests': len(entries),
+        'recorded_span_s': round(recorded_span, 3),
+        'replay_elapsed_s': round(elapsed, 3),
+        'replay_throughput_rps': round(len(entries) / elapsed, 2) if elapsed else None,
+        # How late requests started versus their schedule; high values mean too few workers
+        'schedule_lag': summarize(lag),
+        'overall': {
+            'recorded': latency_summary([value for result in results.values() for value in result['recorded']]),
+            'replayed': latency_summary([value for result in results.values() for value in result['replayed']])
+        },
+        'endpoints': {
+            name: {
+                'recorded': latency_summary(result['recorded']),
+                'replayed': latency_summary(result['replayed']),
+                'status_changes': result['status_changes']
+            }
+            for name, result in sorted(results.items(), key=lambda item: -len(item[1]['replayed']))
+        }
+    }
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""Synthetic data generator for benchmarks
+
+Creates the schema through the app, then bulk-loads devices, users,
+reservations and usage rows straight through sqlite3 (journal off, one
+transaction, executemany in chunks) and rebuilds the utilization rollups
+with set-based SQL, since bulk inserts bypass the ORM listeners.
+
+    python benchmarks/seed_data.py /tmp/bench.db --scale small
+    python benchmarks/seed_data.py /tmp/bench.db --devices 1000 --users 10000 \\
+        --reservations 5000000 --usage 5000000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCALES = {
+    'tiny': {'devices': 20, 'users': 50, 'reservations': 2000, 'usage': 1500},
+    'small': {'devices': 200, 'users': 1000, 'reservations': 100000, 'usage': 80000},
+    'medium': {'devices': 1000, 'users': 10000, 'reservations': 1000000, 'usage': 800000},
+    'large': {'devices': 1000, 'users': 10000, 'reservations': 5000000, 'usage': 5000000}
+}
+BENCH_PASSWORD = 'bench-password'
+PURPOSES = ('Regression run', 'Firmware flash', 'Debug session', 'Demo', None)
+
+
+def sql_time(value):
+    """Naive IST datetime in the text format ISTDateTime stores in SQLite"""
+    return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def create_schema(path):
+    """Create tables and the admin user through the app, and return a shared password hash"""
+    os.environ.setdefault('TESTING', '1')
+    os.environ['DATABASE_URI'] = f'sqlite:///{os.path.abspath(path)}'
+    os.environ['PASSWORD_HASH_WORKERS'] = '0'
+
+    from app import bootstrap_database, create_app
+    from utils.password_hashing import password_hasher
+
+    app = create_app(bootstrap=False, start_services=False)
+    bootstrap_database(app)
+    with app.app_context():
+        # Every generated account shares one hash so seeding doesn't spend minutes hashing
+        return password_hasher.hash(BENCH_PASSWORD)
+
+
+def device_rows(count):
+    for i in range(count):
+        octet2, octet3 = divmod(i, 250)
+        yield (f'rig_{i:05d}', f'10.{octet2}.{octet3}.10', f'10.{octet2}.{octet3}.11',
+               f'10.{octet2}.{octet3}.12', f'10.{octet2}.{octet3}.13')
+
+
+def user_rows(count, password_hash, created_at):
+    for i in range(count):
+        yield (f'bench_user_{i:06d}', f'192.168.{i // 250 % 250}.{i % 250 + 1}', password_hash, 'user', 1,
+               sql_time(created_at))
+
+
+def booking_rows(rng, count, devices, first_user_id, users, first_reservation_id, usage_ratio, now, days):
+    """Yield (reservation row, usage rows) pairs; usage is generated alongside so memory stays flat"""
+    window = int(days * 86400)
+    for i in range(count):
+        # 95% in the past, the rest spread over the coming week
+        offset = rng.randrange(window) if rng.random() < 0.95 else -rng.randrange(7 * 86400)
+        start = now - timedelta(seconds=offset)
+        end = start + timedelta(minutes=rng.choice((30, 60, 60, 120, 240)))
+        status = 'expired' if end < now else 'active' if start <= now else 'upcoming'
+        device_id = f'rig_{rng.randrange(devices):05d}'
+        user_id = first_user_id + rng.randrange(users)
+        reservation = (device_id, user_id, sql_time(start), sql_time(end), rng.choice(PURPOSES), status)
+
+        usage = []
+        if start <= now:
+            sessions = int(usage_ratio) + (rng.random() < usage_ratio % 1)
+            for _ in range(sessions):
+                actual_start = start + timedelta(minutes=rng.randrange(10))
+                if end >= now:
+                    actual_end, usage_status, reason = None, 'active', None
+                elif rng.random() < 0.1:
+                    actual_end, usage_status, reason = actual_start + (end - actual_start) / 2, 'terminated', 'Terminated by admin'
+                else:
+                    actual_end, usage_status, reason = end, 'completed', None
+                usage.append((device_id, user_id, first_reservation_id + i, sql_time(actual_start),
+                              sql_time(actual_end) if actual_end else None, usage_status, reason))
+        yield reservation, usage
+
+
+def rebuild_rollups(conn):
+    """Recompute the utilization tables from the seeded rows"""
+    from models.utilization import rollup_rebuild_sql
+
+    now = sql_time(datetime.utcnow())
+    for statement in rollup_rebuild_sql():
+        conn.execute(statement, {'now': now})
+
+
+def seed(path, devices, users, reservations, usage, days=90, seed_value=1, chunk_size=50000):
+    """Create and fill a scratch database at path; returns timings and actual row counts"""
+    if os.path.exists(path):
+        os.remove(path)
+    timings = {}
+    started = time.perf_counter()
+    password_hash = create_schema(path)
+    timings['schema_s'] = round(time.perf_counter() - started, 3)
+
+    rng = random.Random(seed_value)
+    now = datetime.utcnow() + timedelta(hours=5, minutes=30)
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('PRAGMA cache_size=-200000')
+    conn.execute('BEGIN')
+
+    def load(name, statement, rows):
+        table_started = time.perf_counter()
+        for chunk in chunked(rows, chunk_size):
+            conn.executemany(statement, chunk)
+        timings[f'{name}_s'] = round(time.perf_counter() - table_started, 3)
+
+    load('devices', 'INSERT INTO devices (device_id, "PC_IP", "Rutomatrix_ip", "Pulse1_Ip", "CT1_ip") VALUES (?, ?, ?, ?, ?)',
+         device_rows(devices))
+    first_user_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM users').fetchone()[0]
+    load('users', 'INSERT INTO users (user_name, user_ip, password_hash, role, is_active, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+         user_rows(users, password_hash, now))
+    # Usage rows hang off reservations that have started (about 95% of them)
+    first_reservation_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM reservations').fetchone()[0]
+    usage_ratio = usage / (reservations * 0.95) if reservations else 0
+    bookings_started = time.perf_counter()
+    for chunk in chunked(booking_rows(rng, reservations, devices, first_user_id, users, first_reservation_id,
+                                      usage_ratio, now, days), chunk_size):
+        conn.executemany('INSERT INTO reservations (device_id, user_id, start_time, end_time, purpose, status) '
+                         'VALUES (?, ?, ?, ?, ?, ?)', [reservation for reservation, _ in chunk])
+        conn.executemany('INSERT INTO device_usage_history (device_id, user_id, reservation_id, actual_start_time, '
+                         'actual_end_time, status, termination_reason) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         [row for _, usage_rows in chunk for row in usage_rows])
+    timings['reservations_and_usage_s'] = round(time.perf_counter() - bookings_started, 3)
+
+    rollups_started = time.perf_counter()
+    rebuild_rollups(conn)
+    timings['rollups_s'] = round(time.perf_counter() - rollups_started, 3)
+    counts = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+              for table in ('devices', 'users', 'reservations', 'device_usage_history')}
+    conn.execute('COMMIT')
+    conn.execute('ANALYZE')
+    conn.close()
+    timings['total_s'] = round(time.perf_counter() - started, 3)
+    return timings, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help='SQLite file to create (overwritten)')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--devices', type=int)
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--reservations', type=int)
+    parser.add_argument('--usage', type=int)
+    parser.add_argument('--days', type=int, default=90, help='How far back reservations go')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    counts = dict(SCALES[args.scale])
+    for name in counts:
+        if getattr(args, name) is not None:
+            counts[name] = getattr(args, name)
+
+    timings, actual = seed(args.path, days=args.days, seed_value=args.seed, **counts)
+    print(json.dumps({'path': args.path, 'requested': counts, 'rows': actual, 'timings': timings}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
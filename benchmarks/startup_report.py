@@ -0,0 +1,100 @@
+"""Cold-start report for a new worker
+
+Runs `python -X importtime` in a fresh interpreter, builds the app the same
+way wsgi.py does and reports the slowest imports plus the time spent in
+create_app(). Use --max-ms to fail when cold start regresses.
+
+    python benchmarks/startup_report.py
+    python benchmarks/startup_report.py --top 15 --max-ms 1500 --output startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+app = app_module.create_app(bootstrap=False, start_services=False)
+built = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'create_app_ms': (built - imported) * 1000}))
+"""
+
+
+def parse_importtime(stderr):
+    """Return (module, self_us, cumulative_us, depth) tuples from -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type=int, default=20, help='How many imports to list')
+    parser.add_argument('--max-ms', type=float, help='Exit non-zero when import + create_app exceeds this')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ)
+        env.setdefault('DATABASE_URI', f"sqlite:///{os.path.join(workdir, 'startup.db')}")
+        env.setdefault('TESTING', '1')
+        env.pop('FLASK_RUN_FROM_CLI', None)
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE],
+            cwd=ROOT, env=env, capture_output=True, text=True
+        )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        sys.exit(result.returncode)
+
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    rows = parse_importtime(result.stderr)
+    top_level = sorted((r for r in rows if r[3] == 1), key=lambda r: r[2], reverse=True)
+    slowest_self = sorted(rows, key=lambda r: r[1], reverse=True)
+
+    report = {
+        'import_ms': round(timings['import_ms'], 1),
+        'create_app_ms': round(timings['create_app_ms'], 1),
+        'total_ms': round(timings['import_ms'] + timings['create_app_ms'], 1),
+        'modules_imported': len(rows),
+        'top_level_imports': [
+            {'module': name, 'cumulative_ms': round(cum / 1000, 1)} for name, _, cum, _ in top_level[:args.top]
+        ],
+        'slowest_self_imports': [
+            {'module': name, 'self_ms': round(own / 1000, 1)} for name, own, _, _ in slowest_self[:args.top]
+        ]
+    }
+
+    print(f"import app:   {report['import_ms']:8.1f} ms")
+    print(f"create_app(): {report['create_app_ms']:8.1f} ms")
+    print(f"total:        {report['total_ms']:8.1f} ms  ({report['modules_imported']} modules)")
+    print('\nTop-level imports by cumulative time:')
+    for entry in report['top_level_imports']:
+        print(f"  {entry['cumulative_ms']:8.1f} ms  {entry['module']}")
+    print('\nSlowest modules by self time:')
+    for entry in report['slowest_self_imports']:
+        print(f"  {entry['self_ms']:8.1f} ms  {entry['module']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.max_ms is not None and report['total_ms'] > args.max_ms:
+        print(f"\nCold start {report['total_ms']} ms exceeds budget of {args.max_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
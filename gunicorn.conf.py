@@ -0,0 +1,21 @@
+# gunicorn -c gunicorn.conf.py wsgi:app
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('WEB_THREADS', 4))
+timeout = int(os.getenv('WEB_TIMEOUT', 60))
+
+# Import the app once in the master so workers share its memory copy-on-write
+preload_app = True
+
+
+def when_ready(server):
+    import wsgi
+    wsgi.init_master()
+
+
+def post_fork(server, worker):
+    import wsgi
+    wsgi.init_worker()
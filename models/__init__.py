@@ -3,5 +3,7 @@ from .device import Device
 from .user import User
 from .reservation import Reservation
 from .device_usage import DeviceUsage
+from .utilization import DeviceUtilization, UserUtilization, DailyUtilization
 
-__all__ = ['db', 'Device', 'User', 'Reservation', 'DeviceUsage']
\ No newline at end of file
+__all__ = ['db', 'Device', 'User', 'Reservation', 'DeviceUsage',
+           'DeviceUtilization', 'UserUtilization', 'DailyUtilization']
\ No newline at end of file
@@ -19,9 +19,12 @@ class DeviceUsage(db.Model):
     status = db.Column(db.String(20), default='upcoming')
     termination_reason = db.Column(db.String(100), nullable=True)
     
-    user = db.relationship('User', backref='device_usage', lazy='joined')
-    device = db.relationship('Device', backref='usage_history', lazy='joined')
-    reservation = db.relationship('Reservation', backref='usage_records', lazy='joined')
+    # Relationships must be asked for explicitly with db.joinedload()/db.selectinload();
+    # most history queries only need scalars, and a missing eager load raises
+    # instead of quietly issuing a query per row
+    user = db.relationship('User', backref='device_usage', lazy='raise_on_sql')
+    device = db.relationship('Device', backref='usage_history', lazy='raise_on_sql')
+    reservation = db.relationship('Reservation', backref='usage_records', lazy='raise_on_sql')
 
     def __init__(self, **kwargs):
         ist = pytz.timezone('Asia/Kolkata')
@@ -46,8 +49,8 @@ class DeviceUsage(db.Model):
         return None
 
     @classmethod
-    def get_active_sessions(cls, device_id=None, user_id=None):
-        query = cls.query.filter(
+    def get_active_sessions(cls, device_id=None, user_id=None, options=()):
+        query = cls.query.options(*options).filter(
             cls.actual_start_time.isnot(None),
             cls.actual_end_time.is_(None)
         )
@@ -61,10 +64,27 @@ class DeviceUsage(db.Model):
 
     @classmethod
     def terminate_active_sessions(cls, device_id=None, user_id=None, reason=None):
+        from .utilization import RollupDelta, record_session_end
+
         try:
             ist = pytz.timezone('Asia/Kolkata')
             current_time = datetime.now(ist)
-        
+
+            # Bulk updates bypass the flush hooks, so roll up the ended sessions here
+            ending = db.select(cls.device_id, cls.user_id, cls.actual_start_time).where(
+                cls.actual_start_time.isnot(None),
+                cls.actual_end_time.is_(None)
+            )
+            if device_id:
+                ending = ending.where(cls.device_id == device_id)
+            if user_id:
+                ending = ending.where(cls.user_id == user_id)
+
+            delta = RollupDelta()
+            for row in db.session.execute(ending):
+                record_session_end(delta, row.device_id, row.user_id,
+                                   row.actual_start_time, current_time, terminated=True)
+
             query = db.update(cls)\
                 .where(
                     cls.actual_start_time.isnot(None),
@@ -82,6 +102,7 @@ class DeviceUsage(db.Model):
                 query = query.where(cls.user_id == user_id)
             
             result = db.session.execute(query)
+            delta.apply(db.session.connection())
             db.session.commit()
             return result.rowcount
         except Exception as e:
@@ -1,6 +1,6 @@
 from .base import db
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -14,8 +14,14 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime)
     
+    # Case-insensitive username search and keyset pagination walk this index in order
+    __table_args__ = (
+        db.Index('ix_users_user_name_lower', db.func.lower(user_name), id),
+    )
+    
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        from utils.password_hashing import password_hasher
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -0,0 +1,351 @@
+from flask import current_app
+from .base import db
+from .reservation import Reservation
+from .device_usage import DeviceUsage
+from collections import Counter, defaultdict
+from datetime import datetime
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+import pytz
+
+# Usage statuses that mean the user actually showed up for a reservation
+STARTED_STATUSES = ('active', 'completed', 'terminated')
+ENDED_STATUSES = ('completed', 'terminated')
+IST = pytz.timezone('Asia/Kolkata')
+
+# Which usage rows are real sessions. Booking a device adds a usage row that
+# copies the booked window, and older code left those rows 'completed' and
+# marked cancelled bookings 'Terminated' without a reason; neither is a
+# session. rollup_rebuild_sql() and the flush hooks apply the same rule.
+SESSION_SQL = (
+    "lower(u.status) IN ({statuses}) "
+    "AND NOT (lower(u.status) = 'terminated' AND u.termination_reason IS NULL) "
+    "AND NOT COALESCE(u.actual_start_time = r.start_time AND u.actual_end_time = r.end_time, 0)"
+)
+COUNTER_COLUMNS = ('booked_seconds', 'used_seconds', 'reservations', 'sessions', 'no_shows', 'terminations')
+UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+class RollupCounters:
+    """Counters shared by every utilization rollup table"""
+    booked_seconds = db.Column(db.Float, nullable=False, default=0)
+    used_seconds = db.Column(db.Float, nullable=False, default=0)
+    reservations = db.Column(db.Integer, nullable=False, default=0)
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    no_shows = db.Column(db.Integer, nullable=False, default=0)
+    terminations = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def counters_dict(self):
+        return {
+            'booked_hours': round((self.booked_seconds or 0) / 3600, 2),
+            'used_hours': round((self.used_seconds or 0) / 3600, 2),
+            'reservations': self.reservations or 0,
+            'sessions': self.sessions or 0,
+            'no_shows': self.no_shows or 0,
+            'terminations': self.terminations or 0,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
+class DeviceUtilization(RollupCounters, db.Model):
+    __tablename__ = 'device_utilization'
+
+    device_id = db.Column(db.String(50), primary_key=True)
+
+    def to_dict(self):
+        return {'device_id': self.device_id, **self.counters_dict()}
+
+
+class UserUtilization(RollupCounters, db.Model):
+    __tablename__ = 'user_utilization'
+
+    user_id = db.Column(db.Integer, primary_key=True)
+
+    def to_dict(self):
+        return {'user_id': self.user_id, **self.counters_dict()}
+
+
+class DailyUtilization(RollupCounters, db.Model):
+    __tablename__ = 'daily_utilization'
+
+    day = db.Column(db.Date, primary_key=True)
+
+    def to_dict(self):
+        return {'day': self.day.isoformat(), **self.counters_dict()}
+
+
+class RollupDelta:
+    """Accumulates counter increments keyed by device, user and day"""
+
+    def __init__(self):
+        self.rows = defaultdict(Counter)
+
+    def add(self, device_id, user_id, day, **counters):
+        for model, key in ((DeviceUtilization, device_id), (UserUtilization, user_id), (DailyUtilization, day)):
+            if key is not None:
+                self.rows[(model, key)].update(counters)
+
+    def apply(self, connection):
+        """Increment rollup rows in place, inserting the row on first use
+
+        On SQLite and PostgreSQL each row is one INSERT ... ON CONFLICT DO
+        UPDATE, so two sessions creating the same bucket at once can't
+        collide or lose an increment.
+        """
+        insert = UPSERT_INSERTS.get(connection.dialect.name)
+        now = datetime.utcnow()
+        for (model, key), counters in self.rows.items():
+            counters = {name: value for name, value in counters.items() if value}
+            if not counters:
+                continue
+            table = model.__table__
+            key_column = table.primary_key.columns.values()[0]
+            increments = {name: table.c[name] + value for name, value in counters.items()}
+            row = {key_column.name: key, 'updated_at': now, **{column: 0 for column in COUNTER_COLUMNS}, **counters}
+            if insert is not None:
+                connection.execute(
+                    insert(table).values(row)
+                    .on_conflict_do_update(index_elements=[key_column.name], set_={'updated_at': now, **increments})
+                )
+                continue
+            result = connection.execute(
+                table.update().where(key_column == key).values(updated_at=now, **increments)
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(row))
+        self.rows.clear()
+
+
+def rollup_rebuild_sql():
+    """SQLite statements that recompute every rollup table from reservations and usage history
+
+    Each takes a :now parameter for updated_at. Stored times are naive IST,
+    so date() gives the same day _local_day does.
+    """
+    seconds = "MAX(COALESCE((julianday({end}) - julianday({start})) * 86400, 0), 0)"
+    booked = seconds.format(start='start_time', end='end_time')
+    used = seconds.format(start='u.actual_start_time', end='u.actual_end_time')
+    started = SESSION_SQL.format(statuses=', '.join(f"'{status}'" for status in STARTED_STATUSES))
+    ended = SESSION_SQL.format(statuses=', '.join(f"'{status}'" for status in ENDED_STATUSES))
+    usage_rows = 'device_usage_history u LEFT JOIN reservations r ON r.id = u.reservation_id'
+    # Reservations someone showed up for, joined once rather than probed per row
+    showed_up = f"SELECT DISTINCT u.reservation_id FROM {usage_rows} WHERE {started}"
+    statements = []
+    for table, key, reservation_key, usage_key in (
+        ('device_utilization', 'device_id', 'device_id', 'u.device_id'),
+        ('user_utilization', 'user_id', 'user_id', 'u.user_id'),
+        ('daily_utilization', 'day', 'date(start_time)', 'date(COALESCE(u.actual_start_time, u.actual_end_time))')
+    ):
+        statements.append(f'DELETE FROM {table}')
+        statements.append(f"""
+            INSERT INTO {table} ({key}, {', '.join(COUNTER_COLUMNS)}, updated_at)
+            SELECT k, SUM(booked), SUM(used), SUM(reservations), SUM(sessions), SUM(no_shows), SUM(terminations), :now
+            FROM (
+                SELECT {reservation_key} AS k, {booked} AS booked, 0 AS used, 1 AS reservations,
+                       0 AS sessions, lower(status) = 'expired' AND s.reservation_id IS NULL AS no_shows,
+                       0 AS terminations
+                FROM reservations LEFT JOIN ({showed_up}) s ON s.reservation_id = reservations.id
+                UNION ALL
+                SELECT {usage_key}, 0, {used}, 0, 1, 0, lower(u.status) = 'terminated'
+                FROM {usage_rows} WHERE {ended}
+            )
+            WHERE k IS NOT NULL
+            GROUP BY k
+        """)
+    return statements
+
+
+def backfill_rollups(connection):
+    """Fill empty rollup tables from existing history; True if anything was rebuilt
+
+    The rollups are only maintained from the moment they exist, so a
+    database that already had reservations and usage needs this once.
+    """
+    rollups_empty = not any(
+        connection.execute(db.select(1).select_from(model.__table__).limit(1)).first()
+        for model in (DeviceUtilization, UserUtilization, DailyUtilization)
+    )
+    has_history = any(
+        connection.execute(db.select(1).select_from(model.__table__).limit(1)).first()
+        for model in (Reservation, DeviceUsage)
+    )
+    if not (rollups_empty and has_history):
+        return False
+    if connection.dialect.name != 'sqlite':
+        current_app.logger.warning(
+            'Utilization rollups are empty but history exists; the rebuild only runs on SQLite, '
+            f'so on {connection.dialect.name} the rollup tables must be filled by hand'
+        )
+        return False
+    now = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')
+    for statement in rollup_rebuild_sql():
+        connection.execute(db.text(statement), {'now': now})
+    return True
+
+
+def _local_day(value):
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(pytz.timezone('Asia/Kolkata'))
+    return value.date()
+
+
+def _seconds(start, end):
+    if start is None or end is None:
+        return 0
+    if start.tzinfo is None and end.tzinfo is not None:
+        end = end.replace(tzinfo=None)
+    elif start.tzinfo is not None and end.tzinfo is None:
+        start = start.replace(tzinfo=None)
+    return max((end - start).total_seconds(), 0)
+
+
+def _old_value(state, name):
+    """Previous committed value of an attribute, or the current value if unchanged"""
+    history = state.attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(state.obj(), name)
+
+
+def _normalized_status(status):
+    return (status or '').lower()
+
+
+def record_session_end(delta, device_id, user_id, start_time, end_time, terminated=False):
+    delta.add(
+        device_id, user_id, _local_day(start_time or end_time),
+        used_seconds=_seconds(start_time, end_time),
+        sessions=1,
+        terminations=1 if terminated else 0
+    )
+
+
+def _reservation_changes(delta, session):
+    now = datetime.now(pytz.timezone('Asia/Kolkata'))
+
+    for obj in session.new:
+        if isinstance(obj, Reservation):
+            delta.add(obj.device_id, obj.user_id, _local_day(obj.start_time),
+                      booked_seconds=_seconds(obj.start_time, obj.end_time), reservations=1)
+
+    for obj in session.deleted:
+        # Deleting a reservation that has not ended yet is a cancellation;
+        # cleanup of expired reservations must not give back booked time
+        if isinstance(obj, Reservation) and obj.end_time and _seconds(now, obj.end_time) > 0:
+            delta.add(obj.device_id, obj.user_id, _local_day(obj.start_time),
+                      booked_seconds=-_seconds(obj.start_time, obj.end_time), reservations=-1)
+
+    expiring = []
+    for obj in session.dirty:
+        if not isinstance(obj, Reservation) or not session.is_modified(obj):
+            continue
+        state = inspect(obj)
+        old_start, old_end = _old_value(state, 'start_time'), _old_value(state, 'end_time')
+        if (old_start, old_end) != (obj.start_time, obj.end_time):
+            delta.add(obj.device_id, obj.user_id, _local_day(old_start),
+                      booked_seconds=-_seconds(old_start, old_end))
+            delta.add(obj.device_id, obj.user_id, _local_day(obj.start_time),
+                      booked_seconds=_seconds(obj.start_time, obj.end_time))
+
+        old_status = _normalized_status(_old_value(state, 'status'))
+        if old_status != 'expired' and _normalized_status(obj.status) == 'expired':
+            expiring.append(obj)
+
+    if expiring:
+        showed_up = _reservations_with_sessions(session, [obj.id for obj in expiring])
+        for obj in expiring:
+            if obj.id not in showed_up:
+                delta.add(obj.device_id, obj.user_id, _local_day(obj.start_time), no_shows=1)
+
+
+def _wall_time(value):
+    """Naive IST wall-clock time, the form ISTDateTime stores"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(IST).replace(tzinfo=None)
+    return value
+
+
+def _is_session(status, termination_reason, actual_window, booked_window):
+    """Python side of SESSION_SQL; booked_window is None when there is no reservation"""
+    if status not in STARTED_STATUSES:
+        return False
+    if status == 'terminated' and termination_reason is None:
+        return False
+    return booked_window is None or tuple(map(_wall_time, actual_window)) != tuple(map(_wall_time, booked_window))
+
+
+def _booked_windows(session, reservation_ids):
+    """{reservation id: (start_time, end_time)} in one query"""
+    ids = {reservation_id for reservation_id in reservation_ids if reservation_id is not None}
+    if not ids:
+        return {}
+    with session.no_autoflush:
+        rows = session.execute(
+            db.select(Reservation.id, Reservation.start_time, Reservation.end_time).where(Reservation.id.in_(ids))
+        )
+        return {row.id: (row.start_time, row.end_time) for row in rows}
+
+
+def _reservations_with_sessions(session, reservation_ids):
+    """Ids among reservation_ids that someone showed up for, in one query"""
+    with session.no_autoflush:
+        rows = session.execute(
+            db.select(DeviceUsage.reservation_id, DeviceUsage.status, DeviceUsage.termination_reason,
+                      DeviceUsage.actual_start_time, DeviceUsage.actual_end_time,
+                      Reservation.start_time, Reservation.end_time)
+            .join(Reservation, Reservation.id == DeviceUsage.reservation_id)
+            .where(DeviceUsage.reservation_id.in_(reservation_ids))
+        ).all()
+    return {
+        row.reservation_id for row in rows
+        if _is_session(_normalized_status(row.status), row.termination_reason,
+                       (row.actual_start_time, row.actual_end_time), (row.start_time, row.end_time))
+    }
+
+
+def _usage_changes(delta, session):
+    # Rows created already ended count just as the rebuild counts them
+    ended = [
+        obj for obj in session.new
+        if isinstance(obj, DeviceUsage) and _normalized_status(obj.status) in ENDED_STATUSES
+    ]
+    for obj in session.dirty:
+        if not isinstance(obj, DeviceUsage) or not session.is_modified(obj):
+            continue
+        state = inspect(obj)
+        old_status = _normalized_status(_old_value(state, 'status'))
+        if old_status not in ENDED_STATUSES and _normalized_status(obj.status) in ENDED_STATUSES:
+            ended.append(obj)
+    if not ended:
+        return
+
+    windows = _booked_windows(session, [obj.reservation_id for obj in ended])
+    for obj in ended:
+        status = _normalized_status(obj.status)
+        # A row created with reservation=... has no reservation_id until this flush
+        reservation = obj.__dict__.get('reservation')
+        booked = (reservation.start_time, reservation.end_time) if reservation else windows.get(obj.reservation_id)
+        if _is_session(status, obj.termination_reason, (obj.actual_start_time, obj.actual_end_time), booked):
+            record_session_end(delta, obj.device_id, obj.user_id,
+                               obj.actual_start_time, obj.actual_end_time,
+                               terminated=status == 'terminated')
+
+
+@event.listens_for(db.session, 'before_flush')
+def collect_utilization_deltas(session, flush_context, instances):
+    delta = RollupDelta()
+    _reservation_changes(delta, session)
+    _usage_changes(delta, session)
+    session.info['utilization_delta'] = delta
+
+
+@event.listens_for(db.session, 'after_flush')
+def apply_utilization_deltas(session, flush_context):
+    delta = session.info.pop('utilization_delta', None)
+    if delta and delta.rows:
+        delta.apply(session.connection())
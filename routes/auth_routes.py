@@ -2,8 +2,10 @@ from datetime import timedelta
 from flask import Blueprint, request, jsonify, make_response, session
 from flask_login import current_user, login_user, logout_user
 from flask_cors import cross_origin
+from models.base import db
 from models.user import User
-from werkzeug.security import check_password_hash
+from utils.token_auth import issue_tokens, refresh_identity, token_mode_enabled
+from utils.password_hashing import HashQueueFull, password_hasher
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -57,17 +59,39 @@ def login():
     # Find user and validate credentials
     user = User.query.filter_by(user_name=username).first()
     
-    if user and check_password_hash(user.password_hash, password):
+    try:
+        valid = user is not None and password_hasher.verify(user.password_hash, password)
+    except HashQueueFull:
+        # Shed load instead of queueing behind a login storm
+        response = jsonify({
+            'success': False,
+            'message': 'Server is busy, please retry shortly'
+        })
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    
+    if valid:
+        # Transparently upgrade hashes made with an older method or cost
+        if password_hasher.needs_rehash(user.password_hash):
+            try:
+                user.password_hash = password_hasher.hash(password)
+                db.session.commit()
+            except HashQueueFull:
+                db.session.rollback()
+        
         login_user(user, remember=True)
         
         # Create response with user data
-        response = jsonify({
+        response_data = {
             'success': True,
             'message': 'Logged in successfully!',
             'user_role': user.role,
             'user_id': user.id,
             'username': user.user_name
-        })
+        }
+        if token_mode_enabled():
+            response_data.update(issue_tokens(user))
+        response = jsonify(response_data)
         
         # Set CORS headers
         response.headers.add('Access-Control-Allow-Origin', 'http://localhost:3000')
@@ -82,6 +106,32 @@ def login():
     }), 401
 
 
+@auth_bp.route('/token/refresh', methods=['POST'])
+def refresh_token():
+    """Exchange a refresh token for a new access token (token mode only)"""
+    if not token_mode_enabled():
+        return jsonify({
+            'success': False,
+            'message': 'Token authentication is disabled'
+        }), 404
+
+    # Reload the user so deleted accounts and role changes take effect on refresh
+    user = db.session.get(User, refresh_identity())
+    if not user or not user.is_active:
+        return jsonify({
+            'success': False,
+            'message': 'User no longer exists'
+        }), 401
+
+    tokens = issue_tokens(user)
+    return jsonify({
+        'success': True,
+        'access_token': tokens['access_token'],
+        'token_type': tokens['token_type'],
+        'expires_in': tokens['expires_in']
+    })
+
+
 @auth_bp.route('/api/check-auth', methods=['GET'])
 def check_auth():
     if current_user.is_authenticated:
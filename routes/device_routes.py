@@ -6,10 +6,39 @@ import pytz
 from models.device import Device
 from models.reservation import Reservation
 from models.base import db
+from sqlalchemy.orm import joinedload
+from utils.query_budget import query_budget
+from utils.device_registry import device_registry
+from utils.device_import import DeviceImportError, import_devices, parse_devices
+from utils.device_health import device_health
 from datetime import datetime, timedelta
 
 device_bp = Blueprint('device', __name__)
 
+# IP-based drivers
+IP_DRIVERS = [
+    {'name': 'PC', 'ip_field': 'PC_IP', 'type': 'pc'},
+    {'name': 'Rutomatrix', 'ip_field': 'Rutomatrix_ip', 'type': 'rutomatrix'},
+    {'name': 'Pulse1', 'ip_field': 'Pulse1_Ip', 'type': 'pulse'},
+    {'name': 'CT1', 'ip_field': 'CT1_ip', 'type': 'ct'},
+]
+
+
+def driver_records(device, ip_fields=None):
+    """Driver entries for a device dict (Device.to_dict() shape), optionally only some IP fields"""
+    drivers = []
+    for driver in IP_DRIVERS:
+        if ip_fields is not None and driver['ip_field'] not in ip_fields:
+            continue
+        ip_address = device.get(driver['ip_field'])
+        if ip_address:
+            drivers.append({
+                'name': driver['name'],
+                'ip': ip_address,
+                'type': driver['type'],
+                'field': driver['ip_field']
+            })
+    return drivers
 
 
 @device_bp.route('/api/devices/<device_id>/drivers', methods=['GET'])
@@ -31,23 +60,7 @@ def get_device_drivers(device_id):
             'other_fields': []
         }
         
-        # IP-based drivers
-        ip_drivers = [
-            {'name': 'PC', 'ip_field': 'PC_IP', 'type': 'pc'},
-            {'name': 'Rutomatrix', 'ip_field': 'Rutomatrix_ip', 'type': 'rutomatrix'},
-            {'name': 'Pulse1', 'ip_field': 'Pulse1_Ip', 'type': 'pulse'},
-            {'name': 'CT1', 'ip_field': 'CT1_ip', 'type': 'ct'},
-        ]
-        
-        for driver in ip_drivers:
-            ip_address = getattr(device, driver['ip_field'], None)
-            if ip_address:
-                response_data['drivers'].append({
-                    'name': driver['name'],
-                    'ip': ip_address,
-                    'type': driver['type'],
-                    'field': driver['ip_field']
-                })
+        response_data['drivers'] = driver_records(device.to_dict())
             
         return jsonify(response_data)
         
@@ -59,8 +72,71 @@ def get_device_drivers(device_id):
         }), 500
 
 
+@device_bp.route('/api/devices/drivers', methods=['GET', 'POST'])
+@query_budget(0)
+@login_required
+def get_devices_drivers():
+    """Drivers for many devices at once, served from the device registry
+
+    GET /api/devices/drivers?device_ids=001,002&ip_types=PC_IP,CT1_ip
+    or POST {"device_ids": [...], "ip_types": [...]} for long lists.
+    Leaving out ip_types returns every driver.
+    """
+    try:
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            device_ids = data.get('device_ids')
+            ip_types = data.get('ip_types')
+        else:
+            device_ids = [value for value in request.args.get('device_ids', '').split(',') if value]
+            ip_types = [value for value in request.args.get('ip_types', '').split(',') if value] or None
+        
+        if not device_ids or not isinstance(device_ids, list):
+            return jsonify({
+                'status': 'error',
+                'message': 'device_ids must be a non-empty list'
+            }), 400
+        
+        valid_types = [driver['ip_field'] for driver in IP_DRIVERS]
+        if ip_types is not None:
+            if not isinstance(ip_types, list):
+                return jsonify({
+                    'status': 'error',
+                    'message': 'ip_types must be a list'
+                }), 400
+            invalid = [ip_type for ip_type in ip_types if ip_type not in valid_types]
+            if invalid:
+                return jsonify({
+                    'status': 'error',
+                    'message': f'Invalid IP type(s): {", ".join(map(str, invalid))}. Valid types are: {", ".join(valid_types)}'
+                }), 400
+        
+        devices = {}
+        not_found = []
+        for device_id in dict.fromkeys(map(str, device_ids)):
+            device = device_registry.get(device_id)
+            if device is None:
+                not_found.append(device_id)
+            else:
+                devices[device_id] = {'drivers': driver_records(device, ip_types)}
+        
+        return jsonify({
+            'status': 'success',
+            'devices': devices,
+            'not_found': not_found
+        })
+        
+    except Exception as e:
+        current_app.logger.error(f"Error fetching drivers for devices: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': 'Internal server error'
+        }), 500
+
+
 
 @device_bp.route('/api/devices/status', methods=['GET'])
+@query_budget(1)
 @login_required
 def get_devices_with_status():
     try:
@@ -74,25 +150,31 @@ def get_devices_with_status():
         
         if start_time:
             start_time = datetime.fromisoformat(start_time.replace('Z', '+00:00')).astimezone(ist)
+        else:
+            start_time = now
         if end_time:
             end_time = datetime.fromisoformat(end_time.replace('Z', '+00:00')).astimezone(ist)
         else:
             end_time = now + timedelta(hours=1)  # Default 1 hour window
 
-        devices = Device.query.all()
+        devices = device_registry.summaries()
         devices_list = []
         
+        # Fetch every overlapping reservation at once instead of one query per device
+        overlapping_reservations = Reservation.query.filter(
+            Reservation.end_time >= now.replace(tzinfo=None),
+            Reservation.start_time < end_time.replace(tzinfo=None),
+            Reservation.end_time > start_time.replace(tzinfo=None)
+        ).order_by(Reservation.start_time).all()
+        overlapping_by_device = {}
+        for reservation in overlapping_reservations:
+            overlapping_by_device.setdefault(reservation.device_id, reservation)
+        
         for device in devices:
             is_booked = False
             booking_info = {}
             
-            # Check for overlapping reservations
-            overlapping = Reservation.query.filter(
-                Reservation.device_id == device.device_id,
-                Reservation.end_time >= now.replace(tzinfo=None),
-                Reservation.start_time < end_time.replace(tzinfo=None),
-                Reservation.end_time > start_time.replace(tzinfo=None)
-            ).first()
+            overlapping = overlapping_by_device.get(device['device_id'])
             
             if overlapping:
                 is_booked = True
@@ -102,7 +184,7 @@ def get_devices_with_status():
                 }
             
             device_data = {
-                'device_id': device.device_id,
+                'device_id': device['device_id'],
                 'status': 'booked' if is_booked else 'available',
                 **booking_info
             }
@@ -133,33 +215,27 @@ def get_devices():
         ist = pytz.timezone('Asia/Kolkata')
         current_time = datetime.now(ist)
         
-        # Get all devices
-        devices = Device.query.all()
-        
         # Get all active reservations - make sure to handle timezone properly
         reservations = Reservation.query.filter(
             Reservation.end_time >= current_time
         ).all()
         
-        # Prepare response
-        device_list = []
-        for device in devices:
-            # Check if device is currently booked
-            is_booked = any(
-                reservation.device_id == device.device_id and
-                reservation.start_time <= current_time <= reservation.end_time
-                for reservation in reservations
-            )
-            
-            device_list.append({
-                'device_id': device.device_id,
-                'name': device.device_id,  
-                'status': 'booked' if is_booked else 'available',
-                'pc_ip': device.PC_IP,
-                'rutomatrix_ip': device.Rutomatrix_ip,
-                'pulse1_ip': device.Pulse1_Ip,
-                'ct1_ip': device.CT1_ip
-            })
+        # Devices with a reservation running right now
+        booked_device_ids = {
+            reservation.device_id for reservation in reservations
+            if reservation.start_time <= current_time <= reservation.end_time
+        }
+        
+        # Prepare response from the cached device registry
+        device_list = [
+            {**device, 'status': 'booked' if device['device_id'] in booked_device_ids else 'available'}
+            for device in device_registry.summaries()
+        ]
+        
+        # Latest scheduled probe results; never probes inline
+        if device_health.enabled:
+            for device in device_list:
+                device['health'] = device_health.for_device(device['device_id'])
         
         return jsonify({
             'success': True,
@@ -173,6 +249,28 @@ def get_devices():
             'message': f'Failed to get devices: {str(e)}'  # More detailed error
         }), 500
 
+@device_bp.route('/api/devices/health', methods=['GET'])
+@login_required
+def get_devices_health():
+    """Latest reachability of every device endpoint from the scheduled prober"""
+    if not device_health.enabled:
+        return jsonify({'error': 'Device probing is not enabled'}), 404
+    
+    report = device_health.snapshot()
+    return jsonify({
+        'checked_at': report.get('checked_at'),
+        'duration_ms': report.get('duration_ms'),
+        'devices': report.get('devices', {})
+    })
+
+@device_bp.route('/api/device-cache/stats', methods=['GET'])
+@login_required
+def device_cache_stats():
+    if current_user.role != 'admin':
+        return jsonify({'error': 'You do not have permission to view this data'}), 403
+
+    return jsonify(device_registry.stats())
+
 @device_bp.route('/api/devices/<device_id>', methods=['GET'])
 def get_device(device_id):  
     device = Device.query.get_or_404(device_id)
@@ -222,6 +320,7 @@ def add():
 
         db.session.add(new_device)
         db.session.commit()
+        device_registry.invalidate()
         
         return jsonify({
             'status': 'success',
@@ -237,6 +336,58 @@ def add():
             'message': f'Error adding device: {str(e)}'
         }), 500
 
+@device_bp.route('/api/devices/import', methods=['POST'])
+@login_required
+def import_devices_route():
+    """Add or update many devices from a CSV or JSON upload in one transaction
+
+    Send a 'file' upload (format from its extension or ?format=), a JSON
+    body, or a text/csv body. ?dry_run=true only validates.
+    """
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    try:
+        fmt = request.args.get('format')
+        upload = request.files.get('file')
+        if upload is not None:
+            fmt = fmt or ('json' if upload.filename.lower().endswith('.json') else 'csv')
+            rows = parse_devices(upload.read(), fmt)
+        elif request.is_json:
+            rows = parse_devices(request.get_json(), 'json')
+        else:
+            rows = parse_devices(request.get_data(), fmt or 'csv')
+        
+        dry_run = request.args.get('dry_run', 'false').lower() == 'true'
+        result = import_devices(rows, dry_run=dry_run)
+        if not dry_run:
+            device_registry.invalidate()
+        
+        return jsonify({
+            'status': 'success',
+            'message': f"{'Validated' if dry_run else 'Imported'} {len(rows)} devices",
+            'dry_run': dry_run,
+            **result
+        })
+    
+    except DeviceImportError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'errors': e.errors
+        }), 400
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Could not parse file: {str(e)}'
+        }), 400
+    except Exception as e:
+        current_app.logger.error(f"Error importing devices: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f'Error importing devices: {str(e)}'
+        }), 500
+
 @device_bp.route('/edit/<device_id>', methods=['GET', 'POST','PUT'])
 def edit(device_id):
     if current_user.role != 'admin':
@@ -261,6 +412,7 @@ def edit(device_id):
         device.CT1_ip = request.form.get('CT1_ip', device.CT1_ip)
         
         db.session.commit()
+        device_registry.invalidate()
         return jsonify({
             'status': 'success',
             'message': 'Device updated successfully!'
@@ -309,6 +461,7 @@ def delete(device_id):
         # Then delete the device
         db.session.delete(device)
         db.session.commit()
+        device_registry.invalidate()
         
         return jsonify({
             'status': 'success',
@@ -379,3 +532,57 @@ def get_single_device_ip(device_id, ip_type):
     else:
         return ip_value  # Returns just the IP as plain text
     
+
+@device_bp.route('/api/ip/<addr>', methods=['GET'])
+@query_budget(1)
+@login_required
+def lookup_ip(addr):
+    """Which devices, endpoints and current reservation holders use an IP address
+
+    Example: /api/ip/10.0.0.12. An IP configured on several devices or
+    endpoints returns one entry per use, so conflicts stay visible.
+    """
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    try:
+        matches = device_registry.find_ip(addr)
+        if not matches:
+            return jsonify({'error': f'No device uses IP {addr}'}), 404
+        
+        # Reservations covering the current moment on any matching device
+        ist = pytz.timezone('Asia/Kolkata')
+        now = datetime.now(ist)
+        active = db.session.query(Reservation).options(joinedload(Reservation.user)).filter(
+            Reservation.device_id.in_({device['device_id'] for device, _ in matches}),
+            Reservation.start_time <= now,
+            Reservation.end_time >= now,
+            Reservation.status != 'cancelled'
+        ).all()
+        active_by_device = {}
+        for reservation in active:
+            active_by_device.setdefault(reservation.device_id, reservation)
+        
+        results = []
+        for device, endpoint in matches:
+            reservation = active_by_device.get(device['device_id'])
+            results.append({
+                'endpoint': endpoint,
+                'device': device,
+                'reservation': {
+                    'id': reservation.id,
+                    'user_id': reservation.user_id,
+                    'user_name': reservation.user.user_name if reservation.user else None,
+                    'start_time': reservation.start_time.isoformat(),
+                    'end_time': reservation.end_time.isoformat()
+                } if reservation else None
+            })
+        
+        return jsonify({
+            'ip': addr,
+            'shared': len(results) > 1,
+            'matches': results
+        })
+    except Exception as e:
+        current_app.logger.error(f"Error looking up IP {addr}: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Failed to look up IP'}), 500
@@ -0,0 +1,192 @@
+from flask import Blueprint, Response, current_app, jsonify, request, send_from_directory
+from flask_login import login_required, current_user
+from utils.memory_snapshots import memory_snapshots
+from utils.profiling import background_sampler, request_profiler
+from utils.slow_query_log import slow_query_log
+
+diagnostics_bp = Blueprint('diagnostics', __name__, url_prefix='/api/diagnostics')
+
+
+@diagnostics_bp.route('/slow-queries', methods=['GET'])
+@login_required
+def slow_queries():
+    """Most recent slow statements, newest first"""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Admin privileges required'}), 403
+
+    try:
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+        endpoint = request.args.get('endpoint')
+
+        entries = slow_query_log.tail(limit)
+        if endpoint:
+            entries = [entry for entry in entries if entry.get('endpoint') == endpoint]
+
+        return jsonify({
+            'enabled': slow_query_log.threshold is not None,
+            'threshold_ms': current_app.config.get('SLOW_QUERY_MS'),
+            'dropped': slow_query_log.dropped,
+            'entries': entries
+        })
+    except Exception as e:
+        current_app.logger.error(f"Error reading slow query log: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Failed to read slow query log'}), 500
+
+
+@diagnostics_bp.route('/profiles', methods=['GET'])
+@login_required
+def list_profiles():
+    """Saved request profiles, newest first"""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Admin privileges required'}), 403
+
+    try:
+        profiles = request_profiler.list()
+        endpoint = request.args.get('endpoint')
+        if endpoint:
+            profiles = [profile for profile in profiles if profile.get('endpoint') == endpoint]
+        return jsonify({'profiles': profiles})
+    except Exception as e:
+        current_app.logger.error(f"Error listing profiles: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Failed to list profiles'}), 500
+
+
+@diagnostics_bp.route('/profiles/<profile_id>', methods=['GET', 'DELETE'])
+@login_required
+def profile_file(profile_id):
+    """Download a profile, read a cprofile summary with ?format=text, or delete it"""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Admin privileges required'}), 403
+
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Profile not found'}), 404
+
+    try:
+        if request.method == 'DELETE':
+            request_profiler.delete(profile_id)
+            return jsonify({'message': 'Profile deleted'})
+
+        if request.args.get('format') == 'text' and profile['mode'] == 'cprofile':
+            sort = request.args.get('sort', 'cumulative')
+            if sort not in ('cumulative', 'tottime', 'calls'):
+                return jsonify({'error': 'sort must be cumulative, tottime or calls'}), 400
+            limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+            return Response(request_profiler.summary(profile, limit, sort), mimetype='text/plain')
+
+        return send_from_directory(request_profiler.directory, profile['file'], as_attachment=True)
+    except Exception as e:
+        current_app.logger.error(f"Error reading profile {profile_id}: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Failed to read profile'}), 500
+
+
+@diagnostics_bp.route('/sampler', methods=['GET'])
+@login_required
+def sampler_status():
+    """Background sampler state and its collapsed-stack windows, newest first"""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Admin privileges required'}), 403
+
+    return jsonify(background_sampler.status())
+
+
+@diagnostics_bp.route('/sampler/stacks', methods=['GET'])
+@login_required
+def sampler_stacks():
+    """One window by ?file=, or the newest ?windows=N merged (default 5), as collapsed stacks"""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Admin privileges required'}), 403
+    if background_sampler.directory is None:
+        return jsonify({'error': 'Background sampler is not enabled'}), 404
+
+    try:
+        filename = request.args.get('file')
+        if filename:
+            if filename not in {window['file'] for window in background_sampler.windows()}:
+                return jsonify({'error': 'Window not found'}), 404
+            return send_from_directory(background_sampler.directory, filename, as_attachment=True)
+
+        windows = min(max(request.args.get('windows', 5, type=int), 1), 1000)
+        return Response(background_sampler.merged(windows), mimetype='text/plain')
+    except Exception as e:
+        current_app.logger.error(f"Error reading sampler windows: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Failed to read sampler windows'}), 500
+
+
+@diagnostics_bp.route('/memory', methods=['GET'])
+@login_required
+def memory_status():
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Admin privileges required'}), 403
+
+    return jsonify({**memory_snapshots.status(), 'snapshots': memory_snapshots.list()})
+
+
+@diagnostics_bp.route('/memory/<action>', methods=['POST'])
+@login_required
+def memory_tracing(action):
+    """Start or stop tracemalloc in the worker serving this request"""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Admin privileges required'}), 403
+    if action not in ('start', 'stop'):
+        return jsonify({'error': 'Action must be start or stop'}), 400
+
+    return jsonify(memory_snapshots.start() if action == 'start' else memory_snapshots.stop())
+
+
+@diagnostics_bp.route('/memory/snapshots', methods=['POST'])
+@login_required
+def take_memory_snapshot():
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Admin privileges required'}), 403
+
+    try:
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+        return jsonify(memory_snapshots.take(limit)), 201
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        current_app.logger.error(f"Error taking memory snapshot: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Failed to take memory snapshot'}), 500
+
+
+@diagnostics_bp.route('/memory/snapshots/<snapshot_id>', methods=['GET'])
+@login_required
+def memory_snapshot_top(snapshot_id):
+    """Top allocation sites in a snapshot; ?group=lineno|filename|traceback"""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Admin privileges required'}), 403
+    if not memory_snapshots.exists(snapshot_id):
+        return jsonify({'error': 'Snapshot not found'}), 404
+
+    group = request.args.get('group', 'lineno')
+    if group not in ('lineno', 'filename', 'traceback'):
+        return jsonify({'error': 'group must be lineno, filename or traceback'}), 400
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+    try:
+        return jsonify({'id': snapshot_id, 'top': memory_snapshots.top(snapshot_id, limit, group)})
+    except Exception as e:
+        current_app.logger.error(f"Error reading memory snapshot: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Failed to read memory snapshot'}), 500
+
+
+@diagnostics_bp.route('/memory/diff', methods=['GET'])
+@login_required
+def memory_snapshot_diff():
+    """Allocation growth between ?from= and ?to= snapshot ids"""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Admin privileges required'}), 403
+
+    old_id, new_id = request.args.get('from'), request.args.get('to')
+    if not memory_snapshots.exists(old_id) or not memory_snapshots.exists(new_id):
+        return jsonify({'error': 'Both from and to must be existing snapshot ids'}), 404
+
+    group = request.args.get('group', 'lineno')
+    if group not in ('lineno', 'filename', 'traceback'):
+        return jsonify({'error': 'group must be lineno, filename or traceback'}), 400
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+    try:
+        return jsonify({'from': old_id, 'to': new_id, 'diff': memory_snapshots.diff(old_id, new_id, limit, group)})
+    except Exception as e:
+        current_app.logger.error(f"Error comparing memory snapshots: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Failed to compare memory snapshots'}), 500
@@ -1,4 +1,4 @@
-from flask import Blueprint, current_app, render_template, request, jsonify
+from flask import Blueprint, Response, current_app, render_template, request, jsonify, stream_with_context
 from sqlalchemy import delete
 from werkzeug.exceptions import BadRequest,Forbidden
 from datetime import datetime, timedelta
@@ -6,8 +6,12 @@ from models.device import Device
 from models.device_usage import DeviceUsage
 from models.reservation import Reservation
 from models.user import User
+from models.utilization import DeviceUtilization, UserUtilization, DailyUtilization
 from models.base import db
 from flask_login import current_user, login_required
+import csv
+import io
+import json
 import pytz
 
 history_bp = Blueprint('history', __name__, url_prefix='/history')
@@ -23,22 +27,165 @@ def format_duration(seconds):
     minutes = (seconds % 3600) // 60
     return f"{hours}h {minutes}m"
 
+# Columns projected by the streaming export, in output order
+EXPORT_COLUMNS = [
+    DeviceUsage.id,
+    DeviceUsage.device_id,
+    DeviceUsage.user_id,
+    DeviceUsage.reservation_id,
+    DeviceUsage.actual_start_time,
+    DeviceUsage.actual_end_time,
+    DeviceUsage.status,
+    DeviceUsage.ip_address,
+    DeviceUsage.ip_type,
+    DeviceUsage.termination_reason
+]
+EXPORT_CHUNK_SIZE = 1000
+
+# Columns and sort keys served to the lazily loaded history table
+HISTORY_PAGE_COLUMNS = [
+    DeviceUsage.id,
+    DeviceUsage.device_id,
+    DeviceUsage.user_id,
+    DeviceUsage.actual_start_time,
+    DeviceUsage.actual_end_time,
+    DeviceUsage.status,
+    DeviceUsage.ip_type
+]
+HISTORY_SORT_COLUMNS = {
+    'start_time': DeviceUsage.actual_start_time,
+    'end_time': DeviceUsage.actual_end_time,
+    'device_id': DeviceUsage.device_id,
+    'status': DeviceUsage.status
+}
+HISTORY_MAX_PER_PAGE = 200
+
 @history_bp.route('/')
 @login_required
 def index():
-    """Main history view"""
-    history_records = DeviceUsage.query.order_by(DeviceUsage.actual_start_time.desc()).all()
-    devices = Device.query.all()
-    users = User.query.all()
-    
+    """Main history view - rows are loaded on demand from /history/records"""
     return render_template(
         'history.html',
-        history_records=history_records,
-        devices=devices,
-        users=users,
         current_user=current_user
     )
 
+
+@history_bp.route('/records', methods=['GET'])
+@login_required
+def get_history_page():
+    """Paginated, filterable and sortable history rows for the history table"""
+    try:
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 50, type=int), 1), HISTORY_MAX_PER_PAGE)
+        sort = request.args.get('sort', 'start_time')
+        order = request.args.get('order', 'desc').lower()
+
+        if sort not in HISTORY_SORT_COLUMNS:
+            return jsonify({'error': f'Invalid sort. Valid columns are: {", ".join(HISTORY_SORT_COLUMNS)}'}), 400
+
+        try:
+            date_from = parse_date_filter(request.args.get('from'))
+            date_to = parse_date_filter(request.args.get('to'), end_of_day=True)
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+
+        sort_column = HISTORY_SORT_COLUMNS[sort]
+        query = db.select(*HISTORY_PAGE_COLUMNS).order_by(
+            sort_column.asc() if order == 'asc' else sort_column.desc(),
+            DeviceUsage.id.desc()
+        )
+
+        status_filter = request.args.get('status')
+        if status_filter and status_filter != 'all':
+            query = query.where(DeviceUsage.status == status_filter)
+        if request.args.get('device_id'):
+            query = query.where(DeviceUsage.device_id == request.args['device_id'])
+        if request.args.get('user_id'):
+            query = query.where(DeviceUsage.user_id == request.args.get('user_id', type=int))
+        if date_from:
+            query = query.where(DeviceUsage.actual_start_time >= date_from)
+        if date_to:
+            query = query.where(DeviceUsage.actual_start_time < date_to)
+
+        # Fetch one extra row to learn whether another page exists without a COUNT(*)
+        rows = db.session.execute(
+            query.limit(per_page + 1).offset((page - 1) * per_page)
+        ).all()
+        has_next = len(rows) > per_page
+
+        records = []
+        for row in rows[:per_page]:
+            duration = calculate_actual_duration(row.actual_start_time, row.actual_end_time)
+            records.append({
+                'id': row.id,
+                'device_id': row.device_id,
+                'user_id': row.user_id,
+                'start_time': row.actual_start_time.isoformat() if row.actual_start_time else None,
+                'end_time': row.actual_end_time.isoformat() if row.actual_end_time else None,
+                'duration_seconds': duration,
+                'duration_formatted': format_duration(int(duration)),
+                'status': row.status,
+                'ip_type': row.ip_type
+            })
+
+        return jsonify({
+            'records': records,
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                'has_next': has_next,
+                'has_prev': page > 1
+            },
+            'sort': {'column': sort, 'order': 'asc' if order == 'asc' else 'desc'}
+        })
+
+    except Exception as e:
+        current_app.logger.error(f"Error fetching history page: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Failed to fetch records'}), 500
+
+@history_bp.route('/stats', methods=['GET'])
+@login_required
+def get_utilization_stats():
+    """Serve utilization dashboards from the incrementally maintained rollup tables (admin only)"""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Admin privileges required'}), 403
+
+    try:
+        scope = request.args.get('scope', 'device')
+        rollups = {
+            'device': (DeviceUtilization, DeviceUtilization.device_id),
+            'user': (UserUtilization, UserUtilization.user_id),
+            'day': (DailyUtilization, DailyUtilization.day)
+        }
+        if scope not in rollups:
+            return jsonify({'error': f'Invalid scope. Valid scopes are: {", ".join(rollups)}'}), 400
+
+        model, key_column = rollups[scope]
+        query = model.query.order_by(key_column)
+
+        if scope == 'device' and request.args.get('device_id'):
+            query = query.filter(DeviceUtilization.device_id == request.args['device_id'])
+        if scope == 'user' and request.args.get('user_id'):
+            query = query.filter(UserUtilization.user_id == request.args.get('user_id', type=int))
+        if scope == 'day':
+            try:
+                date_from = request.args.get('from')
+                date_to = request.args.get('to')
+                if date_from:
+                    query = query.filter(DailyUtilization.day >= datetime.strptime(date_from, '%Y-%m-%d').date())
+                if date_to:
+                    query = query.filter(DailyUtilization.day <= datetime.strptime(date_to, '%Y-%m-%d').date())
+            except ValueError:
+                return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+
+        rows = [row.to_dict() for row in query.all()]
+        return jsonify({'scope': scope, 'count': len(rows), 'stats': rows})
+
+    except Exception as e:
+        current_app.logger.error(f"Error fetching utilization stats: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Failed to fetch utilization stats'}), 500
+
+
 @history_bp.route('/update-usage-status/<int:record_id>', methods=['PATCH'])
 @login_required
 def update_usage_status(record_id):
@@ -83,7 +230,15 @@ def list_usage_records():
         if current_user.role != 'admin':
             return jsonify({'error': 'Admin privileges required'}), 403
 
-        records = DeviceUsage.query.order_by(DeviceUsage.actual_start_time.desc()).all()
+        records = db.session.execute(
+            db.select(
+                DeviceUsage.id,
+                DeviceUsage.device_id,
+                DeviceUsage.user_id,
+                DeviceUsage.actual_start_time,
+                DeviceUsage.status
+            ).order_by(DeviceUsage.actual_start_time.desc())
+        ).all()
         
         result = []
         for record in records:
@@ -102,6 +257,90 @@ def list_usage_records():
         return jsonify({'error': 'Failed to fetch records'}), 500
     
 
+def parse_date_filter(value, end_of_day=False):
+    """Parse a YYYY-MM-DD query argument into an IST datetime bound"""
+    if not value:
+        return None
+    day = datetime.strptime(value, '%Y-%m-%d')
+    if end_of_day:
+        day += timedelta(days=1)
+    return IST.localize(day)
+
+
+def export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+@history_bp.route('/export', methods=['GET'])
+@login_required
+def export_usage_records():
+    """Stream usage records as CSV or NDJSON (admin only)
+
+    Rows are fetched in chunks as plain column tuples, so memory stays flat
+    regardless of how many records match.
+    """
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Admin privileges required'}), 403
+
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Invalid format. Valid formats are: csv, ndjson'}), 400
+
+    try:
+        date_from = parse_date_filter(request.args.get('from'))
+        date_to = parse_date_filter(request.args.get('to'), end_of_day=True)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+
+    query = db.select(*EXPORT_COLUMNS).order_by(DeviceUsage.id)
+    if date_from:
+        query = query.where(DeviceUsage.actual_start_time >= date_from)
+    if date_to:
+        query = query.where(DeviceUsage.actual_start_time < date_to)
+    if request.args.get('device_id'):
+        query = query.where(DeviceUsage.device_id == request.args['device_id'])
+    if request.args.get('user_id'):
+        query = query.where(DeviceUsage.user_id == request.args.get('user_id', type=int))
+
+    field_names = [column.key for column in EXPORT_COLUMNS]
+
+    def generate_rows():
+        result = db.session.execute(query.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+        try:
+            if export_format == 'csv':
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(field_names)
+                for chunk in result.partitions():
+                    for row in chunk:
+                        writer.writerow([export_value(value) for value in row])
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate(0)
+                yield buffer.getvalue()
+            else:
+                for chunk in result.partitions():
+                    yield ''.join(
+                        json.dumps(dict(zip(field_names, map(export_value, row)))) + '\n'
+                        for row in chunk
+                    )
+        except Exception as e:
+            current_app.logger.error(f"Error streaming usage export: {str(e)}", exc_info=True)
+            raise
+        finally:
+            result.close()
+
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    filename = f"usage_history_{datetime.now(IST).strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    return Response(
+        stream_with_context(generate_rows()),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
 @history_bp.route('/delete-usage-record/<int:record_id>', methods=['DELETE'])
 @login_required
 def delete_usage_record(record_id):
@@ -127,12 +366,8 @@ def delete_usage_record(record_id):
 @history_bp.route('/get-usage-record/<int:record_id>', methods=['GET'])
 def get_usage_record_details(record_id):
     try:
-        # Eager load all relationships
-        record = DeviceUsage.query.options(
-            db.joinedload(DeviceUsage.device),
-            db.joinedload(DeviceUsage.user),
-            db.joinedload(DeviceUsage.reservation)
-        ).get(record_id)
+        # Eager load only the relationship the response reads
+        record = db.session.get(DeviceUsage, record_id, options=[db.joinedload(DeviceUsage.user)])
         
         if not record:
             return jsonify({'error': 'Record not found'}), 404
@@ -164,7 +399,8 @@ def get_usage_record_details(record_id):
             },
             'reservation_info': {
                 'reservation_id': record.reservation_id,
-                'ip_type': record.reservation.ip_type if record.reservation else None
+                # Reservations have no IP type of their own; the session records the one it used
+                'ip_type': record.ip_type
             }
         }
         
@@ -180,7 +416,9 @@ def get_usage_record_details(record_id):
 def usage_record(record_id):
     """Handle both GET and DELETE requests for usage records"""
     try:
-        record = DeviceUsage.query.get_or_404(record_id)
+        # Only the GET response reads the user relationship
+        options = [db.joinedload(DeviceUsage.user)] if request.method == 'GET' else []
+        record = db.get_or_404(DeviceUsage, record_id, options=options)
         
         if request.method == 'DELETE':
             # Check if user is admin or owns the record
@@ -211,7 +449,7 @@ def usage_record(record_id):
                 'id': record.id,
                 'device_id': record.device_id,
                 'user_id': record.user_id,
-                'user_name': record.user.name if record.user else None,
+                'user_name': record.user.user_name if record.user else None,
                 'reservation_id': record.reservation_id,
                 'start_time': record.actual_start_time.isoformat() if record.actual_start_time else None,
                 'end_time': record.actual_end_time.isoformat() if record.actual_end_time else None,
@@ -255,10 +493,20 @@ def clear_old_records():
 @login_required
 def get_active_sessions():
     """Get all currently active sessions"""
-    active_sessions = DeviceUsage.query.filter_by(
-        actual_end_time=None
-    ).order_by(
-        DeviceUsage.actual_start_time.asc()
+    active_sessions = db.session.execute(
+        db.select(
+            DeviceUsage.id,
+            DeviceUsage.device_id,
+            DeviceUsage.user_id,
+            User.user_name,
+            DeviceUsage.actual_start_time
+        ).outerjoin(
+            User, DeviceUsage.user_id == User.id
+        ).where(
+            DeviceUsage.actual_end_time.is_(None)
+        ).order_by(
+            DeviceUsage.actual_start_time.asc()
+        )
     ).all()
     
     return jsonify({
@@ -267,7 +515,7 @@ def get_active_sessions():
             'id': s.id,
             'device_id': s.device_id,
             'user_id': s.user_id,
-            'user_name': s.user.name if s.user else None,
+            'user_name': s.user_name,
             'start_time': s.actual_start_time.isoformat() if s.actual_start_time else None,
             'duration': (datetime.now(IST) - s.actual_start_time).total_seconds() if s.actual_start_time else None,
             'duration_formatted': format_duration((datetime.now(IST) - s.actual_start_time).total_seconds()) if s.actual_start_time else None
@@ -374,26 +622,31 @@ def get_all_records():
         device_filter = request.args.get('device_id', type=int)
         user_filter = request.args.get('user_id', type=int)
         
-        # Build query with filters
-        query = DeviceUsage.query.options(
-            db.joinedload(DeviceUsage.device),
-            db.joinedload(DeviceUsage.user),
-            db.joinedload(DeviceUsage.reservation)
-        ).order_by(DeviceUsage.actual_start_time.desc())
+        # Build a column-only query with filters
+        query = db.select(
+            DeviceUsage.id,
+            DeviceUsage.device_id,
+            DeviceUsage.user_id,
+            DeviceUsage.reservation_id,
+            DeviceUsage.actual_start_time,
+            DeviceUsage.actual_end_time,
+            DeviceUsage.status,
+            DeviceUsage.termination_reason
+        )
         
         # Apply filters
         if status_filter and status_filter != 'all':
-            query = query.filter(DeviceUsage.status == status_filter)
+            query = query.where(DeviceUsage.status == status_filter)
         if device_filter:
-            query = query.filter(DeviceUsage.device_id == device_filter)
+            query = query.where(DeviceUsage.device_id == device_filter)
         if user_filter:
-            query = query.filter(DeviceUsage.user_id == user_filter)
+            query = query.where(DeviceUsage.user_id == user_filter)
         
         # Paginate results
-        paginated_records = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
+        paginated_records = paginate_rows(
+            query.order_by(DeviceUsage.actual_start_time.desc()),
+            page=page,
+            per_page=per_page
         )
         
         # Format the response
@@ -444,6 +697,32 @@ def get_all_records():
         return jsonify({'error': 'Failed to fetch records'}), 500
     
     
+class RowPage:
+    """Minimal page of Row tuples mirroring the Pagination attributes the routes read"""
+
+    def __init__(self, items, page, per_page, total):
+        self.items = items
+        self.total = total
+        self.pages = (total + per_page - 1) // per_page if per_page else 0
+        self.has_prev = page > 1
+        self.has_next = page < self.pages
+
+
+def paginate_rows(query, page, per_page):
+    """Paginate a column-only select; the count runs on the filtered ids without ORDER BY"""
+    page = max(page, 1)
+    per_page = max(per_page, 1)
+    total = db.session.execute(
+        db.select(db.func.count()).select_from(
+            query.order_by(None).with_only_columns(DeviceUsage.id).subquery()
+        )
+    ).scalar()
+    items = db.session.execute(
+        query.limit(per_page).offset((page - 1) * per_page)
+    ).all()
+    return RowPage(items, page, per_page, total)
+
+
 def calculate_actual_duration(start_time, end_time):
     if start_time and end_time:
         return (end_time - start_time).total_seconds()
@@ -10,9 +10,14 @@ from models.base import db
 from datetime import datetime, timezone
 from sqlalchemy.exc import SQLAlchemyError
 from collections import OrderedDict
+from utils.query_budget import query_budget
+from utils.device_registry import device_registry
+from utils.access_index import access_index
 import json
+import logging
 
 reservation_bp = Blueprint('reservation', __name__)
+logger = logging.getLogger(__name__)
 
 
 
@@ -24,6 +29,7 @@ def run_cleanup():
         db.session.delete(reservation)
     
     db.session.commit()
+    access_index.invalidate()
     
     return f"Cleaned up {len(expired_reservations)} expired reservations"
 
@@ -40,7 +46,7 @@ def get_devices_with_availability():
         start_time_str = request.args.get('start_time')
         end_time_str = request.args.get('end_time')
         
-        current_app.logger.info(f"Received availability request - start: {start_time_str}, end: {end_time_str}")
+        logger.debug("Availability request - start: %s, end: %s", start_time_str, end_time_str)
         
         if not start_time_str or not end_time_str:
             return jsonify({
@@ -50,10 +56,6 @@ def get_devices_with_availability():
             
         ist = pytz.timezone('Asia/Kolkata')
         
-        # Debug: Log the raw strings
-        current_app.logger.info(f"Raw start_time: {start_time_str}")
-        current_app.logger.info(f"Raw end_time: {end_time_str}")
-        
         try:
             # Try parsing as ISO format first (with T or space)
             if 'T' in start_time_str:
@@ -68,13 +70,13 @@ def get_devices_with_availability():
                 end_time = datetime.fromisoformat(end_time_str.replace(' ', 'T'))
                 
         except ValueError as e:
-            current_app.logger.error(f"ISO parsing failed: {str(e)}")
+            logger.debug("ISO parsing failed: %s", e)
             # Fallback to custom parsing
             try:
                 start_time = datetime.strptime(start_time_str, '%Y-%m-%d %H:%M')
                 end_time = datetime.strptime(end_time_str, '%Y-%m-%d %H:%M')
             except ValueError as e2:
-                current_app.logger.error(f"Custom parsing also failed: {str(e2)}")
+                logger.debug("Custom parsing also failed: %s", e2)
                 raise ValueError(f"Invalid datetime format: {start_time_str} or {end_time_str}")
         
         # Localize to IST if not already timezone-aware
@@ -88,7 +90,7 @@ def get_devices_with_availability():
         else:
             end_time = end_time.astimezone(ist)
         
-        current_app.logger.info(f"Parsed times - Start: {start_time}, End: {end_time}")
+        logger.debug("Parsed times - start: %s, end: %s", start_time, end_time)
         
         # Get current time in IST for validation
         current_time_ist = datetime.now(ist)
@@ -106,10 +108,6 @@ def get_devices_with_availability():
                 'message': 'End time must be after start time'
             }), 400
         
-        # Get all devices
-        devices = Device.query.all()
-        current_app.logger.info(f"Found {len(devices)} devices in database")
-        
         # Get conflicting reservations (compare naive datetimes)
         conflicting_reservations = Reservation.query.filter(
             Reservation.start_time < end_time.replace(tzinfo=None),
@@ -117,26 +115,19 @@ def get_devices_with_availability():
             Reservation.status != 'cancelled'
         ).all()
         
-        current_app.logger.info(f"Found {len(conflicting_reservations)} conflicting reservations")
+        devices = device_registry.summaries()
         
         # Create a set of booked device IDs
         booked_device_ids = {res.device_id for res in conflicting_reservations}
-        current_app.logger.info(f"Booked device IDs: {booked_device_ids}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%d devices, %d conflicting reservations, booked: %s",
+                         len(devices), len(conflicting_reservations), sorted(booked_device_ids))
         
         # Prepare response
-        device_list = []
-        for device in devices:
-            device_list.append({
-                'device_id': device.device_id,
-                'name': device.device_id,
-                'status': 'booked' if device.device_id in booked_device_ids else 'available',
-                'pc_ip': device.PC_IP,
-                'rutomatrix_ip': device.Rutomatrix_ip,
-                'pulse1_ip': device.Pulse1_Ip,
-                'ct1_ip': device.CT1_ip
-            })
-        
-        current_app.logger.info(f"Returning {len(device_list)} devices with availability status")
+        device_list = [
+            {**device, 'status': 'booked' if device['device_id'] in booked_device_ids else 'available'}
+            for device in devices
+        ]
         
         return jsonify({
             'success': True,
@@ -149,13 +140,13 @@ def get_devices_with_availability():
         })
         
     except ValueError as e:
-        current_app.logger.error(f"Invalid datetime format: {str(e)}")
+        logger.info("Invalid availability datetime: %s", e)
         return jsonify({
             'success': False,
             'message': f'Invalid datetime format: {str(e)}. Please use YYYY-MM-DD HH:MM format'
         }), 400
     except Exception as e:
-        current_app.logger.error(f"Error checking device availability: {str(e)}", exc_info=True)
+        logger.error("Error checking device availability: %s", e, exc_info=True)
         return jsonify({
             'success': False,
             'message': f'Failed to check device availability: {str(e)}'
@@ -174,7 +165,7 @@ def dashboard():
     now_ist = datetime.now(ist)
     
     # Get all devices and reservations
-    devices = Device.query.all()
+    devices = device_registry.records()
     
     # Get non-expired reservations only
     all_reservations = Reservation.query.filter(
@@ -216,7 +207,7 @@ def view_reservations():
     now_ist = datetime.now(ist)
     
     # Get all devices and reservations
-    devices = Device.query.all()
+    devices = device_registry.records()
     
     # Get non-expired reservations
     all_reservations = Reservation.query.filter(
@@ -257,10 +248,9 @@ def view_reservations():
 @reservation_bp.route('/api/devices', methods=['GET'])
 def get_devices():
     try:
-        devices = Device.query.all()
         return jsonify({
             'success': True,
-            'devices': [device.to_dict() for device in devices]
+            'devices': list(device_registry.records())
         })
     except Exception as e:
         return jsonify({
@@ -382,6 +372,7 @@ def get_booked_devices():
     
 
 @reservation_bp.route('/api/reservations', methods=['GET'])
+@query_budget(1)
 def get_reservations():
     """Get all reservations with filtering options"""
     try:
@@ -392,8 +383,9 @@ def get_reservations():
         show_upcoming = request.args.get('show_upcoming', 'true').lower() == 'true'
         show_active = request.args.get('show_active', 'true').lower() == 'true'
 
-        # Base query
-        query = Reservation.query.join(Device).join(User)
+        # Base query - the joined rows populate reservation.device/.user directly
+        query = Reservation.query.join(Device).join(User).options(
+            db.contains_eager(Reservation.device), db.contains_eager(Reservation.user))
 
         # Apply filters
         if device_id:
@@ -489,8 +481,7 @@ def get_reservations():
 def create_reservation():
     """Create a new reservation"""
     try:
-        # Debug: Check if user is authenticated
-        current_app.logger.info(f"Current user: {current_user.id if current_user.is_authenticated else 'Anonymous'}")
+        logger.debug("Creating reservation for user %s", current_user.id)
         
         data = request.get_json()
         
@@ -573,10 +564,11 @@ def create_reservation():
         db.session.add(reservation)
         db.session.flush()
 
+        # Passing the reservation lets update_status see it hasn't started, so the row stays 'upcoming'
         usage_record = DeviceUsage(
             device_id=data['device_id'],
             user_id=current_user.id,
-            reservation_id=reservation.id,
+            reservation=reservation,
             actual_start_time=start_time.replace(tzinfo=None),
             actual_end_time=end_time.replace(tzinfo=None),
             status='upcoming',
@@ -584,6 +576,7 @@ def create_reservation():
         )
         db.session.add(usage_record)
         db.session.commit()
+        access_index.invalidate()
        
         # Prepare response with IST times and device info
         start_ist = reservation.start_time.astimezone(ist)
@@ -657,6 +650,7 @@ def cancel_reservation(reservation_id):
         # Delete the reservation
         db.session.delete(reservation)
         db.session.commit()
+        access_index.invalidate()
 
         return jsonify({
             'success': True,
@@ -965,4 +959,35 @@ def get_user_reservations_with_time(user_id):
             'success': False,
             'message': 'Failed to fetch reservations',
             'error': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+@reservation_bp.route('/api/access-check', methods=['GET'])
+@login_required
+def access_check():
+    """May a user use a device right now? For gateways; answered from the in-memory access index
+
+    Example: /api/access-check?device_id=001&user_id=7 (or user_name=alice)
+    """
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    device_id = request.args.get('device_id')
+    user_id = request.args.get('user_id', type=int)
+    user_name = request.args.get('user_name')
+    if not device_id or (user_id is None and not user_name):
+        return jsonify({'error': 'device_id and user_id or user_name are required'}), 400
+    
+    try:
+        if user_id is None:
+            user_id = access_index.user_id(user_name)
+        expires = access_index.check(device_id, user_id)
+        if expires is None:
+            return jsonify({'allow': False})
+        return jsonify({
+            'allow': True,
+            'expires_at': datetime.fromtimestamp(expires, pytz.timezone('Asia/Kolkata')).isoformat()
+        })
+    except Exception as e:
+        current_app.logger.error(f"Error checking access to {device_id}: {str(e)}", exc_info=True)
+        return jsonify({'error': 'Failed to check access'}), 500
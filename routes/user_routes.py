@@ -1,13 +1,27 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
 from models.user import User
 from models.base import db
-from werkzeug.security import generate_password_hash
+from utils.user_cache import user_cache
+from utils.access_index import access_index
+from utils.password_hashing import HashQueueFull, password_hasher
+from utils.user_import import import_users, parse_users
+from utils.query_budget import query_budget
 from datetime import datetime
+import base64
+import binascii
+import json
 
 user_bp = Blueprint('user', __name__)
 
 
+def hashing_busy():
+    """503 with Retry-After for when the password hashing queue is full"""
+    response = jsonify({'error': 'Server is busy hashing passwords, please retry shortly'})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+
 @user_bp.route('/users/add', methods=['POST'])
 def add():
     if current_user.role != 'admin':
@@ -27,7 +41,7 @@ def add():
         new_user = User(
             user_name=data['user_name'],
             user_ip=data.get('user_ip', ''),
-            password_hash=generate_password_hash(data['password']),
+            password_hash=password_hasher.hash(data['password']),
             role=data.get('role', 'user'),
             created_at=datetime.utcnow()
         )
@@ -44,10 +58,48 @@ def add():
                 'role': new_user.role
             }
         })
+    except HashQueueFull:
+        return hashing_busy()
     except Exception as e:
         return jsonify({'error': f'Error adding user: {str(e)}'}), 500
     
 
+@user_bp.route('/users/import', methods=['POST'])
+@login_required
+def import_users_route():
+    """Create many users from a CSV or JSON upload, reporting each row
+
+    Send a 'file' upload (format from its extension or ?format=), a JSON
+    body, or a text/csv body with user_name, password and optional role
+    and user_ip columns. ?dry_run=true only validates.
+    """
+    if current_user.role != 'admin':
+        return jsonify({'error': 'You do not have permission to perform this action'}), 403
+    
+    try:
+        fmt = request.args.get('format')
+        upload = request.files.get('file')
+        if upload is not None:
+            fmt = fmt or ('json' if upload.filename.lower().endswith('.json') else 'csv')
+            rows = parse_users(upload.read(), fmt)
+        elif request.is_json:
+            rows = parse_users(request.get_json(), 'json')
+        else:
+            rows = parse_users(request.get_data(), fmt or 'csv')
+        
+        dry_run = request.args.get('dry_run', 'false').lower() == 'true'
+        result = import_users(rows, dry_run=dry_run, max_rows=current_app.config['USER_IMPORT_MAX_ROWS'])
+        
+        message = f"{'Validated' if dry_run else 'Created'} {result['valid']} of {len(rows)} users"
+        return jsonify({'message': message, 'dry_run': dry_run, **result}), 200 if result['valid'] else 400
+    except ValueError as e:
+        return jsonify({'error': f'Could not read users: {str(e)}'}), 400
+    except HashQueueFull:
+        return hashing_busy()
+    except Exception as e:
+        return jsonify({'error': f'Error importing users: {str(e)}'}), 500
+    
+
 @user_bp.route('/users/get/<int:user_id>', methods=['GET'])
 @login_required
 def get_user(user_id):
@@ -107,6 +159,8 @@ def edit_user(user_id):
             user.role = role
         
         db.session.commit()
+        user_cache.invalidate(user.id)
+        access_index.invalidate()
         
         return jsonify({
             'message': 'User updated successfully!',
@@ -118,6 +172,9 @@ def edit_user(user_id):
             }
         })
         
+    except HashQueueFull:
+        db.session.rollback()
+        return hashing_busy()
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Error updating user: {str(e)}'}), 500
@@ -151,9 +208,11 @@ def update(user_id):
         
         # Only update password if provided
         if data.get('password'):
-            user.password_hash = generate_password_hash(data['password'])
+            user.password_hash = password_hasher.hash(data['password'])
         
         db.session.commit()
+        user_cache.invalidate(user.id)
+        access_index.invalidate()
         return jsonify({
             'message': 'User updated successfully!',
             'user': {
@@ -163,6 +222,9 @@ def update(user_id):
                 'role': user.role
             }
         })
+    except HashQueueFull:
+        db.session.rollback()
+        return hashing_busy()
     except Exception as e:
         return jsonify({'error': f'Error updating user: {str(e)}'}), 500
 
@@ -175,6 +237,8 @@ def delete(user_id):
         user = User.query.get_or_404(user_id)
         db.session.delete(user)
         db.session.commit()
+        user_cache.invalidate(user_id)
+        access_index.invalidate()
         return jsonify({'message': 'User deleted successfully!'})
     except Exception as e:
         return jsonify({'error': f'Error deleting user: {str(e)}'}), 500
@@ -193,6 +257,95 @@ def api_users():
     } for user in users])
 
 
+@user_bp.route('/api/users/search', methods=['GET'])
+@query_budget(1)
+@login_required
+def search_users():
+    """Page through users by case-insensitive username, with optional filters
+
+    ?q= matches the start of the username (or anywhere with
+    match=substring); role= and is_active= filter. Results are ordered by
+    lowercase username and paged with the opaque next_cursor, which walks
+    the lower(user_name) index instead of counting past an offset.
+    """
+    if current_user.role != 'admin':
+        return jsonify({'error': 'You do not have permission to view this data'}), 403
+    
+    query_text = request.args.get('q', '').strip().lower()
+    match = request.args.get('match', 'prefix')
+    if match not in ('prefix', 'substring'):
+        return jsonify({'error': 'match must be prefix or substring'}), 400
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    
+    try:
+        cursor = decode_cursor(request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    try:
+        name_key = db.func.lower(User.user_name)
+        query = db.select(User.id, User.user_name, User.user_ip, User.role, User.is_active)
+        
+        if query_text and match == 'prefix':
+            # A range on the indexed expression; LIKE 'abc%' can't use an expression index
+            query = query.where(name_key >= query_text, name_key < query_text + '\U0010ffff')
+        elif query_text:
+            escaped = query_text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            query = query.where(name_key.like(f'%{escaped}%', escape='\\'))
+        
+        if request.args.get('role'):
+            query = query.where(User.role == request.args['role'])
+        if request.args.get('is_active') in ('true', 'false'):
+            query = query.where(User.is_active.is_(request.args['is_active'] == 'true'))
+        
+        if cursor:
+            # Equivalent to (name, id) > cursor, written so SQLite can seek the index to the cursor
+            last_name, last_id = cursor
+            query = query.where(name_key >= last_name, db.or_(name_key > last_name, User.id > last_id))
+        
+        rows = db.session.execute(query.order_by(name_key, User.id).limit(limit + 1)).all()
+        page = rows[:limit]
+        
+        return jsonify({
+            'users': [{
+                'id': row.id,
+                'user_name': row.user_name,
+                'user_ip': row.user_ip,
+                'role': row.role,
+                'is_active': row.is_active
+            } for row in page],
+            'next_cursor': encode_cursor(page[-1].user_name.lower(), page[-1].id) if len(rows) > limit else None
+        })
+    except Exception as e:
+        return jsonify({'error': f'Error searching users: {str(e)}'}), 500
+
+
+def encode_cursor(user_name_lower, user_id):
+    return base64.urlsafe_b64encode(json.dumps([user_name_lower, user_id]).encode()).decode()
+
+
+def decode_cursor(value):
+    """(lowercase username, id) of the last row on the previous page, or None"""
+    if not value:
+        return None
+    try:
+        user_name_lower, user_id = json.loads(base64.urlsafe_b64decode(value.encode()))
+    except (TypeError, ValueError, binascii.Error):
+        raise ValueError('Invalid cursor')
+    if not isinstance(user_name_lower, str) or not isinstance(user_id, int):
+        raise ValueError('Invalid cursor')
+    return user_name_lower, user_id
+
+
+@user_bp.route('/api/user-cache/stats', methods=['GET'])
+@login_required
+def user_cache_stats():
+    if current_user.role != 'admin':
+        return jsonify({'error': 'You do not have permission to view this data'}), 403
+
+    return jsonify(user_cache.stats())
+
+
 @user_bp.route('/api/current-user', methods=['GET'])
 @login_required
 def get_current_user():
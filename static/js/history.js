@@ -1,37 +1,156 @@
 
     $(document).ready(function() {
-        // Initialize DataTable
-        const table = $('#historyTable').DataTable({
-            order: [[2, 'desc']],
-            pageLength: 25,
-            responsive: true
-        });
+        // Lazily loaded history table - rows come from /history/records page by page
+        const $table = $('#historyTable');
+        const $tbody = $table.find('tbody');
+        const $loader = $('#historyLoader');
+        const $end = $('#historyEnd');
+        const isAdmin = $table.data('is-admin') === true || $table.data('is-admin') === 'true';
+        const PAGE_SIZE = 50;
 
-        // Filter handlers
-        $('#deviceFilter, #userFilter, #statusFilter').on('change', function() {
-            table.column($(this).parent().index()).search(this.value).draw();
-        });
+        const state = {
+            page: 0,
+            hasNext: true,
+            loading: false,
+            sort: 'start_time',
+            order: 'desc',
+            requestId: 0
+        };
+
+        const formatTime = (isoStr) => {
+            if (!isoStr) return null;
+            // Server sends IST timestamps; show them as YYYY-MM-DD HH:MM
+            return isoStr.substring(0, 16).replace('T', ' ');
+        };
+
+        const statusBadge = (status) => {
+            if (status === 'active') return $('<span class="badge active-badge status-badge">').text('Active');
+            if (status === 'completed') return $('<span class="badge completed-badge status-badge">').text('Completed');
+            return $('<span class="badge terminated-badge status-badge">').text('Terminated');
+        };
 
-        // Date range filtering
-        $.fn.dataTable.ext.search.push(
-            function(settings, data, dataIndex) {
-                const dateFrom = $('#dateFrom').val();
-                const dateTo = $('#dateTo').val();
-                const rowDate = new Date(data[2]).setHours(0,0,0,0);
-                
-                if (!dateFrom && !dateTo) return true;
-                if (dateFrom && !dateTo) return rowDate >= new Date(dateFrom).setHours(0,0,0,0);
-                if (!dateFrom && dateTo) return rowDate <= new Date(dateTo).setHours(0,0,0,0);
-                if (dateFrom && dateTo) return rowDate >= new Date(dateFrom).setHours(0,0,0,0) && 
-                                           rowDate <= new Date(dateTo).setHours(0,0,0,0);
-                return true;
+        // Rows are built from elements and .text() so record values are never parsed as HTML
+        const cell = (content) => $('<td class="td">').append(content);
+        const textCell = (value) => $('<td class="td">').text(value);
+
+        const renderRow = (record) => {
+            const endTime = formatTime(record.end_time);
+            const $actions = cell(
+                $('<button class="btn btn-sm view-details blue-btn">').attr('data-record-id', record.id).text('Details')
+            );
+            if (isAdmin) {
+                $actions.append(' ', $('<button class="btn btn-sm delete-record orange-btn">')
+                    .attr('data-record-id', record.id).text('Delete'));
             }
-        );
+            return $('<tr>').append(
+                cell($('<strong>').text(record.device_id)),
+                textCell(formatTime(record.start_time) || '-'),
+                endTime ? textCell(endTime) : cell($('<em>').text('In Progress')),
+                textCell(record.duration_formatted || '-').addClass('duration-cell'),
+                cell(statusBadge(record.status)),
+                textCell(record.ip_type || ''),
+                $actions
+            )[0];
+        };
+
+        const currentFilters = () => {
+            const filters = {};
+            if ($('#deviceFilter').val()) filters.device_id = $('#deviceFilter').val();
+            if ($('#statusFilter').val()) filters.status = $('#statusFilter').val();
+            if ($('#dateFrom').val()) filters.from = $('#dateFrom').val();
+            if ($('#dateTo').val()) filters.to = $('#dateTo').val();
+            return filters;
+        };
+
+        function loadNextPage() {
+            if (state.loading || !state.hasNext) return;
+            state.loading = true;
+            const requestId = state.requestId;
+            $loader.show();
 
-        $('#dateFrom, #dateTo').on('change', function() {
-            table.draw();
+            $.ajax({
+                url: '/history/records',
+                method: 'GET',
+                data: {
+                    ...currentFilters(),
+                    page: state.page + 1,
+                    per_page: PAGE_SIZE,
+                    sort: state.sort,
+                    order: state.order
+                },
+                success: function(response) {
+                    // Ignore responses for a filter/sort that has since changed
+                    if (requestId !== state.requestId) return;
+                    state.page = response.pagination.page;
+                    state.hasNext = response.pagination.has_next;
+                    $tbody.append(response.records.map(renderRow));
+                    $end.toggle(!state.hasNext);
+                },
+                error: function(xhr) {
+                    if (requestId !== state.requestId) return;
+                    state.hasNext = false;
+                    alert(xhr.responseJSON?.error || 'Failed to load records');
+                },
+                complete: function() {
+                    if (requestId !== state.requestId) return;
+                    state.loading = false;
+                    $loader.hide();
+                    // Keep loading until the sentinel scrolls out of view
+                    if (state.hasNext && isNearBottom()) loadNextPage();
+                }
+            });
+        }
+
+        function reloadTable() {
+            state.requestId += 1;
+            state.page = 0;
+            state.hasNext = true;
+            state.loading = false;
+            $tbody.empty();
+            $end.hide();
+            loadNextPage();
+        }
+
+        function isNearBottom() {
+            const rect = $loader[0].getBoundingClientRect();
+            return rect.top - window.innerHeight < 300;
+        }
+
+        // Load more as the user scrolls towards the end of the table
+        if ('IntersectionObserver' in window) {
+            new IntersectionObserver(function(entries) {
+                if (entries.some(entry => entry.isIntersecting)) loadNextPage();
+            }, { rootMargin: '300px' }).observe($loader[0]);
+        } else {
+            $(window).on('scroll', function() {
+                if (isNearBottom()) loadNextPage();
+            });
+        }
+
+        // Sorting
+        $table.find('th.sortable').css('cursor', 'pointer').on('click', function() {
+            const column = $(this).data('sort');
+            if (state.sort === column) {
+                state.order = state.order === 'desc' ? 'asc' : 'desc';
+            } else {
+                state.sort = column;
+                state.order = 'desc';
+            }
+            reloadTable();
+        });
+
+        // Filters are applied on the server
+        $('#deviceFilter, #statusFilter, #dateFrom, #dateTo').on('change', reloadTable);
+
+        // Device filter options
+        $.getJSON('/api/devices', function(response) {
+            (response.devices || []).forEach(function(device) {
+                $('#deviceFilter').append($('<option>').val(device.device_id).text(device.device_id));
+            });
         });
 
+        loadNextPage();
+
         // CSRF setup
         $.ajaxSetup({
             beforeSend: function(xhr, settings) {
@@ -42,7 +161,7 @@
             }
         });
 
-        $('.view-details').click(function() {
+        $(document).on('click', '.view-details', function() {
             const recordId = $(this).data('record-id');
             const modal = $('#detailsModal');
             
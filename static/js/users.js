@@ -2,24 +2,87 @@
     $(document).ready(function() {
         // Initialize DataTable
         const table = $('#usersTable').DataTable({
-            order: [[0, 'asc']],
+            order: [],
             pageLength: 25,
             responsive: true
         });
  
+        // Rows come from the server-side search, one keyset page at a time
+        let nextCursor = null;
+        let searchTimer = null;
+        let searchRequest = null;
+ 
+        // DataTables renders cells as HTML, so every stored value is escaped first
+        const escapeHtml = (value) => $('<div>').text(value).html();
+
+        function userRow(user) {
+            return [
+                user.id,
+                `<strong>${escapeHtml(user.user_name)}</strong>`,
+                escapeHtml(user.user_ip || '-'),
+                `<span class="badge role-badge badge-${user.role === 'admin' ? 'admin' : 'user'}">
+                    ${escapeHtml(user.role)}
+                </span>`,
+                `<button class="btn btn-sm edit-user blue-btn"
+                        data-user-id="${user.id}">
+                    Edit
+                </button>
+                ${user.role !== 'admin' ? `
+                <button class="btn btn-sm delete-user orange-btn"
+                        data-user-id="${user.id}">
+                    Delete
+                </button>` : ''}`
+            ];
+        }
+ 
+        function loadUsers(append) {
+            const params = {
+                q: $('#usernameFilter').val().trim(),
+                match: $('#usernameMatch').val() || 'prefix',
+                role: $('#roleFilter').val(),
+                is_active: $('#activeFilter').val() || '',
+                limit: 100
+            };
+            if (append && nextCursor) params.cursor = nextCursor;
+ 
+            if (searchRequest) searchRequest.abort();
+            searchRequest = $.ajax({
+                url: '/api/users/search',
+                method: 'GET',
+                data: params,
+                success: function(response) {
+                    if (!append) table.clear();
+                    table.rows.add(response.users.map(userRow)).draw(false);
+                    nextCursor = response.next_cursor;
+                    $('#loadMoreUsers').toggle(!!nextCursor);
+                },
+                error: function(xhr, status) {
+                    if (status === 'abort') return;
+                    alert(xhr.responseJSON?.error || 'Failed to load users');
+                }
+            });
+        }
+ 
         // Filter handlers
         $('#userIdFilter').on('keyup', function() {
             table.column(0).search(this.value).draw();
         });
  
         $('#usernameFilter').on('keyup', function() {
-            table.column(1).search(this.value).draw();
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => loadUsers(false), 250);
         });
  
-        $('#roleFilter').on('change', function() {
-            table.column(3).search(this.value).draw();
+        $('#roleFilter, #activeFilter, #usernameMatch').on('change', function() {
+            loadUsers(false);
         });
  
+        $('#loadMoreUsers').on('click', function() {
+            loadUsers(true);
+        });
+ 
+        loadUsers(false);
+ 
         // CSRF setup
         $.ajaxSetup({
             beforeSend: function(xhr, settings) {
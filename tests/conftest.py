@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('TESTING', '1')
+os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+os.environ.setdefault('LOG_PIPELINE_ENABLED', 'false')
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """Build an app on a SQLite file in tmp_path; call again to restart against the same file"""
+    monkeypatch.setenv('DATABASE_URI', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv('SQL_BUDGET_MODE', 'raise')
+
+    def make(bootstrap=True):
+        from app import bootstrap_database, create_app
+        app = create_app(bootstrap=False, start_services=False)
+        if bootstrap:
+            bootstrap_database(app)
+        return app
+
+    return make
+
+
+@pytest.fixture
+def admin_client():
+    def login(app):
+        client = app.test_client()
+        response = client.post('/login', json={'username': 'admin', 'password': 'admin123'})
+        assert response.status_code == 200
+        return client
+
+    return login
@@ -0,0 +1,152 @@
+import time
+from datetime import datetime, timedelta
+import pytest
+import pytz
+import utils.access_index as access_index_module
+from models import db
+from models.device import Device
+from models.reservation import Reservation
+from models.user import User
+from utils.access_index import access_index, merge_windows
+
+IST = pytz.timezone('Asia/Kolkata')
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Frozen time.time() for the access index, starting on a whole minute"""
+    clock = Clock(time.time() // 60 * 60)
+    monkeypatch.setattr(access_index_module, 'time', clock)
+    return clock
+
+
+def book(device_id, user_id, start, minutes):
+    return Reservation(device_id=device_id, user_id=user_id, start_time=start,
+                       end_time=start + timedelta(minutes=minutes), status='upcoming')
+
+
+def seed(app, clock, bookings):
+    """Users alice and bob plus bookings given as (device_id, user_name, minutes from now, length)"""
+    base = datetime.fromtimestamp(clock.now, IST)
+    with app.app_context():
+        db.session.add_all([Device(device_id='D1'), Device(device_id='D2'),
+                            User(user_name='alice', password_hash='x', role='user'),
+                            User(user_name='bob', password_hash='x', role='user')])
+        db.session.flush()
+        ids = {user.user_name: user.id for user in User.query.all()}
+        db.session.add_all([book(device_id, ids[user_name], base + timedelta(minutes=offset), minutes)
+                            for device_id, user_name, offset, minutes in bookings])
+        db.session.commit()
+    access_index.invalidate()
+    return base, ids
+
+
+def check(client, device_id, **user):
+    response = client.get('/api/access-check', query_string={'device_id': device_id, **user})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_merge_windows_joins_overlapping_and_back_to_back():
+    assert merge_windows([(5, 8), (1, 3), (3, 4), (2, 3)]) == ((1, 4), (5, 8))
+    assert merge_windows([(1, 10), (2, 3)]) == ((1, 10),)
+    assert merge_windows([]) == ()
+
+
+def test_back_to_back_bookings_merge_and_expire_without_reload(make_app, admin_client, clock, monkeypatch):
+    monkeypatch.setenv('ACCESS_INDEX_HORIZON', '3600')
+    app = make_app()
+    client = admin_client(app)
+    base, ids = seed(app, clock, [('D1', 'alice', -10, 10), ('D1', 'alice', 0, 10), ('D1', 'alice', 30, 10)])
+
+    # The second booking starts exactly when the first ends: one window through both
+    clock.now -= 60
+    assert check(client, 'D1', user_id=ids['alice']) == {
+        'allow': True, 'expires_at': (base + timedelta(minutes=10)).isoformat()
+    }
+    loads = access_index.loads
+    clock.now = base.timestamp()
+    assert check(client, 'D1', user_id=ids['alice'])['allow'] is True
+
+    # At the end of the merged window access expires without reloading
+    clock.now = (base + timedelta(minutes=10)).timestamp()
+    assert check(client, 'D1', user_id=ids['alice']) == {'allow': False}
+    # The gap before the next booking is denied, the booking itself allowed
+    clock.now = (base + timedelta(minutes=30)).timestamp()
+    assert check(client, 'D1', user_id=ids['alice'])['allow'] is True
+    assert check(client, 'D2', user_id=ids['alice']) == {'allow': False}
+    assert check(client, 'D1', user_id=ids['bob']) == {'allow': False}
+    assert access_index.loads == loads
+
+
+def test_bookings_past_the_horizon_load_once_it_passes(make_app, admin_client, clock, monkeypatch):
+    monkeypatch.setenv('ACCESS_INDEX_HORIZON', '600')
+    app = make_app()
+    client = admin_client(app)
+    base, ids = seed(app, clock, [('D1', 'alice', 15, 30)])
+
+    assert check(client, 'D1', user_id=ids['alice']) == {'allow': False}
+    loads = access_index.loads
+
+    # Still inside the loaded horizon: no reload, still denied
+    clock.now = (base + timedelta(minutes=9)).timestamp()
+    assert check(client, 'D1', user_id=ids['alice']) == {'allow': False}
+    assert access_index.loads == loads
+
+    clock.now = (base + timedelta(minutes=15)).timestamp()
+    assert check(client, 'D1', user_id=ids['alice']) == {
+        'allow': True, 'expires_at': (base + timedelta(minutes=45)).isoformat()
+    }
+    assert access_index.loads == loads + 1
+
+
+def test_invalidate_after_cancel_deactivation_and_delete(make_app, admin_client, clock):
+    app = make_app()
+    client = admin_client(app)
+    with app.app_context():
+        admin_id = User.query.filter_by(user_name='admin').one().id
+    _, ids = seed(app, clock, [('D1', 'alice', -5, 30), ('D2', 'bob', -5, 30)])
+    with app.app_context():
+        db.session.add(book('D2', admin_id, datetime.fromtimestamp(clock.now, IST) - timedelta(minutes=5), 30))
+        db.session.commit()
+        admin_reservation = Reservation.query.filter_by(user_id=admin_id).one().id
+    access_index.invalidate()
+    for device_id, user_id in (('D1', ids['alice']), ('D2', ids['bob']), ('D2', admin_id)):
+        assert check(client, device_id, user_id=user_id)['allow'] is True
+
+    assert client.post(f'/reservation/cancel/{admin_reservation}').status_code == 200
+    assert check(client, 'D2', user_id=admin_id) == {'allow': False}
+
+    # Deactivation has no route yet; whatever does it must call invalidate()
+    with app.app_context():
+        db.session.get(User, ids['alice']).is_active = False
+        db.session.commit()
+    assert check(client, 'D1', user_id=ids['alice'])['allow'] is True
+    access_index.invalidate()
+    assert check(client, 'D1', user_id=ids['alice']) == {'allow': False}
+
+    assert client.post(f"/users/delete/{ids['bob']}").status_code == 200
+    assert check(client, 'D2', user_id=ids['bob']) == {'allow': False}
+    assert check(client, 'D2', user_name='bob') == {'allow': False}
+
+
+def test_user_name_lookup(make_app, admin_client, clock):
+    app = make_app()
+    client = admin_client(app)
+    base, ids = seed(app, clock, [('D1', 'alice', -5, 30)])
+
+    assert check(client, 'D1', user_name='alice') == {
+        'allow': True, 'expires_at': (base + timedelta(minutes=25)).isoformat()
+    }
+    # bob exists but holds no reservation in the window; nobody is called carol
+    assert check(client, 'D1', user_name='bob') == {'allow': False}
+    assert check(client, 'D1', user_name='carol') == {'allow': False}
+    assert client.get('/api/access-check?device_id=D1').status_code == 400
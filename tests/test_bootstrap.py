@@ -0,0 +1,32 @@
+import sqlite3
+
+from models import User
+
+
+def user_indexes(app):
+    path = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
+    with sqlite3.connect(path) as connection:
+        return {row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'users'"
+        )}
+
+
+def test_bootstrap_twice_keeps_admin_and_search_index(make_app, monkeypatch):
+    # Development re-raises bootstrap errors, so a failing second start would show here
+    monkeypatch.setenv('FLASK_ENV', 'development')
+    make_app()
+    app = make_app()
+
+    with app.app_context():
+        assert User.query.filter_by(user_name='admin').count() == 1
+    assert 'ix_users_user_name_lower' in user_indexes(app)
+
+
+def test_bootstrap_adds_search_index_to_existing_database(make_app):
+    app = make_app()
+    path = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
+    with sqlite3.connect(path) as connection:
+        connection.execute('DROP INDEX ix_users_user_name_lower')
+
+    app = make_app()
+    assert 'ix_users_user_name_lower' in user_indexes(app)
@@ -0,0 +1,69 @@
+from models import db
+from models.device import Device
+
+
+def devices(app):
+    with app.app_context():
+        return {device.device_id: (device.PC_IP, device.CT1_ip) for device in Device.query.all()}
+
+
+def test_validation_lists_every_problem(make_app, admin_client):
+    app = make_app()
+    client = admin_client(app)
+    data = ('device_id,PC_IP,CT1_IP\n'
+            'D1,10.0.0.1,10.0.1.300\n'
+            ',10.0.0.2,\n'
+            'D1,10.0.0.x,\n'
+            f"{'X' * 51},,\n")
+
+    response = client.post('/api/devices/import', data=data, content_type='text/csv')
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body['message'] == '4 of 4 rows failed validation'
+    assert [(error['row'], error['field']) for error in body['errors']] == [
+        (1, 'CT1_ip'), (2, 'device_id'), (3, 'device_id'), (3, 'PC_IP'), (4, 'device_id')
+    ]
+    assert 'first seen in row 1' in body['errors'][2]['message']
+    assert devices(app) == {}
+
+
+def test_dry_run_and_upsert_counts(make_app, admin_client):
+    app = make_app()
+    client = admin_client(app)
+    with app.app_context():
+        db.session.add(Device(device_id='D1', PC_IP='10.0.0.1', CT1_ip='10.0.1.1'))
+        db.session.commit()
+    rows = [{'device_id': 'D1', 'pc_ip': '10.0.0.9'}, {'device_id': 'D2', 'pc_ip': '10.0.0.2', 'ct1_ip': '10.0.1.2'}]
+
+    response = client.post('/api/devices/import?dry_run=true', json=rows)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['dry_run'], body['inserted'], body['updated'], body['columns']) == (True, 1, 1, ['PC_IP', 'CT1_ip'])
+    assert devices(app) == {'D1': ('10.0.0.1', '10.0.1.1')}
+
+    body = client.post('/api/devices/import', json=rows).get_json()
+    assert (body['dry_run'], body['inserted'], body['updated']) == (False, 1, 1)
+    # D1's row has no ct1_ip key, so its CT1 IP is kept
+    assert devices(app) == {'D1': ('10.0.0.9', '10.0.1.1'), 'D2': ('10.0.0.2', '10.0.1.2')}
+
+
+def test_only_empty_values_clear_a_field(make_app, admin_client):
+    app = make_app()
+    client = admin_client(app)
+    with app.app_context():
+        db.session.add_all([Device(device_id='D1', PC_IP='10.0.0.1', CT1_ip='10.0.1.1'),
+                            Device(device_id='D2', PC_IP='10.0.0.2', CT1_ip='10.0.1.2')])
+        db.session.commit()
+
+    response = client.post('/api/devices/import', json={'devices': [
+        {'device_id': 'D1', 'ct1_ip': ''},
+        {'device_id': 'D2', 'pc_ip': None}
+    ]})
+    assert response.status_code == 200
+    assert devices(app) == {'D1': ('10.0.0.1', None), 'D2': (None, '10.0.1.2')}
+
+    # In CSV every row has every column, so an empty cell clears
+    response = client.post('/api/devices/import', data='device_id,pc_ip,ct1_ip\nD1,10.0.0.5,\n',
+                           content_type='text/csv')
+    assert response.status_code == 200
+    assert devices(app)['D1'] == ('10.0.0.5', None)
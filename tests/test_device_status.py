@@ -0,0 +1,20 @@
+from datetime import datetime, timedelta
+import pytz
+from models import Device, Reservation, db
+from utils.device_registry import device_registry
+
+
+def test_status_without_time_range_uses_the_next_hour(make_app, admin_client):
+    app = make_app()
+    now = datetime.now(pytz.timezone('Asia/Kolkata'))
+    with app.app_context():
+        db.session.add_all([Device(device_id='001'), Device(device_id='002')])
+        db.session.add(Reservation(device_id='001', user_id=1, start_time=now - timedelta(minutes=5),
+                                   end_time=now + timedelta(minutes=30)))
+        db.session.commit()
+        device_registry.invalidate()
+
+    response = admin_client(app).get('/api/devices/status')
+    assert response.status_code == 200
+    statuses = {device['device_id']: device['status'] for device in response.get_json()['devices']}
+    assert statuses == {'001': 'booked', '002': 'available'}
@@ -0,0 +1,38 @@
+import tracemalloc
+from utils.memory_snapshots import memory_snapshots
+from utils.profiling import background_sampler
+
+
+def test_memory_snapshots_get_unique_ids_and_are_pruned(make_app, admin_client, tmp_path, monkeypatch):
+    monkeypatch.setenv('MEMORY_SNAPSHOT_DIR', str(tmp_path / 'memory'))
+    monkeypatch.setenv('MEMORY_SNAPSHOT_KEEP', '3')
+    app = make_app()
+    client = admin_client(app)
+
+    assert client.post('/api/diagnostics/memory/start').status_code == 200
+    try:
+        # Several snapshots within the same second from the same process
+        ids = [client.post('/api/diagnostics/memory/snapshots?limit=1').get_json()['id'] for _ in range(5)]
+    finally:
+        tracemalloc.stop()
+
+    assert len(set(ids)) == 5
+    snapshots = client.get('/api/diagnostics/memory').get_json()['snapshots']
+    assert [snapshot['id'] for snapshot in snapshots] == ids[:-4:-1]
+    assert len(list((tmp_path / 'memory').iterdir())) == 3
+    assert client.get(f'/api/diagnostics/memory/snapshots/{ids[-1]}').status_code == 200
+
+
+def test_background_sampler_starts_outside_requests(make_app, tmp_path, monkeypatch):
+    monkeypatch.setenv('SAMPLER_ENABLED', 'true')
+    monkeypatch.setenv('SAMPLER_DIR', str(tmp_path / 'continuous'))
+    monkeypatch.setenv('SAMPLER_INTERVAL', '1')
+    make_app(bootstrap=False)
+    background_sampler.after_fork()
+
+    # What start_scheduler() does in a preloading master that never serves a request
+    background_sampler.start()
+    assert background_sampler.status()['running']
+    thread = background_sampler._thread
+    background_sampler.start()
+    assert background_sampler._thread is thread
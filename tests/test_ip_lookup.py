@@ -0,0 +1,36 @@
+from models import Device, db
+from utils.device_registry import device_registry, normalize_ip
+
+
+def test_normalize_ip_strips_zero_padding():
+    assert normalize_ip('100.120.05.51') == '100.120.5.51'
+    assert normalize_ip(' 10.0.0.1 ') == '10.0.0.1'
+    assert normalize_ip('not-an-ip') == 'not-an-ip'
+
+
+def test_lookup_finds_zero_padded_and_shared_ips(make_app, admin_client):
+    app = make_app()
+    with app.app_context():
+        db.session.add_all([
+            Device(device_id='001', PC_IP='100.120.05.51', CT1_ip='100.120.5.60'),
+            Device(device_id='002', PC_IP='100.120.5.70', Pulse1_Ip='100.120.05.60'),
+        ])
+        db.session.commit()
+        device_registry.invalidate()
+
+    client = admin_client(app)
+
+    for address in ('100.120.05.51', '100.120.5.51'):
+        response = client.get(f'/api/ip/{address}')
+        assert response.status_code == 200
+        body = response.get_json()
+        assert not body['shared']
+        assert [(m['device']['device_id'], m['endpoint']) for m in body['matches']] == [('001', 'PC_IP')]
+
+    body = client.get('/api/ip/100.120.5.60').get_json()
+    assert body['shared']
+    assert sorted((m['device']['device_id'], m['endpoint']) for m in body['matches']) == [
+        ('001', 'CT1_ip'), ('002', 'Pulse1_Ip')
+    ]
+
+    assert client.get('/api/ip/10.9.9.9').status_code == 404
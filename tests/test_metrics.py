@@ -0,0 +1,45 @@
+import threading
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from utils.metrics import Metrics
+
+
+def test_finished_threads_fold_into_base_shard():
+    metrics = Metrics()
+
+    def work():
+        metrics.shard().inc('ruto_http_requests_total', (('endpoint', 'x'),))
+
+    for _ in range(50):
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+
+    counters, _, _ = metrics.snapshot()
+    assert counters[('ruto_http_requests_total', (('endpoint', 'x'),))] == 50
+    assert metrics._shards == []
+
+
+def sql_queries_total(metrics):
+    counters = metrics.snapshot()[0]
+    return sum(value for (name, _), value in counters.items() if name == 'ruto_sql_queries_total')
+
+
+def test_second_app_does_not_double_count_queries(make_app, admin_client):
+    from utils.metrics import metrics
+
+    make_app()
+    client = admin_client(make_app())
+    executed = []
+
+    def count(*args):
+        executed.append(1)
+
+    event.listen(Engine, 'after_cursor_execute', count)
+    try:
+        before = sql_queries_total(metrics)
+        client.get('/api/devices')
+        assert executed
+        assert sql_queries_total(metrics) - before == len(executed)
+    finally:
+        event.remove(Engine, 'after_cursor_execute', count)
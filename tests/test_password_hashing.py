@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+import pytest
+from werkzeug.security import generate_password_hash
+from utils.password_hashing import HashQueueFull, PasswordHasher, normalize_method
+
+
+def make_hasher(**kwargs):
+    hasher = PasswordHasher(workers=1, **kwargs)
+    hasher._slots = threading.BoundedSemaphore(hasher.workers + hasher.max_queue)
+    return hasher
+
+
+def test_short_method_names_match_stored_hashes():
+    for method in ('scrypt', 'scrypt:32768:8:1', 'pbkdf2', 'pbkdf2:sha256', 'pbkdf2:sha512:1000'):
+        hasher = PasswordHasher(method=method)
+        assert not hasher.needs_rehash(generate_password_hash('secret', method))
+    assert normalize_method('pbkdf2:sha512:1000') == 'pbkdf2:sha512:1000'
+    assert PasswordHasher(method='scrypt').needs_rehash(generate_password_hash('secret', 'pbkdf2'))
+    assert PasswordHasher(method='scrypt:16384:8:1').needs_rehash(generate_password_hash('secret', 'scrypt'))
+
+
+def test_timed_out_job_keeps_its_slot_until_it_finishes():
+    hasher = make_hasher(timeout=30)
+    try:
+        hasher._run(time.sleep, 0)  # start the worker process
+        hasher.timeout = 0.05
+        with pytest.raises(HashQueueFull, match='timed out'):
+            hasher._run(time.sleep, 1)
+        assert hasher.in_flight == 1
+        with pytest.raises(HashQueueFull, match='queue is full'):
+            hasher._run(time.sleep, 0)
+        time.sleep(1.5)
+        assert hasher.in_flight == 0
+        hasher.timeout = 30
+        hasher._run(time.sleep, 0)
+    finally:
+        hasher.shutdown()
+
+
+def test_broken_pool_is_replaced():
+    hasher = make_hasher(timeout=30)
+    try:
+        with pytest.raises(HashQueueFull, match='unavailable'):
+            hasher._run(os._exit, 1)
+        assert hasher.in_flight == 0
+        password_hash = hasher.hash('secret')
+        assert hasher.verify(password_hash, 'secret')
+    finally:
+        hasher.shutdown()
+
+
+def test_bulk_hashing_waits_for_slots():
+    hasher = make_hasher(method='pbkdf2:sha256:1000', timeout=30)
+    try:
+        hashes = hasher.hash_many(['a', 'b', 'c', 'd', 'e', 'f'])
+        assert [hasher.verify(h, p) for h, p in zip(hashes, 'abcdef')] == [True] * 6
+        assert hasher.in_flight == 0
+
+        hasher.timeout = 0.1
+        assert hasher._slots.acquire(blocking=False)
+        with pytest.raises(HashQueueFull, match='queue is full'):
+            hasher.hash_many(['a', 'b'])
+        hasher._slots.release()
+    finally:
+        hasher.shutdown()
+
+
+def test_user_routes_shed_load_when_the_queue_is_full(make_app, admin_client, monkeypatch):
+    from models import db
+    from models.user import User
+    from utils.password_hashing import password_hasher
+
+    app = make_app()
+    client = admin_client(app)
+    with app.app_context():
+        admin_id = User.query.filter_by(user_name='admin').one().id
+
+    def full(password):
+        raise HashQueueFull('Password hashing queue is full')
+
+    monkeypatch.setattr(password_hasher, 'hash', full)
+    responses = [
+        client.post('/users/add', json={'user_name': 'busy', 'password': 'pw'}),
+        client.post(f'/users/edit/{admin_id}', data={'user_name': 'renamed', 'password': 'pw'}),
+        client.post(f'/users/update/{admin_id}', json={'user_name': 'renamed', 'password': 'pw'})
+    ]
+    for response in responses:
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '5'
+
+    with app.app_context():
+        assert User.query.filter_by(user_name='busy').first() is None
+        assert db.session.get(User, admin_id).user_name == 'admin'
@@ -0,0 +1,47 @@
+import pytest
+from flask import jsonify
+from models import Device, User, db
+from utils.device_registry import device_registry
+from utils.query_budget import QueryBudgetExceeded, query_budget
+from utils.user_cache import user_cache
+
+BUDGETED_URLS = (
+    '/api/devices/drivers?device_ids=001',
+    '/api/devices/status',
+    '/api/ip/10.0.0.1',
+    '/api/reservations',
+    '/api/users/search?q=a',
+)
+
+
+@pytest.mark.parametrize('url', BUDGETED_URLS)
+def test_budgeted_routes_hold_on_cold_caches(make_app, admin_client, url):
+    app = make_app()
+    with app.app_context():
+        db.session.add(Device(device_id='001', PC_IP='10.0.0.1'))
+        db.session.commit()
+    client = admin_client(app)
+
+    for _ in range(2):
+        # Cold user cache and device registry first, then warm
+        device_registry.invalidate()
+        user_cache.clear()
+        response = client.get(url)
+        assert response.status_code == 200
+        assert int(response.headers['X-SQL-Query-Count']) <= int(response.headers['X-SQL-Query-Budget'])
+        for _ in range(2):
+            response = client.get(url)
+            assert response.status_code == 200
+
+
+def test_inspector_catches_n_plus_one(make_app, caplog):
+    app = make_app()
+
+    @app.route('/test/n-plus-one')
+    @query_budget(10)
+    def n_plus_one():
+        return jsonify([db.session.get(User, user_id, populate_existing=True) is not None for user_id in range(1, 5)])
+
+    assert app.test_client().get('/test/n-plus-one').status_code == 500
+    errors = [record.exc_info[1] for record in caplog.records if record.exc_info]
+    assert any(isinstance(error, QueryBudgetExceeded) and 'n_plus_one: 4x' in str(error) for error in errors)
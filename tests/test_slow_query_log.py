@@ -0,0 +1,62 @@
+import json
+import os
+import time
+import pytest
+from models import db
+from utils.slow_query_log import slow_query_log
+
+
+def test_per_process_files_and_failed_statements(make_app, tmp_path, monkeypatch):
+    monkeypatch.setenv('SLOW_QUERY_MS', '0.000001')
+    monkeypatch.setenv('SLOW_QUERY_EXPLAIN', 'false')
+    monkeypatch.setenv('SLOW_QUERY_LOG', str(tmp_path / 'slow.log'))
+    app = make_app(bootstrap=False)
+    assert slow_query_log.path == str(tmp_path / f'slow.{os.getpid()}.log')
+
+    # Another worker's file, with an entry newer than anything logged here
+    (tmp_path / 'slow.1.log').write_text(json.dumps({'timestamp': '9999-01-01T00:00:00', 'pid': 1}) + '\n')
+
+    with app.app_context():
+        with pytest.raises(Exception):
+            db.session.execute(db.text('SELECT * FROM no_such_table'))
+        db.session.rollback()
+        db.session.execute(db.text('SELECT 42'))
+
+    for _ in range(50):
+        entries = slow_query_log.tail(100)
+        if any('SELECT 42' in entry.get('statement', '') for entry in entries):
+            break
+        time.sleep(0.05)
+    assert entries[0]['pid'] == 1
+    assert any(entry.get('statement') == 'SELECT 42' for entry in entries)
+    assert not any('no_such_table' in entry.get('statement', '') for entry in entries)
+
+
+def test_dead_process_files_are_removed_and_parameters_redacted(make_app, tmp_path, monkeypatch):
+    import subprocess
+    import sys
+
+    finished = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+    dead_pid = int(finished.stdout)
+    for name in (f'slow.{dead_pid}.log', f'slow.{dead_pid}.log.1', 'slow.1.log', 'slow.notes.log'):
+        (tmp_path / name).write_text('{}\n')
+
+    monkeypatch.setenv('SLOW_QUERY_MS', '0.000001')
+    monkeypatch.setenv('SLOW_QUERY_EXPLAIN', 'false')
+    monkeypatch.setenv('SLOW_QUERY_LOG', str(tmp_path / 'slow.log'))
+    app = make_app(bootstrap=False)
+    assert not (tmp_path / f'slow.{dead_pid}.log').exists()
+    assert not (tmp_path / f'slow.{dead_pid}.log.1').exists()
+    assert (tmp_path / 'slow.1.log').exists()
+    assert (tmp_path / 'slow.notes.log').exists()
+
+    with app.app_context():
+        db.session.execute(db.text('SELECT :secret AS value'), {'secret': 'pbkdf2:sha256:hash'})
+
+    for _ in range(50):
+        entries = [entry for entry in slow_query_log.tail(100) if 'AS value' in entry.get('statement', '')]
+        if entries:
+            break
+        time.sleep(0.05)
+    assert entries[0]['parameters'] == 'redacted: 1 values'
+    assert 'pbkdf2' not in (tmp_path / f'slow.{os.getpid()}.log').read_text()
@@ -0,0 +1,23 @@
+from urllib.parse import parse_qs
+from utils.traffic_recorder import anonymize, traffic_recorder
+
+
+def test_query_strings_are_anonymized_like_bodies(make_app, admin_client, tmp_path, monkeypatch):
+    monkeypatch.setenv('TRAFFIC_RECORD_DIR', str(tmp_path / 'traffic'))
+    app = make_app()
+    monkeypatch.setattr(traffic_recorder, '_ensure_worker', lambda: None)
+    traffic_recorder.after_fork()
+    client = admin_client(app)
+
+    client.get('/api/users/search?q=alice&role=admin')
+    client.get('/api/access-check?user_name=alice&device_id=D1&token=secret')
+    entries = []
+    while not traffic_recorder._queue.empty():
+        entries.append(traffic_recorder._queue.get_nowait())
+
+    queries = {entry['e']: parse_qs(entry['q']) for entry in entries if 'q' in entry}
+    assert queries['user.search_users'] == {'q': [anonymize('alice', 'q')], 'role': ['admin']}
+    assert queries['reservation.access_check'] == {
+        'user_name': [anonymize('alice', 'user_name')], 'device_id': ['D1'], 'token': ['***']
+    }
+    assert not any('alice' in entry['q'] or 'secret' in entry['q'] for entry in entries if 'q' in entry)
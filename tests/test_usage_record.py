@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+import pytz
+from models import Device, DeviceUsage, Reservation, db
+
+
+def test_usage_record_with_reservation(make_app, admin_client):
+    app = make_app()
+    now = datetime.now(pytz.timezone('Asia/Kolkata'))
+    with app.app_context():
+        db.session.add(Device(device_id='001'))
+        reservation = Reservation(device_id='001', user_id=1, start_time=now, end_time=now + timedelta(hours=1))
+        db.session.add(reservation)
+        db.session.flush()
+        usage = DeviceUsage(device_id='001', user_id=1, reservation_id=reservation.id, actual_start_time=now,
+                            ip_address='10.0.0.1', ip_type='PC_IP', status='active')
+        db.session.add(usage)
+        db.session.commit()
+        usage_id, reservation_id = usage.id, reservation.id
+
+    response = admin_client(app).get(f'/history/get-usage-record/{usage_id}')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['reservation_info'] == {'reservation_id': reservation_id, 'ip_type': 'PC_IP'}
+    assert body['user_info']['user_name'] == 'admin'
+
+
+def test_usage_record_get_and_delete_load_what_they_read(make_app, admin_client):
+    app = make_app()
+    now = datetime.now(pytz.timezone('Asia/Kolkata'))
+    with app.app_context():
+        db.session.add(Device(device_id='001'))
+        usage = DeviceUsage(device_id='001', user_id=1, actual_start_time=now, status='active')
+        db.session.add(usage)
+        db.session.commit()
+        usage_id = usage.id
+
+    client = admin_client(app)
+    response = client.get(f'/history/{usage_id}')
+    assert response.status_code == 200
+    assert response.get_json()['record']['user_name'] == 'admin'
+    assert client.delete(f'/history/{usage_id}').status_code == 200
@@ -0,0 +1,20 @@
+from types import SimpleNamespace
+from utils.user_cache import UserCache, UserSnapshot
+
+
+def make_user(role):
+    return SimpleNamespace(**{**{field: None for field in UserSnapshot.FIELDS}, 'id': 1, 'role': role})
+
+
+def test_invalidate_reaches_other_workers(tmp_path):
+    app = SimpleNamespace(config={}, instance_path=str(tmp_path))
+    worker_a, worker_b = UserCache(), UserCache()
+    worker_a.init_app(app)
+    worker_b.init_app(app)
+
+    assert worker_b.get(1, lambda uid: make_user('admin')).role == 'admin'
+    assert worker_b.get(1, lambda uid: make_user('user')).role == 'admin'
+
+    worker_a.invalidate(1)
+    assert worker_b.get(1, lambda uid: make_user('user')).role == 'user'
+    assert worker_b.get(1, lambda uid: None).role == 'user'
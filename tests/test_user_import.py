@@ -0,0 +1,13 @@
+def test_import_over_the_row_limit_is_refused(make_app, admin_client, monkeypatch):
+    monkeypatch.setenv('USER_IMPORT_MAX_ROWS', '2')
+    app = make_app()
+    client = admin_client(app)
+    data = 'user_name,password\nu1,pw1\nu2,pw2\nu3,pw3\n'
+
+    response = client.post('/users/import', data=data, content_type='text/csv')
+    assert response.status_code == 400
+    assert 'limit of 2' in response.get_json()['error']
+
+    response = client.post('/users/import', data='user_name,password\nu1,pw1\n', content_type='text/csv')
+    assert response.status_code == 200
+    assert response.get_json()['created'] == 1
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+import pytz
+from models import Device, DeviceUsage, Reservation, db
+from models.utilization import DailyUtilization, DeviceUtilization, RollupDelta, UserUtilization, rollup_rebuild_sql
+
+
+def test_bootstrap_backfills_rollups_from_existing_history(make_app, admin_client):
+    app = make_app()
+    with app.app_context():
+        # Rows written before the rollup tables existed, so no listener saw them
+        db.session.execute(db.text("INSERT INTO devices (device_id) VALUES ('001')"))
+        db.session.execute(db.text(
+            "INSERT INTO reservations (id, device_id, user_id, start_time, end_time, status) VALUES "
+            "(1, '001', 1, '2026-01-05 10:00:00.000000', '2026-01-05 12:00:00.000000', 'expired'), "
+            "(2, '001', 1, '2026-01-06 10:00:00.000000', '2026-01-06 11:00:00.000000', 'expired')"
+        ))
+        db.session.execute(db.text(
+            "INSERT INTO device_usage_history (device_id, user_id, reservation_id, actual_start_time, "
+            "actual_end_time, status, termination_reason) VALUES "
+            "('001', 1, 1, '2026-01-05 10:00:00.000000', '2026-01-05 10:30:00.000000', 'terminated', 'Terminated by admin')"
+        ))
+        db.session.commit()
+
+    client = admin_client(make_app())
+    body = client.get('/history/stats?scope=device').get_json()
+    assert body['count'] == 1
+    stats = body['stats'][0]
+    assert (stats['reservations'], stats['sessions'], stats['no_shows'], stats['terminations']) == (2, 1, 1, 1)
+    assert (stats['booked_hours'], stats['used_hours']) == (3.0, 0.5)
+    assert client.get('/history/stats?scope=day').get_json()['count'] == 2
+
+
+def test_rollup_increments_upsert_existing_rows(make_app):
+    app = make_app()
+    with app.app_context():
+        for _ in range(2):
+            delta = RollupDelta()
+            delta.add('001', 1, None, sessions=1, used_seconds=60)
+            delta.apply(db.session.connection())
+        db.session.commit()
+        row = db.session.get(DeviceUtilization, '001')
+        assert (row.sessions, row.used_seconds, row.reservations) == (2, 120, 0)
+
+
+def rollup_rows(connection):
+    return {
+        model.__tablename__: sorted(
+            tuple(round(value, 3) if isinstance(value, float) else value for value in row)
+            for row in connection.execute(db.select(*[
+                column for column in model.__table__.columns if column.name != 'updated_at'
+            ]))
+        )
+        for model in (DeviceUtilization, UserUtilization, DailyUtilization)
+    }
+
+
+def test_incremental_rollups_match_rebuild(make_app):
+    app = make_app()
+    ist = pytz.timezone('Asia/Kolkata')
+    start = ist.localize(datetime(2026, 1, 5, 10, 0))
+    with app.app_context():
+        db.session.add_all([Device(device_id='001'), Device(device_id='002')])
+        bookings = [
+            Reservation(device_id='001', user_id=1, start_time=start + timedelta(hours=i),
+                        end_time=start + timedelta(hours=i, minutes=50))
+            for i in range(5)
+        ]
+        db.session.add_all(bookings)
+        db.session.flush()
+        # What booking a device creates: a row copying the booked window
+        placeholders = [
+            DeviceUsage(device_id='001', user_id=1, reservation=booking,
+                        actual_start_time=booking.start_time, actual_end_time=booking.end_time)
+            for booking in bookings
+        ]
+        db.session.add_all(placeholders)
+        db.session.commit()
+        for placeholder in placeholders:
+            # As booked, before any of them started
+            placeholder.status = 'upcoming'
+        db.session.commit()
+        # Routes load the row before changing it, so the flush hooks see the old status
+        placeholders = DeviceUsage.query.order_by(DeviceUsage.id).all()
+
+        # Used, then ended normally
+        placeholders[0].actual_end_time = bookings[0].start_time + timedelta(minutes=20)
+        placeholders[0].status = 'completed'
+        # Terminated by an admin
+        placeholders[1].actual_start_time = bookings[1].start_time + timedelta(minutes=5)
+        placeholders[1].status = 'terminated'
+        placeholders[1].termination_reason = 'Terminated by admin'
+        # Cancelled booking, marked the way the cancel route does
+        placeholders[2].status = 'Terminated'
+        placeholders[2].actual_end_time = bookings[2].start_time
+        # A session on another device with no reservation
+        db.session.add(DeviceUsage(device_id='002', user_id=1, actual_start_time=start,
+                                   actual_end_time=start + timedelta(minutes=30), status='completed'))
+        db.session.commit()
+        # Every booking is in the past, so 2, 3 and 4 become no-shows
+        Reservation.delete_expired()
+
+        live = rollup_rows(db.session.connection())
+        assert live['device_utilization'][0][1:4] == (5 * 3000.0, round(20 * 60 + 45 * 60, 3), 5)
+        for statement in rollup_rebuild_sql():
+            db.session.execute(db.text(statement), {'now': '2026-01-01 00:00:00.000000'})
+        assert rollup_rows(db.session.connection()) == live
+
+        device = db.session.get(DeviceUtilization, '001')
+        assert (device.sessions, device.terminations, device.no_shows) == (2, 1, 3)
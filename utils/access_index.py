@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+from datetime import datetime
+import pytz
+from models.base import db
+from models.reservation import Reservation
+from models.user import User
+from utils.device_registry import read_stamp, touch_stamp
+from utils.query_budget import uncounted
+
+IST = pytz.timezone('Asia/Kolkata')
+
+
+def merge_windows(windows):
+    """Sorted (start, end) pairs with overlapping or back-to-back windows joined"""
+    merged = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return tuple(merged)
+
+
+class AccessSnapshot:
+    """Reservations that are active now or start within the horizon, keyed by (device_id, user_id)"""
+
+    def __init__(self, rows, stamp, valid_until):
+        self.stamp = stamp
+        self.valid_until = valid_until
+        windows = {}
+        self.user_ids = {}
+        for device_id, user_id, user_name, start_time, end_time in rows:
+            windows.setdefault((device_id, user_id), []).append((start_time.timestamp(), end_time.timestamp()))
+            self.user_ids[user_name] = user_id
+        self.windows = {key: merge_windows(pairs) for key, pairs in windows.items()}
+
+
+class AccessIndex:
+    """Per-process answer to "may user U use device D right now?"
+
+    Each load covers reservations overlapping [now, now + ACCESS_INDEX_HORIZON],
+    so the snapshot stays correct until the horizon passes and reservations
+    expire on their own by end time. Reservation changes call invalidate(),
+    which touches a stamp file in the instance folder the same way the device
+    registry does, so every worker reloads on its next check.
+    """
+
+    def __init__(self, horizon=300):
+        self.horizon = horizon
+        self.stamp_path = None
+        self.loads = 0
+        self.checks = 0
+        self._snapshot = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.horizon = app.config.get('ACCESS_INDEX_HORIZON', self.horizon)
+        self.stamp_path = os.path.join(app.instance_path, 'access_index.stamp')
+        self._snapshot = None
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def snapshot(self, now=None):
+        now = time.time() if now is None else now
+        stamp = read_stamp(self.stamp_path)
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.stamp == stamp and now < snapshot.valid_until:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.stamp == stamp and now < snapshot.valid_until:
+                return snapshot
+            generation = self._generation
+            window_start = datetime.fromtimestamp(now, IST)
+            window_end = datetime.fromtimestamp(now + self.horizon, IST)
+            with uncounted():
+                rows = db.session.execute(
+                    db.select(Reservation.device_id, Reservation.user_id, User.user_name,
+                              Reservation.start_time, Reservation.end_time)
+                    .join(User, Reservation.user_id == User.id)
+                    .where(
+                        Reservation.start_time <= window_end,
+                        Reservation.end_time > window_start,
+                        Reservation.status != 'cancelled',
+                        User.is_active.is_(True)
+                    )
+                ).all()
+            snapshot = AccessSnapshot(rows, stamp, now + self.horizon)
+            self.loads += 1
+            if generation == self._generation:
+                self._snapshot = snapshot
+            return snapshot
+
+    def user_id(self, user_name):
+        """Id of a user holding a reservation in the current window, None otherwise"""
+        return self.snapshot().user_ids.get(user_name)
+
+    def check(self, device_id, user_id):
+        """Expiry timestamp of the user's current access to the device, or None if denied"""
+        self.checks += 1
+        now = time.time()
+        for start, end in self.snapshot(now).windows.get((device_id, user_id), ()):
+            if start <= now < end:
+                return end
+            if start > now:
+                break
+        return None
+
+    def invalidate(self):
+        """Call after committing any change to reservations or users"""
+        self._generation += 1
+        self._snapshot = None
+        touch_stamp(self.stamp_path)
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            'pairs': len(snapshot.windows) if snapshot else None,
+            'valid_for_seconds': round(snapshot.valid_until - time.time(), 1) if snapshot else None,
+            'loads': self.loads,
+            'checks': self.checks,
+            'horizon_seconds': self.horizon
+        }
+
+
+access_index = AccessIndex()
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from utils.device_registry import IP_FIELDS, read_stamp
+
+
+def parse_ports(value):
+    """'PC_IP=3389,CT1_ip=80' -> {endpoint: port}"""
+    ports = {}
+    for item in (value or '').split(','):
+        name, _, port = item.partition('=')
+        if name.strip() and port.strip().isdigit():
+            ports[name.strip()] = int(port)
+    return ports
+
+
+async def probe(host, port, timeout):
+    """TCP connect to host:port; reachable means the handshake completed within timeout"""
+    started = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except asyncio.TimeoutError:
+        return {'reachable': False, 'error': 'timeout'}
+    except OSError as e:
+        return {'reachable': False, 'error': e.strerror or type(e).__name__}
+    latency_ms = round((time.perf_counter() - started) * 1000, 2)
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return {'reachable': True, 'latency_ms': latency_ms}
+
+
+async def probe_all(targets, timeout, concurrency):
+    """Probe (key, host, port) targets with at most concurrency connections open; {key: result}"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def probe_one(key, host, port):
+        async with semaphore:
+            return key, await probe(host, port, timeout)
+
+    return dict(await asyncio.gather(*(probe_one(*target) for target in targets)))
+
+
+class DeviceHealth:
+    """Reachability of every device endpoint, probed on a schedule and read from a shared file
+
+    run_once() TCP-connects to each IP in the device table (DEVICE_PROBE_PORT,
+    or a per-column port from DEVICE_PROBE_PORTS) and atomically replaces
+    instance/device_health.json. The scheduler runs it in one process;
+    every worker re-reads the file only when its mtime changes, so requests
+    never wait on a probe.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.enabled = False
+        self._stamp = None
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('DEVICE_PROBE_ENABLED', False)
+        self.path = app.config.get('DEVICE_HEALTH_FILE') or os.path.join(app.instance_path, 'device_health.json')
+        self.interval = app.config.get('DEVICE_PROBE_INTERVAL', 60)
+        self.timeout = app.config.get('DEVICE_PROBE_TIMEOUT', 1.0)
+        self.concurrency = app.config.get('DEVICE_PROBE_CONCURRENCY', 100)
+        self.default_port = app.config.get('DEVICE_PROBE_PORT', 22)
+        self.ports = app.config.get('DEVICE_PROBE_PORTS', {})
+        self._stamp = None
+        self._results = {}
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+        self._stamp = None
+
+    def targets(self, devices):
+        return [
+            ((device['device_id'], endpoint), device[endpoint], self.ports.get(endpoint, self.default_port))
+            for device in devices
+            for endpoint in IP_FIELDS
+            if device.get(endpoint)
+        ]
+
+    def probe_devices(self, devices):
+        """Probe every endpoint of the given device records; {device_id: {endpoint: result}}"""
+        started = time.perf_counter()
+        results = asyncio.run(probe_all(self.targets(devices), self.timeout, self.concurrency))
+        checked_at = datetime.now(timezone.utc).isoformat()
+        health = {}
+        for (device_id, endpoint), result in results.items():
+            health.setdefault(device_id, {})[endpoint] = {**result, 'checked_at': checked_at}
+        return {
+            'checked_at': checked_at,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            'devices': health
+        }
+
+    def run_once(self, app):
+        """One probe cycle over the device table; the scheduler job"""
+        from utils.device_registry import device_registry
+
+        with app.app_context():
+            devices = device_registry.records()
+        report = self.probe_devices(devices)
+        self.write(report)
+        return report
+
+    def write(self, report):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f)
+        os.replace(temp_path, self.path)
+
+    def snapshot(self):
+        """Latest probe report, re-read only when the file changed"""
+        stamp = read_stamp(self.path)
+        if stamp == self._stamp:
+            return self._results
+        with self._lock:
+            if stamp != self._stamp:
+                try:
+                    with open(self.path, encoding='utf-8') as f:
+                        self._results = json.load(f)
+                except (OSError, ValueError):
+                    self._results = {}
+                self._stamp = stamp
+        return self._results
+
+    def for_device(self, device_id):
+        return self.snapshot().get('devices', {}).get(device_id)
+
+
+device_health = DeviceHealth()
@@ -0,0 +1,149 @@
+import csv
+import io
+import json
+import re
+from datetime import datetime
+from sqlalchemy.dialects import postgresql, sqlite
+from models.base import db
+from models.device import Device
+
+IP_FIELDS = ('PC_IP', 'Rutomatrix_ip', 'Pulse1_Ip', 'CT1_ip')
+# Same rule as Device.validate_ip, compiled once for the whole file
+IP_PATTERN = re.compile(r'((25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)')
+# Column names as the listing endpoints spell them, accepted as headers too
+FIELD_ALIASES = {
+    'device_id': 'device_id',
+    'pc_ip': 'PC_IP',
+    'rutomatrix_ip': 'Rutomatrix_ip',
+    'pulse1_ip': 'Pulse1_Ip',
+    'ct1_ip': 'CT1_ip'
+}
+UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+class DeviceImportError(ValueError):
+    """The file could not be imported; errors lists every problem found"""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+def load_records(data, fmt, key, error=DeviceImportError):
+    """Raw dicts from CSV text or a JSON list (or {key: [...]}); error is the exception raised on bad input"""
+    if fmt == 'json':
+        items = json.loads(data) if isinstance(data, (str, bytes)) else data
+        if isinstance(items, dict):
+            items = items.get(key)
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise error(f'JSON must be a list of objects or {{"{key}": [...]}}')
+        return items
+    if fmt == 'csv':
+        if isinstance(data, bytes):
+            data = data.decode('utf-8-sig')
+        return list(csv.DictReader(io.StringIO(data)))
+    raise error(f'Unsupported format: {fmt}')
+
+
+def parse_devices(data, fmt):
+    """Rows from CSV text or a JSON list (or {"devices": [...]}), with header names normalized"""
+    items = load_records(data, fmt, 'devices')
+    rows = []
+    for item in items:
+        row = {}
+        for key, value in item.items():
+            field = FIELD_ALIASES.get(str(key).strip().lower()) if key is not None else None
+            if field:
+                value = str(value).strip() if value is not None else ''
+                row[field] = value or None
+        rows.append(row)
+    return rows
+
+
+def validate_devices(rows):
+    """Check every row and every IP in one pass; returns the list of all errors found"""
+    errors = []
+    seen = {}
+    for number, row in enumerate(rows, start=1):
+        device_id = row.get('device_id')
+        if not device_id:
+            errors.append({'row': number, 'field': 'device_id', 'message': 'Device ID is required'})
+        elif len(device_id) > 50:
+            errors.append({'row': number, 'field': 'device_id', 'message': 'Device ID is longer than 50 characters'})
+        elif device_id in seen:
+            errors.append({'row': number, 'field': 'device_id',
+                           'message': f'Duplicate device ID {device_id} (first seen in row {seen[device_id]})'})
+        else:
+            seen[device_id] = number
+
+        for field in IP_FIELDS:
+            ip = row.get(field)
+            if ip and not IP_PATTERN.fullmatch(ip):
+                errors.append({'row': number, 'field': field, 'message': f'Invalid IP format: {ip}'})
+    return errors
+
+
+def existing_device_ids(device_ids, chunk_size=500):
+    existing = set()
+    device_ids = list(device_ids)
+    for i in range(0, len(device_ids), chunk_size):
+        existing.update(db.session.execute(
+            db.select(Device.device_id).where(Device.device_id.in_(device_ids[i:i + chunk_size]))
+        ).scalars())
+    return existing
+
+
+def import_devices(rows, dry_run=False):
+    """Validate then upsert all rows in one transaction; raises DeviceImportError listing every problem
+
+    A field is written only for rows that include it: an empty value clears
+    the IP, a key left out of the row keeps the device's current value. Rows
+    are upserted in one executemany per distinct set of fields.
+    """
+    if not rows:
+        raise DeviceImportError('No devices to import')
+    errors = validate_devices(rows)
+    if errors:
+        raise DeviceImportError(f'{len({error["row"] for error in errors})} of {len(rows)} rows failed validation', errors)
+
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(field for field in IP_FIELDS if field in row), []).append(row)
+    existing = existing_device_ids(row['device_id'] for row in rows)
+    result = {
+        'inserted': len(rows) - len(existing),
+        'updated': len(existing),
+        'columns': [field for field in IP_FIELDS if any(field in columns for columns in groups)]
+    }
+    if dry_run:
+        return result
+
+    now = datetime.utcnow()
+    insert = UPSERT_INSERTS.get(db.engine.dialect.name)
+    try:
+        for columns, group in groups.items():
+            params = [
+                {'device_id': row['device_id'], **{field: row[field] for field in columns}, 'created_at': now, 'updated_at': now}
+                for row in group
+            ]
+            if insert is not None:
+                stmt = insert(Device.__table__)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['device_id'],
+                    set_={column: stmt.excluded[column] for column in [*columns, 'updated_at']}
+                )
+                # A single statement with a parameter list runs as one executemany
+                db.session.execute(stmt, params)
+            else:
+                for param in params:
+                    device = db.session.get(Device, param['device_id'])
+                    if device is None:
+                        db.session.add(Device(**param))
+                    else:
+                        for field in columns:
+                            setattr(device, field, param[field])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result
@@ -0,0 +1,168 @@
+import ipaddress
+import os
+import threading
+import time
+from models.base import db
+from models.device import Device
+from utils.query_budget import uncounted
+
+
+IP_FIELDS = ('PC_IP', 'Rutomatrix_ip', 'Pulse1_Ip', 'CT1_ip')
+
+
+def device_summary(device):
+    """The lowercase shape the listing endpoints return, without the per-request status"""
+    return {
+        'device_id': device.device_id,
+        'name': device.device_id,
+        'pc_ip': device.PC_IP,
+        'rutomatrix_ip': device.Rutomatrix_ip,
+        'pulse1_ip': device.Pulse1_Ip,
+        'ct1_ip': device.CT1_ip
+    }
+
+
+def normalize_ip(value):
+    """Canonical text form of an IP address, or the stripped text if it doesn't parse
+
+    Octets are read with int() so zero-padded values stored in the device
+    table ('100.120.05.51') match their plain form ('100.120.5.51').
+    """
+    text = str(value).strip()
+    octets = text.split('.')
+    if len(octets) == 4 and all(octet.isdigit() and int(octet) <= 255 for octet in octets):
+        return '.'.join(str(int(octet)) for octet in octets)
+    try:
+        return ipaddress.ip_address(text).compressed
+    except ValueError:
+        return text or None
+
+
+def read_stamp(path):
+    """mtime_ns of a cross-process invalidation stamp file, 0 if it doesn't exist yet"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except (OSError, TypeError):
+        return 0
+
+
+def touch_stamp(path):
+    """Move a stamp file's mtime forward so every process drops its cached copy"""
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(str(time.time_ns()))
+        # Make sure the mtime moves even on filesystems with coarse timestamps
+        now_ns = time.time_ns()
+        os.utime(path, ns=(now_ns, max(now_ns, read_stamp(path) + 1)))
+    except OSError:
+        pass
+
+
+class DeviceSnapshot:
+    """One immutable load of the device table; callers must not modify the dicts"""
+
+    def __init__(self, devices, stamp):
+        self.loaded_at = time.monotonic()
+        self.stamp = stamp
+        self.records = tuple(device.to_dict() for device in devices)
+        self.summaries = tuple(device_summary(device) for device in devices)
+        self.by_id = {record['device_id']: record for record in self.records}
+        # IP -> every (device_id, column) using it across the four endpoint columns
+        self.by_ip = {}
+        for record in self.records:
+            for endpoint in IP_FIELDS:
+                ip = normalize_ip(record[endpoint]) if record[endpoint] else None
+                if ip:
+                    self.by_ip.setdefault(ip, []).append((record['device_id'], endpoint))
+
+
+class DeviceRegistry:
+    """Per-process cache of the device table as pre-serialized dicts
+
+    The table only changes when an admin edits it, so listings read the
+    cached snapshot instead of querying. invalidate() drops it and touches a
+    stamp file in the instance folder; every process compares the stamp's
+    mtime (one stat call) before using its snapshot, so edits made in one
+    worker are seen by all. DEVICE_CACHE_TTL bounds staleness for changes
+    made outside the app.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.stamp_path = None
+        self.loads = 0
+        self.hits = 0
+        self._snapshot = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('DEVICE_CACHE_TTL', self.ttl)
+        self.stamp_path = os.path.join(app.instance_path, 'device_registry.stamp')
+        self._snapshot = None
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def snapshot(self):
+        stamp = read_stamp(self.stamp_path)
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.stamp == stamp and time.monotonic() - snapshot.loaded_at < self.ttl:
+            self.hits += 1
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.stamp == stamp and time.monotonic() - snapshot.loaded_at < self.ttl:
+                return snapshot
+            generation = self._generation
+            with uncounted():
+                devices = db.session.execute(db.select(Device).order_by(Device.device_id)).scalars().all()
+            snapshot = DeviceSnapshot(devices, stamp)
+            self.loads += 1
+            # An invalidate() during the load means these rows may be stale; serve them once, don't keep them
+            if generation == self._generation:
+                self._snapshot = snapshot
+            return snapshot
+
+    def records(self):
+        """Every device as Device.to_dict() output, ordered by device_id"""
+        return self.snapshot().records
+
+    def summaries(self):
+        return self.snapshot().summaries
+
+    def get(self, device_id):
+        return self.snapshot().by_id.get(device_id)
+
+    def find_ip(self, address):
+        """Every (device record, endpoint column) using the address; empty if none"""
+        ip = normalize_ip(address)
+        if ip is None:
+            return []
+        snapshot = self.snapshot()
+        return [(snapshot.by_id[device_id], endpoint) for device_id, endpoint in snapshot.by_ip.get(ip, ())]
+
+    def invalidate(self):
+        """Call after committing any change to the devices table"""
+        self._generation += 1
+        self._snapshot = None
+        touch_stamp(self.stamp_path)
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            'devices': len(snapshot.records) if snapshot else None,
+            'ips': len(snapshot.by_ip) if snapshot else None,
+            'age_seconds': round(time.monotonic() - snapshot.loaded_at, 1) if snapshot else None,
+            'loads': self.loads,
+            'hits': self.hits,
+            'ttl_seconds': self.ttl
+        }
+
+
+device_registry = DeviceRegistry()
@@ -0,0 +1,167 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from flask import has_request_context, request
+
+# LogRecord attributes that are not user-supplied `extra` fields
+RESERVED_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record; extra fields passed to the logger are included"""
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'thread': record.threadName,
+            'process': record.process
+        }
+        request_info = getattr(record, 'request', None)
+        if request_info:
+            entry['request'] = request_info
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        request_info = getattr(record, 'request', None)
+        if request_info:
+            line = f"{line} [{request_info['method']} {request_info['path']}]"
+        return line
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the writer thread; drops (and counts) them when the queue is full
+
+    prepare() runs on the logging thread, so it only does what can't wait:
+    resolving %-args (they may reference objects that change later),
+    rendering the traceback and capturing request details. JSON encoding and
+    I/O happen on the listener thread.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if has_request_context():
+            record.request = {
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'remote_addr': request.remote_addr
+            }
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_levels(value):
+    """'routes.reservation_routes=DEBUG,sqlalchemy.engine=WARNING' -> {logger: level}"""
+    levels = {}
+    for item in (value or '').split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+class LogPipeline:
+    """Queue-based logging: request threads enqueue, one background thread formats and writes"""
+
+    def __init__(self):
+        self.handler = None
+        self.listener = None
+        self.targets = []
+
+    def init_app(self, app):
+        if not app.config.get('LOG_PIPELINE_ENABLED', True):
+            return
+        self.stop()
+
+        formatter = JSONFormatter() if app.config.get('LOG_FORMAT', 'json') == 'json' else TextFormatter()
+        stream = logging.StreamHandler(sys.stderr)
+        stream.setFormatter(formatter)
+        self.targets = [stream]
+        if app.config.get('LOG_FILE'):
+            file_handler = RotatingFileHandler(app.config['LOG_FILE'], maxBytes=app.config.get('LOG_FILE_BYTES', 10 * 1024 * 1024),
+                                               backupCount=app.config.get('LOG_FILE_BACKUPS', 5), delay=True)
+            file_handler.setFormatter(formatter)
+            self.targets.append(file_handler)
+
+        self.queue_size = app.config.get('LOG_QUEUE_SIZE', 10000)
+        self.handler = NonBlockingQueueHandler(queue.Queue(maxsize=self.queue_size))
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, NonBlockingQueueHandler):
+                root.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+
+        # Records from app.logger go through the root handler instead of Flask's own
+        from flask.logging import default_handler
+        app.logger.removeHandler(default_handler)
+        app.logger.setLevel(logging.NOTSET)
+
+        for name, level in app.config.get('LOG_LEVELS', {}).items():
+            logging.getLogger(name).setLevel(level)
+
+        self._start_listener()
+        atexit.register(self.stop)
+
+    def _start_listener(self):
+        self.listener = QueueListener(self.handler.queue, *self.targets, respect_handler_level=True)
+        self.listener.start()
+
+    def after_fork(self):
+        """Fresh queue and writer thread; the parent's may have been mid-operation at fork"""
+        if self.handler is None:
+            return
+        self.handler.queue = queue.Queue(maxsize=self.queue_size)
+        self._start_listener()
+
+    def stop(self):
+        """Flush everything queued so far; called at exit"""
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.stop()
+
+    def stats(self):
+        return {
+            'enabled': self.handler is not None,
+            'queued': self.handler.queue.qsize() if self.handler else 0,
+            'dropped': self.handler.dropped if self.handler else 0
+        }
+
+
+log_pipeline = LogPipeline()
@@ -0,0 +1,144 @@
+import itertools
+import os
+import re
+import tracemalloc
+from datetime import datetime, timezone
+
+# <UTC time>-<pid>-<sequence in that process>
+SNAPSHOT_ID = re.compile(r'^[0-9]{8}T[0-9]{6}-[0-9]+-[0-9]+$')
+# Allocations made by tracemalloc itself and the import machinery are noise here
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>')
+)
+
+
+def snapshot_order(snapshot):
+    taken_at, _, sequence = snapshot['id'].split('-')
+    return taken_at, int(sequence)
+
+
+def stat_dict(stat):
+    entry = {
+        'location': str(stat.traceback[0]) if stat.traceback else None,
+        'traceback': [str(frame) for frame in stat.traceback],
+        'size_kb': round(stat.size / 1024, 1),
+        'count': stat.count
+    }
+    if isinstance(stat, tracemalloc.StatisticDiff):
+        entry['size_diff_kb'] = round(stat.size_diff / 1024, 1)
+        entry['count_diff'] = stat.count_diff
+    return entry
+
+
+def load_snapshot(path):
+    return tracemalloc.Snapshot.load(path).filter_traces(SNAPSHOT_FILTERS)
+
+
+def top_stats(snapshot, limit=20, key_type='lineno'):
+    return [stat_dict(stat) for stat in snapshot.statistics(key_type)[:limit]]
+
+
+def diff_stats(old, new, limit=20, key_type='lineno'):
+    """Largest allocation growth from old to new"""
+    return [stat_dict(stat) for stat in new.compare_to(old, key_type)[:limit]]
+
+
+class MemorySnapshots:
+    """tracemalloc control and snapshot files for chasing memory growth in a running worker
+
+    Snapshots are per process; with several workers each call lands on
+    whichever worker serves it, so compare snapshots with the same pid.
+    Only the newest MEMORY_SNAPSHOT_KEEP files are kept.
+    """
+
+    def __init__(self):
+        self.directory = None
+        self.frames = 10
+        self.keep = 20
+        self._sequence = itertools.count(1)
+
+    def init_app(self, app):
+        self.directory = app.config.get('MEMORY_SNAPSHOT_DIR') or os.path.join(app.instance_path, 'profiles', 'memory')
+        self.frames = app.config.get('TRACEMALLOC_FRAMES', self.frames)
+        self.keep = app.config.get('MEMORY_SNAPSHOT_KEEP', self.keep)
+        if app.config.get('TRACEMALLOC_ON_START') and not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        return self.status()
+
+    def stop(self):
+        tracemalloc.stop()
+        return self.status()
+
+    def status(self):
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            'tracing': tracemalloc.is_tracing(),
+            'frames': tracemalloc.get_traceback_limit(),
+            'traced_kb': round(current / 1024, 1),
+            'peak_kb': round(peak / 1024, 1),
+            'pid': os.getpid()
+        }
+
+    def take(self, limit=20):
+        """Dump a snapshot to disk and return its id with the top allocation sites"""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError('tracemalloc is not tracing; start it first')
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot_id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{next(self._sequence)}"
+        snapshot = tracemalloc.take_snapshot()
+        snapshot.dump(self.path(snapshot_id))
+        self._prune()
+        return {
+            'id': snapshot_id,
+            **self.status(),
+            'top': top_stats(snapshot.filter_traces(SNAPSHOT_FILTERS), limit)
+        }
+
+    def _prune(self):
+        for old in self.list()[self.keep:]:
+            try:
+                os.remove(self.path(old['id']))
+            except OSError:
+                pass
+
+    def path(self, snapshot_id):
+        if not SNAPSHOT_ID.match(snapshot_id or ''):
+            raise ValueError(f'Invalid snapshot id: {snapshot_id}')
+        return os.path.join(self.directory, f'{snapshot_id}.tracemalloc')
+
+    def exists(self, snapshot_id):
+        try:
+            return os.path.exists(self.path(snapshot_id))
+        except ValueError:
+            return False
+
+    def list(self):
+        """Saved snapshots, newest first"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        snapshots = []
+        for name in os.listdir(self.directory):
+            snapshot_id, extension = os.path.splitext(name)
+            if extension == '.tracemalloc' and SNAPSHOT_ID.match(snapshot_id):
+                snapshots.append({
+                    'id': snapshot_id,
+                    'pid': int(snapshot_id.split('-')[1]),
+                    'size': os.path.getsize(os.path.join(self.directory, name))
+                })
+        return sorted(snapshots, key=snapshot_order, reverse=True)
+
+    def top(self, snapshot_id, limit=20, key_type='lineno'):
+        return top_stats(load_snapshot(self.path(snapshot_id)), limit, key_type)
+
+    def diff(self, old_id, new_id, limit=20, key_type='lineno'):
+        return diff_stats(load_snapshot(self.path(old_id)), load_snapshot(self.path(new_id)), limit, key_type)
+
+
+memory_snapshots = MemorySnapshots()
@@ -0,0 +1,238 @@
+import bisect
+import threading
+import time
+import weakref
+from flask import Response, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 1024, 8192, 65536, 524288, 4194304)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = []
+    for key, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{key}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+class _Shard:
+    """Counters owned and written by a single thread, so updates need no lock"""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.in_flight = {}
+        # Per-request SQL accumulators for the request this thread is serving
+        self.sql_queries = 0
+        self.sql_seconds = 0.0
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, buckets, value):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            # One slot per bucket, one for +Inf, then the running sum
+            histogram = self.histograms[key] = [0] * (len(buckets) + 2)
+        histogram[bisect.bisect_left(buckets, value)] += 1
+        histogram[-1] += value
+
+    def merge(self, other):
+        """Add another shard's counts into this one"""
+        for key, value in other.counters.copy().items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, value in other.histograms.copy().items():
+            merged = self.histograms.setdefault(key, [0] * len(value))
+            for i, slot in enumerate(list(value)):
+                merged[i] += slot
+        for endpoint, value in other.in_flight.copy().items():
+            self.in_flight[endpoint] = self.in_flight.get(endpoint, 0) + value
+
+
+class Metrics:
+    """Per-endpoint request and SQL metrics exposed in Prometheus text format
+
+    Each thread writes to its own shard; a scrape sums the shards. The only
+    lock is taken once per thread, when its shard is registered, and by
+    scrapes. Shards of threads that have finished (gthread workers, pool
+    and scheduler threads come and go) are folded into a base shard then,
+    so the shard list only ever holds live threads.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._base = _Shard()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        self._buckets = {
+            'ruto_http_request_duration_seconds': LATENCY_BUCKETS,
+            'ruto_http_response_size_bytes': SIZE_BUCKETS,
+            'ruto_sql_queries_per_request': QUERY_BUCKETS
+        }
+
+    def shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._shards_lock:
+                self._fold_finished_shards()
+                self._shards.append((weakref.ref(threading.current_thread()), shard))
+        return shard
+
+    def _fold_finished_shards(self):
+        # Called with _shards_lock held; a finished thread no longer writes to its shard
+        live = []
+        for thread_ref, shard in self._shards:
+            thread = thread_ref()
+            if thread is not None and thread.is_alive():
+                live.append((thread_ref, shard))
+            else:
+                self._base.merge(shard)
+        self._shards = live
+
+    def init_app(self, app):
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        # Engine events are global; a second create_app() must not count every query twice
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+        token = app.config.get('METRICS_TOKEN')
+
+        @app.route('/metrics', methods=['GET'])
+        def metrics_endpoint():
+            if token and request.headers.get('Authorization') != f'Bearer {token}':
+                return Response('Unauthorized\n', status=401, mimetype='text/plain')
+            return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def reset_after_fork(self):
+        self._local = threading.local()
+        self._base = _Shard()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+
+    # Request hooks
+
+    def _before_request(self):
+        shard = self.shard()
+        endpoint = request.endpoint or 'unmatched'
+        shard.in_flight[endpoint] = shard.in_flight.get(endpoint, 0) + 1
+        shard.sql_queries = 0
+        shard.sql_seconds = 0.0
+        g.metrics_endpoint = endpoint
+        g.metrics_started = time.perf_counter()
+
+    def _after_request(self, response):
+        g.metrics_status = response.status_code
+        if not response.is_streamed:
+            g.metrics_size = response.calculate_content_length()
+        return response
+
+    def _teardown_request(self, exception=None):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        endpoint = g.pop('metrics_endpoint')
+        status = g.pop('metrics_status', 500 if exception else 200)
+        size = g.pop('metrics_size', None)
+
+        shard = self.shard()
+        shard.in_flight[endpoint] -= 1
+        shard.inc('ruto_http_requests_total', (('endpoint', endpoint), ('method', request.method), ('status', str(status))))
+        endpoint_label = (('endpoint', endpoint),)
+        shard.observe('ruto_http_request_duration_seconds', endpoint_label, LATENCY_BUCKETS, elapsed)
+        if size is not None:
+            shard.observe('ruto_http_response_size_bytes', endpoint_label, SIZE_BUCKETS, size)
+        shard.observe('ruto_sql_queries_per_request', endpoint_label, QUERY_BUCKETS, shard.sql_queries)
+        shard.inc('ruto_sql_queries_total', endpoint_label, shard.sql_queries)
+        shard.inc('ruto_sql_duration_seconds_total', endpoint_label, shard.sql_seconds)
+
+    # SQLAlchemy engine hooks
+
+    # The start time rides on the statement's execution context, so a statement
+    # that raises leaves nothing behind on the pooled connection
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.metrics_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, 'metrics_started', None)
+        if started is None:
+            return
+        shard = self.shard()
+        shard.sql_queries += 1
+        shard.sql_seconds += time.perf_counter() - started
+
+    # Exposition
+
+    def snapshot(self):
+        total = _Shard()
+        with self._shards_lock:
+            self._fold_finished_shards()
+            total.merge(self._base)
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            # dict.copy() is atomic under the GIL, so owner threads can keep writing
+            total.merge(shard)
+        return total.counters, total.histograms, total.in_flight
+
+    def render(self):
+        counters, histograms, in_flight = self.snapshot()
+        lines = []
+
+        help_text = {
+            'ruto_http_requests_total': ('counter', 'Requests by endpoint, method and status code'),
+            'ruto_sql_queries_total': ('counter', 'SQL statements executed while serving each endpoint'),
+            'ruto_sql_duration_seconds_total': ('counter', 'Time spent in SQL statements per endpoint'),
+            'ruto_http_request_duration_seconds': ('histogram', 'Request latency per endpoint'),
+            'ruto_http_response_size_bytes': ('histogram', 'Response body size per endpoint'),
+            'ruto_sql_queries_per_request': ('histogram', 'SQL statements per request per endpoint')
+        }
+
+        for name in ('ruto_http_requests_total', 'ruto_sql_queries_total', 'ruto_sql_duration_seconds_total'):
+            metric_type, description = help_text[name]
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+
+        for name, buckets in self._buckets.items():
+            metric_type, description = help_text[name]
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for (metric, labels), values in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], values[:-1]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{format_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {values[-1]}')
+                lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+
+        lines.append('# HELP ruto_http_requests_in_flight Requests currently being served per endpoint')
+        lines.append('# TYPE ruto_http_requests_in_flight gauge')
+        for endpoint, value in sorted(in_flight.items()):
+            lines.append(f'ruto_http_requests_in_flight{format_labels([("endpoint", endpoint)])} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
@@ -0,0 +1,211 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+DEFAULT_HASH_METHOD = 'scrypt:32768:8:1'
+# Passwords per bulk job; small enough that a login queued behind one waits a few hashes at most
+BULK_CHUNK_SIZE = 4
+
+
+def normalize_method(method):
+    """Method string with werkzeug's defaults filled in, as it is written into stored hashes
+
+    'scrypt' is stored as 'scrypt:32768:8:1' and 'pbkdf2' as
+    'pbkdf2:sha256:<DEFAULT_PBKDF2_ITERATIONS>'.
+    """
+    name, *params = method.split(':')
+    if name == 'scrypt':
+        n, r, p = (params + ['32768', '8', '1'][len(params):])[:3]
+        return f'scrypt:{int(n)}:{int(r)}:{int(p)}'
+    if name == 'pbkdf2':
+        hash_name, iterations = (params + ['sha256', str(DEFAULT_PBKDF2_ITERATIONS)][len(params):])[:2]
+        return f'pbkdf2:{hash_name}:{int(iterations)}'
+    return method
+
+
+def hash_passwords(passwords, method):
+    """One bulk job, run in a pool process"""
+    return [generate_password_hash(password, method) for password in passwords]
+
+
+class HashQueueFull(Exception):
+    """Raised when too many hash jobs are already queued; callers should fail fast"""
+
+
+class PasswordHasher:
+    """Runs CPU-bound password hashing in a bounded process pool
+
+    With workers=0 hashing runs inline on the calling thread, which is what
+    tests and single-process development servers use.
+    """
+
+    def __init__(self, method=DEFAULT_HASH_METHOD, workers=0, max_queue=0, timeout=10, bulk_workers=None):
+        self.method = method
+        self.workers = workers
+        self.max_queue = max_queue
+        self.bulk_workers = bulk_workers or max(workers // 2, 1)
+        self.timeout = timeout
+        self.rejected = 0
+        self.in_flight = 0
+        self._slots = None
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.shutdown()
+        self.method = app.config.get('PASSWORD_HASH_METHOD', DEFAULT_HASH_METHOD)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 0)
+        self.max_queue = app.config.get('PASSWORD_HASH_QUEUE', self.workers * 4)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', 10)
+        self.bulk_workers = app.config.get('PASSWORD_HASH_BULK_WORKERS') or max(self.workers // 2, 1)
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue) if self.workers else None
+
+    def _get_pool(self):
+        # Created lazily so every forked server worker builds its own pool
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._pool
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+
+        try:
+            return self._submit_and_wait(func, *args)
+        except BrokenProcessPool:
+            # A worker died (OOM kill, crash); the broken pool was dropped, so retry once on a fresh one
+            try:
+                return self._submit_and_wait(func, *args)
+            except BrokenProcessPool:
+                raise HashQueueFull('Password hashing pool is unavailable')
+
+    def _submit(self, func, *args, wait=0):
+        """Take a slot and start func in the pool; the slot is freed when the job ends
+
+        wait=0 fails at once with HashQueueFull when every slot is taken;
+        otherwise it waits up to that many seconds for one.
+        """
+        slots = self._slots
+        if not slots.acquire(blocking=bool(wait), timeout=wait or None):
+            with self._lock:
+                self.rejected += 1
+            raise HashQueueFull('Password hashing queue is full')
+        with self._lock:
+            self.in_flight += 1
+
+        pool = self._get_pool()
+        try:
+            future = pool.submit(func, *args)
+        except BrokenProcessPool:
+            self._finished(slots)
+            self._discard_pool(pool)
+            raise
+        except BaseException:
+            self._finished(slots)
+            raise
+        # The slot is held until the job really ends, even if this caller stops waiting for it
+        future.add_done_callback(lambda _: self._finished(slots))
+        return pool, future
+
+    def _wait(self, pool, future):
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise HashQueueFull('Password hashing timed out')
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            raise
+
+    def _submit_and_wait(self, func, *args):
+        return self._wait(*self._submit(func, *args))
+
+    def _finished(self, slots):
+        with self._lock:
+            self.in_flight -= 1
+        slots.release()
+
+    def _discard_pool(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def hash_many(self, passwords):
+        """Hash a batch in the pool, results in input order
+
+        Runs inline with workers=0. The batch goes through the same slots as
+        logins, in jobs of BULK_CHUNK_SIZE passwords with at most bulk_workers
+        jobs submitted at once, so the other workers stay free for logins and
+        a login never queues behind more than a few bulk hashes.
+        """
+        passwords = list(passwords)
+        if not self.workers or len(passwords) < 2:
+            return [generate_password_hash(password, self.method) for password in passwords]
+
+        chunks = [passwords[i:i + BULK_CHUNK_SIZE] for i in range(0, len(passwords), BULK_CHUNK_SIZE)]
+        hashes = []
+        pending = deque()
+        try:
+            for chunk in chunks:
+                if len(pending) >= self.bulk_workers:
+                    hashes.extend(self._wait(*pending.popleft()))
+                pending.append(self._submit(hash_passwords, chunk, self.method, wait=self.timeout))
+            while pending:
+                hashes.extend(self._wait(*pending.popleft()))
+        except BrokenProcessPool:
+            raise HashQueueFull('Password hashing pool is unavailable')
+        finally:
+            for _, future in pending:
+                future.cancel()
+        return hashes
+
+    def needs_rehash(self, password_hash):
+        """True when a stored hash was made with a different method or cost"""
+        return normalize_method(password_hash.split('$', 1)[0]) != normalize_method(self.method)
+
+    def stats(self):
+        return {
+            'method': self.method,
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'bulk_workers': self.bulk_workers,
+            'in_flight': self.in_flight,
+            'rejected': self.rejected
+        }
+
+    def after_fork(self):
+        """Forget the parent's pool and locks; the child builds its own on first use"""
+        self._pool = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        if self.workers:
+            self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+password_hasher = PasswordHasher()
+
+
+def default_hash_workers():
+    return max((os.cpu_count() or 2) // 2, 1)
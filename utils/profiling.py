@@ -0,0 +1,308 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from flask import g, request
+from flask_login import current_user
+
+PROFILE_MODES = ('cprofile', 'sample')
+PROFILE_ID = re.compile(r'^[0-9]{8}T[0-9]{6}-[0-9a-f]{6}$')
+THREAD_COUNTER = re.compile(r'[-_]?[0-9]+')
+WINDOW_FILE = re.compile(r'^stacks-[0-9]{8}T[0-9]{6}-[0-9]+\.collapsed$')
+
+
+def collapse_stack(frame):
+    """Frame chain as 'file:function;...' root first, the collapsed-stack flamegraph format"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def write_collapsed(stacks, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, count in stacks.most_common():
+            f.write(f'{stack} {count}\n')
+
+
+class StackSampler:
+    """Thread that samples the stacks of the given threads (or all others) every interval seconds"""
+
+    def __init__(self, interval=0.001, thread_ids=None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                self.stacks[collapse_stack(frame)] += 1
+            self.samples += 1
+
+
+class RequestProfiler:
+    """Profiles single requests on demand for admins
+
+    Send 'X-Profile: cprofile' (or 'sample') or add '_profile=cprofile' to the
+    query string. cprofile saves a pstats file; sample saves collapsed stacks
+    for flamegraph tools. Profiles go to PROFILE_DIR with a JSON sidecar.
+    """
+
+    def __init__(self):
+        self.directory = None
+
+    def init_app(self, app):
+        if not app.config.get('PROFILING_ENABLED', True):
+            return
+
+        self.directory = app.config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+        self.keep = app.config.get('PROFILE_KEEP', 200)
+        self.interval = app.config.get('PROFILE_SAMPLE_INTERVAL', 0.001)
+        os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _requested_mode(self):
+        mode = request.headers.get('X-Profile') or request.args.get('_profile')
+        if not mode:
+            return None
+        mode = mode.lower()
+        if mode in ('1', 'true'):
+            mode = 'cprofile'
+        if mode not in PROFILE_MODES:
+            return None
+        # Only admins may profile; anyone else gets the normal response
+        if not current_user.is_authenticated or current_user.role != 'admin':
+            return None
+        return mode
+
+    def _before_request(self):
+        mode = self._requested_mode()
+        if mode is None:
+            return
+        g.profile_mode = mode
+        g.profile_started = time.perf_counter()
+        if mode == 'cprofile':
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+        else:
+            g.profiler = StackSampler(self.interval, {threading.get_ident()}).start()
+
+    def _after_request(self, response):
+        mode = g.pop('profile_mode', None)
+        if mode is None:
+            return response
+
+        profiler = g.pop('profiler')
+        if mode == 'cprofile':
+            profiler.disable()
+        else:
+            profiler.stop()
+        duration_ms = round((time.perf_counter() - g.pop('profile_started')) * 1000, 2)
+
+        profile_id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{os.urandom(3).hex()}"
+        filename = f"{profile_id}.{'prof' if mode == 'cprofile' else 'collapsed'}"
+        if mode == 'cprofile':
+            profiler.dump_stats(os.path.join(self.directory, filename))
+        else:
+            write_collapsed(profiler.stacks, os.path.join(self.directory, filename))
+
+        with open(os.path.join(self.directory, f'{profile_id}.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'id': profile_id,
+                'file': filename,
+                'mode': mode,
+                'endpoint': request.endpoint,
+                'method': request.method,
+                'path': request.full_path.rstrip('?'),
+                'status': response.status_code,
+                'duration_ms': duration_ms,
+                'user': current_user.user_name,
+                'created_at': datetime.now(timezone.utc).isoformat()
+            }, f)
+        self._prune()
+
+        response.headers['X-Profile-Id'] = profile_id
+        return response
+
+    def _prune(self):
+        profiles = self.list()
+        for profile in profiles[self.keep:]:
+            self.delete(profile['id'])
+
+    def list(self):
+        """Saved profiles, newest first"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(profiles, key=lambda profile: profile['id'], reverse=True)
+
+    def get(self, profile_id):
+        if not PROFILE_ID.match(profile_id or ''):
+            return None
+        try:
+            with open(os.path.join(self.directory, f'{profile_id}.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def delete(self, profile_id):
+        profile = self.get(profile_id)
+        if profile is None:
+            return
+        for name in (profile['file'], f'{profile_id}.json'):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def summary(self, profile, limit=50, sort='cumulative'):
+        """Text report of a cprofile profile, the top entries by the given sort key"""
+        output = io.StringIO()
+        stats = pstats.Stats(os.path.join(self.directory, profile['file']), stream=output)
+        stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+
+class BackgroundSampler:
+    """Optional always-on sampler of every thread's stack, APScheduler jobs included
+
+    Samples are aggregated per SAMPLER_WINDOW seconds into collapsed-stack
+    files (root frame is the thread name) and the newest SAMPLER_KEEP files
+    are kept. Workers start their own thread on the first request, and
+    start_scheduler() starts one next to APScheduler, so jobs running in a
+    preloading master are sampled too. File names carry the pid.
+    """
+
+    def __init__(self):
+        self.directory = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        if not app.config.get('SAMPLER_ENABLED', False):
+            return
+
+        self.directory = app.config.get('SAMPLER_DIR') or os.path.join(app.instance_path, 'profiles', 'continuous')
+        self.interval = app.config.get('SAMPLER_INTERVAL', 0.02)
+        self.window = app.config.get('SAMPLER_WINDOW', 60)
+        self.keep = app.config.get('SAMPLER_KEEP', 60)
+        os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self.start)
+
+    def after_fork(self):
+        # The parent's sampler thread does not survive fork
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start sampling in this process unless disabled or already running"""
+        if self.directory is None:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='background-sampler', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        stacks = Counter()
+        names = {}
+        window_started = names_refreshed = time.monotonic()
+        while True:
+            time.sleep(self.interval)
+            now = time.monotonic()
+            if now - names_refreshed >= 1 or not names:
+                # Drop counters from names like 'ThreadPoolExecutor-0_3' so windows aggregate per pool
+                names = {thread.ident: THREAD_COUNTER.sub('', thread.name) for thread in threading.enumerate()}
+                names_refreshed = now
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    stacks[f"{names.get(thread_id, f'thread-{thread_id}')};{collapse_stack(frame)}"] += 1
+            if now - window_started >= self.window:
+                self._write_window(stacks)
+                stacks = Counter()
+                window_started = now
+
+    def _write_window(self, stacks):
+        name = f"stacks-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{os.getpid()}.collapsed"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            write_collapsed(stacks, os.path.join(self.directory, name))
+        except OSError:
+            # Losing one window is better than stopping the sampler
+            return
+        for old in self.windows()[self.keep:]:
+            try:
+                os.remove(os.path.join(self.directory, old['file']))
+            except OSError:
+                pass
+
+    def windows(self):
+        """Collapsed-stack window files, newest first"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        files = []
+        for name in os.listdir(self.directory):
+            if WINDOW_FILE.match(name):
+                path = os.path.join(self.directory, name)
+                files.append({'file': name, 'size': os.path.getsize(path)})
+        return sorted(files, key=lambda window: window['file'], reverse=True)
+
+    def merged(self, count):
+        """Sum of the newest count windows, as collapsed-stack text"""
+        stacks = Counter()
+        for window in self.windows()[:count]:
+            with open(os.path.join(self.directory, window['file']), encoding='utf-8') as f:
+                for line in f:
+                    stack, _, samples = line.rstrip('\n').rpartition(' ')
+                    if samples.isdigit():
+                        stacks[stack] += int(samples)
+        return ''.join(f'{stack} {samples}\n' for stack, samples in stacks.most_common())
+
+    def status(self):
+        return {
+            'enabled': self.directory is not None,
+            'running': self._thread is not None and self._thread.is_alive(),
+            'interval_s': getattr(self, 'interval', None),
+            'window_s': getattr(self, 'window', None),
+            'windows': self.windows()
+        }
+
+
+request_profiler = RequestProfiler()
+background_sampler = BackgroundSampler()
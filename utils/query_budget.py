@@ -0,0 +1,133 @@
+import os
+import traceback
+from collections import defaultdict
+from contextlib import contextmanager
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in 'raise' mode when a request breaks its SQL budget or issues N+1 queries"""
+
+
+def query_budget(max_queries):
+    """Declare how many SQL statements a view may issue per request
+
+    Place it directly under @blueprint.route so the registered view carries it.
+    Loads made by the shared caches (the login user, device registry and
+    access index) run inside uncounted(), so a budget holds whether those
+    caches are cold or warm.
+    """
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+@contextmanager
+def uncounted():
+    """Leave the statements issued inside out of the current request's count"""
+    if not has_request_context():
+        yield
+        return
+    previous = g.get('sql_uncounted', False)
+    g.sql_uncounted = True
+    try:
+        yield
+    finally:
+        g.sql_uncounted = previous
+
+
+def _call_site():
+    """First frame in this project's code outside this module, as file:line in function"""
+    for frame in reversed(traceback.extract_stack()[:-3]):
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(PROJECT_ROOT) and filename != os.path.abspath(__file__) \
+                and 'site-packages' not in filename:
+            return f'{os.path.relpath(filename, PROJECT_ROOT)}:{frame.lineno} in {frame.name}'
+    return 'unknown'
+
+
+class QueryInspector:
+    """Development/test mode that counts statements per request and flags N+1 patterns
+
+    SQL_BUDGET_MODE: 'off', 'warn' (log and add headers) or 'raise' (fail the request)
+    SQL_QUERY_BUDGET: budget for views without @query_budget (None means unlimited)
+    SQL_N_PLUS_ONE_THRESHOLD: repeats of one statement that count as N+1
+    """
+
+    def init_app(self, app):
+        self.mode = app.config.get('SQL_BUDGET_MODE', 'off')
+        if self.mode == 'off':
+            return
+
+        self.default_budget = app.config.get('SQL_QUERY_BUDGET')
+        self.threshold = app.config.get('SQL_N_PLUS_ONE_THRESHOLD', 3)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        if not event.contains(Engine, 'before_cursor_execute', self._record):
+            event.listen(Engine, 'before_cursor_execute', self._record)
+
+    def _before_request(self):
+        g.sql_statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if not has_request_context() or g.get('sql_uncounted'):
+            return
+        statements = g.get('sql_statements')
+        if statements is not None:
+            statements.append((statement, repr(parameters), _call_site()))
+
+    def analyze(self, statements):
+        """Group statements by SQL text and return the repeated ones"""
+        groups = defaultdict(list)
+        for statement, parameters, call_site in statements:
+            groups[statement].append((parameters, call_site))
+
+        findings = []
+        for statement, executions in groups.items():
+            if len(executions) < self.threshold:
+                continue
+            distinct_params = {parameters for parameters, _ in executions}
+            findings.append({
+                'kind': 'n_plus_one' if len(distinct_params) > 1 else 'duplicate',
+                'count': len(executions),
+                'statement': ' '.join(statement.split())[:300],
+                'call_sites': sorted({call_site for _, call_site in executions})
+            })
+        return sorted(findings, key=lambda finding: finding['count'], reverse=True)
+
+    def _after_request(self, response):
+        statements = g.pop('sql_statements', None)
+        if statements is None:
+            return response
+
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', self.default_budget)
+        findings = self.analyze(statements)
+        over_budget = budget is not None and len(statements) > budget
+
+        response.headers['X-SQL-Query-Count'] = str(len(statements))
+        if budget is not None:
+            response.headers['X-SQL-Query-Budget'] = str(budget)
+        if not findings and not over_budget:
+            return response
+
+        lines = [f"{request.method} {request.path} ({request.endpoint}) issued {len(statements)} SQL statements"
+                 + (f", budget is {budget}" if budget is not None else '')]
+        for finding in findings:
+            lines.append(f"  {finding['kind']}: {finding['count']}x {finding['statement']}")
+            for call_site in finding['call_sites']:
+                lines.append(f"    at {call_site}")
+        report = '\n'.join(lines)
+
+        if self.mode == 'raise':
+            raise QueryBudgetExceeded(report)
+        current_app.logger.warning(report)
+        return response
+
+
+query_inspector = QueryInspector()
@@ -0,0 +1,211 @@
+import glob
+import heapq
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+EXPLAINABLE = ('select', 'with', 'update', 'delete')
+
+
+class SlowQueryLog:
+    """Logs statements slower than SLOW_QUERY_MS as JSON lines, with their query plan
+
+    Timing happens on the request thread; the plan is captured and the entry
+    written by a background thread, so a slow request is not made slower.
+    Each process writes its own file (slow_queries.<pid>.log next to
+    SLOW_QUERY_LOG) so gunicorn workers never rotate each other's logs;
+    tail() reads them all, and files left by processes that have exited are
+    removed when a process starts. Bound parameters can hold password hashes
+    and tokens, so only their count is logged unless SLOW_QUERY_LOG_PARAMS
+    is set.
+    """
+
+    def __init__(self):
+        self.threshold = None
+        self.path = None
+        self.base_path = None
+        self.dropped = 0
+        self._logger = logging.getLogger('ruto.slow_queries')
+        self._queue = queue.Queue(maxsize=1000)
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def init_app(self, app):
+        threshold_ms = app.config.get('SLOW_QUERY_MS', 0)
+        if threshold_ms <= 0:
+            return
+
+        self.threshold = threshold_ms / 1000.0
+        self.explain = app.config.get('SLOW_QUERY_EXPLAIN', True)
+        self.base_path = app.config.get('SLOW_QUERY_LOG') or os.path.join(app.instance_path, 'logs', 'slow_queries.log')
+        self.max_bytes = app.config.get('SLOW_QUERY_LOG_BYTES', 5 * 1024 * 1024)
+        self.backups = app.config.get('SLOW_QUERY_LOG_BACKUPS', 3)
+        self.log_parameters = app.config.get('SLOW_QUERY_LOG_PARAMS', False)
+        os.makedirs(os.path.dirname(self.base_path), exist_ok=True)
+        self._open_handler()
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _open_handler(self):
+        root, ext = os.path.splitext(self.base_path)
+        self.path = f'{root}.{os.getpid()}{ext}'
+        # delay=True: the file is only created once this process logs something
+        handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes, backupCount=self.backups, delay=True)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        for old_handler in self._logger.handlers:
+            old_handler.close()
+        self._logger.handlers = [handler]
+        self._remove_dead_files()
+
+    def _remove_dead_files(self):
+        """Delete the logs (and rotated backups) of processes that no longer run"""
+        root, ext = os.path.splitext(self.base_path)
+        pattern = re.compile(re.escape(os.path.basename(root)) + r'\.([0-9]+)' + re.escape(ext) + r'(\.[0-9]+)?$')
+        for path in glob.glob(f'{glob.escape(root)}.*'):
+            match = pattern.match(os.path.basename(path))
+            if match is None or process_alive(int(match.group(1))):
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def after_fork(self):
+        self._queue = queue.Queue(maxsize=1000)
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        if self.base_path:
+            self._open_handler()
+
+    # SQLAlchemy engine hooks
+    # The start time rides on the statement's execution context, so a statement
+    # that raises leaves nothing behind on the pooled connection
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.slow_query_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, 'slow_query_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        if elapsed < self.threshold or conn.info.get('slow_query_explain'):
+            return
+
+        entry = {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'duration_ms': round(elapsed * 1000, 2),
+            'endpoint': None,
+            'method': None,
+            'path': None,
+            'statement': ' '.join(statement.split()),
+            'parameters': self._describe_parameters(parameters, executemany),
+            'executemany': executemany,
+            'pid': os.getpid()
+        }
+        if has_request_context():
+            entry.update(endpoint=request.endpoint, method=request.method, path=request.path)
+
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((conn.engine, statement, None if executemany else parameters, entry))
+        except queue.Full:
+            self.dropped += 1
+
+    def _describe_parameters(self, parameters, executemany):
+        if executemany:
+            return f'{len(parameters)} parameter sets'
+        if self.log_parameters:
+            return repr(parameters)[:1000]
+        if isinstance(parameters, dict):
+            return f"redacted: {', '.join(sorted(parameters))}"
+        return f'redacted: {len(parameters or ())} values'
+
+    # Background writer
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work, name='slow-query-log', daemon=True)
+                self._thread.start()
+
+    def _work(self):
+        while True:
+            engine, statement, parameters, entry = self._queue.get()
+            if self.explain:
+                entry['plan'] = self._explain(engine, statement, parameters)
+            self._logger.info(json.dumps(entry, default=str))
+
+    def _explain(self, engine, statement, parameters):
+        if parameters is None or not statement.lstrip().lower().startswith(EXPLAINABLE):
+            return None
+        if not self.log_parameters and engine.dialect.name != 'sqlite':
+            # Other databases print bound values in their plans
+            return None
+        prefix = 'EXPLAIN QUERY PLAN' if engine.dialect.name == 'sqlite' else 'EXPLAIN'
+        try:
+            with engine.connect() as connection:
+                connection.info['slow_query_explain'] = True
+                try:
+                    rows = connection.exec_driver_sql(f'{prefix} {statement}', parameters).fetchall()
+                finally:
+                    connection.info.pop('slow_query_explain', None)
+            return [' | '.join(str(column) for column in row) for row in rows]
+        except Exception as e:
+            return [f'EXPLAIN failed: {str(e)}']
+
+    # Reading
+
+    def log_files(self):
+        """Current log file of every process that has written one"""
+        if not self.base_path:
+            return []
+        root, ext = os.path.splitext(self.base_path)
+        return glob.glob(f'{glob.escape(root)}.*{ext}')
+
+    def tail(self, limit=100):
+        """Most recent entries across every process's log file, newest first"""
+        entries = []
+        for path in self.log_files():
+            try:
+                with open(path, encoding='utf-8') as f:
+                    lines = deque(f, maxlen=limit)
+            except OSError:
+                continue
+            for line in lines:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+        return heapq.nlargest(limit, entries, key=lambda entry: entry.get('timestamp') or '')
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # EPERM: the pid exists but belongs to someone else
+        return True
+    return True
+
+
+slow_query_log = SlowQueryLog()
@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+from flask import current_app
+from utils.user_cache import UserSnapshot
+
+# flask_jwt_extended (and cryptography behind it) is imported only when token
+# mode is enabled, so cookie-only deployments don't pay for it at startup
+
+
+def token_mode_enabled():
+    return current_app.config.get('AUTH_TOKEN_MODE', False)
+
+
+def token_claims(user):
+    """Claims carried by every token so API routes never need to load the user"""
+    return {
+        'user_name': user.user_name,
+        'role': user.role
+    }
+
+
+def issue_tokens(user):
+    from flask_jwt_extended import create_access_token, create_refresh_token
+
+    identity = str(user.id)
+    claims = token_claims(user)
+    return {
+        'access_token': create_access_token(identity=identity, additional_claims=claims),
+        'refresh_token': create_refresh_token(identity=identity, additional_claims=claims),
+        'token_type': 'Bearer',
+        'expires_in': int(current_app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds())
+    }
+
+
+def user_from_claims(identity, claims):
+    """Build a read-only current_user from token claims without touching the database"""
+    return UserSnapshot(SimpleNamespace(
+        id=int(identity),
+        user_name=claims.get('user_name'),
+        is_admin=claims.get('role') == 'admin',
+        user_ip=None,
+        role=claims.get('role'),
+        is_active=True,
+        created_at=None,
+        last_login=None
+    ))
+
+
+def refresh_identity():
+    """Verify the request's refresh token and return its user id"""
+    from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+    verify_jwt_in_request(refresh=True)
+    return int(get_jwt_identity())
+
+
+def init_token_auth(app, login_manager):
+    """Enable Bearer token authentication alongside cookie sessions"""
+    if not app.config.get('AUTH_TOKEN_MODE'):
+        return
+
+    from flask_jwt_extended import JWTManager, get_jwt, get_jwt_identity, verify_jwt_in_request
+    from flask_jwt_extended.exceptions import JWTExtendedException
+    from jwt.exceptions import PyJWTError
+
+    JWTManager(app)
+
+    @login_manager.request_loader
+    def load_user_from_token(request):
+        # Only consulted when the request carries no session user
+        if 'Authorization' not in request.headers:
+            return None
+        try:
+            if verify_jwt_in_request(optional=True) is None:
+                return None
+            return user_from_claims(get_jwt_identity(), get_jwt())
+        except (JWTExtendedException, PyJWTError) as e:
+            app.logger.info(f"Rejected bearer token: {str(e)}")
+            return None
@@ -0,0 +1,128 @@
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+from urllib.parse import urlencode
+from flask import g, request
+
+# Credentials are dropped outright; identifying free text is replaced by a stable hash
+SECRET_KEYS = {'password', 'new_password', 'current_password', 'token', 'access_token', 'refresh_token'}
+# 'q' is the free-text user search on /api/users/search
+PERSONAL_KEYS = {'user_name', 'username', 'user_ip', 'purpose', 'termination_reason', 'reason', 'q'}
+
+
+def anonymize(value, key=None, personal_keys=PERSONAL_KEYS):
+    """Copy of a JSON body with secrets removed and personal strings hashed, keeping its shape"""
+    if isinstance(value, dict):
+        return {k: anonymize(v, k, personal_keys) for k, v in value.items()}
+    if isinstance(value, list):
+        return [anonymize(item, key, personal_keys) for item in value]
+    if key in SECRET_KEYS:
+        return '***'
+    if key in personal_keys and isinstance(value, str):
+        return 'anon-' + hashlib.sha256(value.encode()).hexdigest()[:10]
+    return value
+
+
+def anonymize_query(args, personal_keys=PERSONAL_KEYS):
+    """Query string rebuilt from request.args with values anonymized like a body"""
+    return urlencode([(key, anonymize(value, key, personal_keys)) for key, value in args.items(multi=True)])
+
+
+class TrafficRecorder:
+    """Opt-in request recorder for load-test replay (see benchmarks/replay.py)
+
+    Each process appends one gzip'd JSON line per request to its own file in
+    TRAFFIC_RECORD_DIR. Lines use short keys: t (epoch seconds), e (endpoint),
+    m, p, q (anonymized query string), b (anonymized JSON body), s (status),
+    d (ms).
+    """
+
+    def __init__(self):
+        self.directory = None
+        self.sample = 1.0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=10000)
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.directory = app.config.get('TRAFFIC_RECORD_DIR')
+        if not self.directory:
+            return
+
+        self.sample = app.config.get('TRAFFIC_RECORD_SAMPLE', 1.0)
+        self.personal_keys = PERSONAL_KEYS | set(app.config.get('TRAFFIC_RECORD_ANONYMIZE', ()))
+        os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def after_fork(self):
+        self._queue = queue.Queue(maxsize=10000)
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def _before_request(self):
+        if request.endpoint == 'static' or random.random() >= self.sample:
+            return
+        g.traffic_started = time.time()
+        g.traffic_perf = time.perf_counter()
+
+    def _after_request(self, response):
+        started = g.pop('traffic_started', None)
+        if started is None:
+            return response
+
+        entry = {
+            't': round(started, 4),
+            'e': request.endpoint,
+            'm': request.method,
+            'p': request.path,
+            's': response.status_code,
+            'd': round((time.perf_counter() - g.pop('traffic_perf')) * 1000, 2)
+        }
+        if request.args:
+            entry['q'] = anonymize_query(request.args, self.personal_keys)
+        body = request.get_json(silent=True) if request.is_json else (request.form.to_dict() or None)
+        if body is not None:
+            entry['b'] = anonymize(body, personal_keys=self.personal_keys)
+
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+        return response
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work, name='traffic-recorder', daemon=True)
+                self._thread.start()
+
+    def _work(self):
+        path = os.path.join(self.directory, f'traffic-{int(time.time())}-{os.getpid()}.jsonl.gz')
+        out = gzip.open(path, 'at', encoding='utf-8')
+        atexit.register(out.close)
+        written = 0
+        while True:
+            try:
+                entry = self._queue.get(timeout=1)
+            except queue.Empty:
+                # Idle: flush so the file can be read while recording continues
+                out.flush()
+                continue
+            out.write(json.dumps(entry, separators=(',', ':')) + '\n')
+            written += 1
+            if written % 1000 == 0:
+                out.flush()
+
+
+traffic_recorder = TrafficRecorder()
@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from utils.device_registry import read_stamp, touch_stamp
+
+
+class UserSnapshot:
+    """Detached, read-only copy of a User row for Flask-Login's current_user"""
+
+    FIELDS = ('id', 'user_name', 'is_admin', 'user_ip', 'role', 'is_active', 'created_at', 'last_login')
+
+    def __init__(self, user):
+        for field in self.FIELDS:
+            object.__setattr__(self, field, getattr(user, field))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"UserSnapshot is read-only; load the User row to change '{name}'")
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+    def get_id(self):
+        return str(self.id)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_name': self.user_name,
+            'user_ip': self.user_ip,
+            'role': self.role,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+    def __repr__(self):
+        return f'<UserSnapshot {self.user_name}>'
+
+
+class UserCache:
+    """Bounded per-process LRU cache of user snapshots with a TTL
+
+    invalidate() touches a stamp file in the instance folder, like the
+    device registry and access index do. Entries remember the stamp they
+    were loaded under, so a role change or deletion in one worker is seen
+    by every worker on its next lookup rather than after the TTL.
+    """
+
+    def __init__(self, ttl=60, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.stamp_path = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('USER_CACHE_TTL', self.ttl)
+        self.maxsize = app.config.get('USER_CACHE_SIZE', self.maxsize)
+        self.stamp_path = os.path.join(app.instance_path, 'user_cache.stamp')
+        self.clear()
+
+    def get(self, user_id, loader):
+        """Return the cached snapshot for user_id, calling loader(user_id) on a miss"""
+        now = time.monotonic()
+        stamp = read_stamp(self.stamp_path)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now and entry[2] == stamp:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        user = loader(user_id)
+        if user is None:
+            return None
+
+        snapshot = UserSnapshot(user)
+        if self.ttl > 0 and self.maxsize > 0:
+            with self._lock:
+                self._entries[user_id] = (snapshot, now + self.ttl, stamp)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, user_id):
+        """Call after committing a change to a user; drops cached users in every worker"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+        touch_stamp(self.stamp_path)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl
+            }
+
+
+user_cache = UserCache()
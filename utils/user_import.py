@@ -0,0 +1,115 @@
+from datetime import datetime
+from models.base import db
+from models.user import User
+from utils.device_import import IP_PATTERN, load_records
+from utils.password_hashing import password_hasher
+
+USER_FIELDS = ('user_name', 'password', 'role', 'user_ip')
+ROLES = ('user', 'admin')
+
+
+class UserImportError(ValueError):
+    """The file could not be read at all; row problems are reported per row instead"""
+
+
+def parse_users(data, fmt):
+    """Rows from CSV text or a JSON list (or {"users": [...]}), keeping only known fields"""
+    rows = []
+    for item in load_records(data, fmt, 'users', UserImportError):
+        row = {}
+        for key, value in item.items():
+            field = str(key).strip().lower() if key is not None else None
+            if field in USER_FIELDS:
+                # Passwords are taken as given; everything else is trimmed
+                value = '' if value is None else str(value) if field == 'password' else str(value).strip()
+                row[field] = value or None
+        rows.append(row)
+    return rows
+
+
+def validate_user(row, seen, existing):
+    """Every problem with one row, as a list of messages"""
+    errors = []
+    user_name = row.get('user_name')
+    if not user_name:
+        errors.append('Username is required')
+    elif len(user_name) > 80:
+        errors.append('Username is longer than 80 characters')
+    elif user_name in existing:
+        errors.append(f'User {user_name} already exists')
+    elif user_name in seen:
+        errors.append(f'Duplicate username {user_name} (first seen in row {seen[user_name]})')
+    if not row.get('password'):
+        errors.append('Password is required')
+    if row.get('role') and row['role'] not in ROLES:
+        errors.append(f"Role must be one of: {', '.join(ROLES)}")
+    if row.get('user_ip') and not IP_PATTERN.fullmatch(row['user_ip']):
+        errors.append(f"Invalid IP format: {row['user_ip']}")
+    return errors
+
+
+def existing_user_names(user_names, chunk_size=500):
+    existing = set()
+    user_names = list(user_names)
+    for i in range(0, len(user_names), chunk_size):
+        existing.update(db.session.execute(
+            db.select(User.user_name).where(User.user_name.in_(user_names[i:i + chunk_size]))
+        ).scalars())
+    return existing
+
+
+def import_users(rows, dry_run=False, max_rows=None):
+    """Create every valid row in one transaction and report each row's outcome
+
+    Rows that fail validation (including usernames already taken or
+    repeated in the file) are skipped; the rest are hashed by the password
+    hasher's process pool and inserted with one executemany. Files with
+    more than max_rows rows are refused outright.
+    """
+    if not rows:
+        raise UserImportError('No users to import')
+    if max_rows and len(rows) > max_rows:
+        raise UserImportError(f'{len(rows)} users is more than the limit of {max_rows} per import')
+
+    existing = existing_user_names(row['user_name'] for row in rows if row.get('user_name'))
+    results = []
+    valid = []
+    seen = {}
+    for number, row in enumerate(rows, start=1):
+        errors = validate_user(row, seen, existing)
+        if row.get('user_name') and row['user_name'] not in seen:
+            seen[row['user_name']] = number
+        if errors:
+            results.append({'row': number, 'user_name': row.get('user_name'), 'status': 'error', 'errors': errors})
+        else:
+            results.append({'row': number, 'user_name': row['user_name'], 'status': 'valid' if dry_run else 'created'})
+            valid.append(row)
+
+    summary = {
+        'created': 0 if dry_run else len(valid),
+        'valid': len(valid),
+        'failed': len(rows) - len(valid),
+        'results': results
+    }
+    if dry_run or not valid:
+        return summary
+
+    hashes = password_hasher.hash_many(row['password'] for row in valid)
+    now = datetime.utcnow()
+    try:
+        db.session.execute(User.__table__.insert(), [
+            {
+                'user_name': row['user_name'],
+                'user_ip': row.get('user_ip') or '',
+                'password_hash': password_hash,
+                'role': row.get('role') or 'user',
+                'is_active': True,
+                'created_at': now
+            }
+            for row, password_hash in zip(valid, hashes)
+        ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return summary
@@ -0,0 +1,52 @@
+"""Production WSGI entry point
+
+Run under a prefork server with the app preloaded in the master:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Importing this module only builds the app. One-time work (tables, admin
+user, backup scheduler) runs from init_master() in the
+master process, and every worker calls init_worker() right after fork.
+"""
+import gc
+import os
+from app import bootstrap_database, create_app, reset_after_fork, start_scheduler
+from models import db
+
+app = create_app(bootstrap=False, start_services=False)
+
+_master_initialized = False
+
+
+def init_master():
+    """Run one-time initialization in the master before workers are forked"""
+    global _master_initialized
+    if _master_initialized:
+        return
+    _master_initialized = True
+
+    bootstrap_database(app)
+    start_scheduler(app)
+
+    # Workers must not share the master's sockets
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+    # Move everything loaded so far out of the collector's view so that
+    # gc passes in workers don't touch (and copy) the shared pages
+    gc.collect()
+    gc.freeze()
+
+
+def init_worker():
+    """Reset inherited per-process state in a freshly forked worker"""
+    reset_after_fork(app)
+
+
+if __name__ == '__main__':
+    # Single-process fallback, e.g. `python wsgi.py` behind a reverse proxy
+    from werkzeug.serving import run_simple
+
+    init_master()
+    run_simple('0.0.0.0', int(os.getenv('PORT', 5000)), app, threaded=True)